@@ -0,0 +1,70 @@
+"""add report_export_jobs table
+
+Revision ID: 20261018_0023
+Revises: 20260528_0022
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+from sqlalchemy.dialects import postgresql
+
+revision = "20261018_0023"
+down_revision = "20260528_0022"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "report_export_jobs" in set(inspector.get_table_names()):
+        return
+
+    op.create_table(
+        "report_export_jobs",
+        sa.Column("id", sa.String(length=36), nullable=False),
+        sa.Column("tipo", sa.String(length=20), nullable=False),
+        sa.Column("ubs_id", sa.Integer(), nullable=False),
+        sa.Column("requested_by", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column(
+            "payload",
+            postgresql.JSONB().with_variant(sa.JSON(), "sqlite"),
+            nullable=False,
+        ),
+        sa.Column("filename", sa.String(length=255), nullable=True),
+        sa.Column("artifact_path", sa.Text(), nullable=True),
+        sa.Column("size_bytes", sa.Integer(), nullable=True),
+        sa.Column("render_ms", sa.Integer(), nullable=True),
+        sa.Column("erro", sa.Text(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("CURRENT_TIMESTAMP"),
+            nullable=True,
+        ),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["ubs_id"], ["ubs.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["requested_by"], ["usuarios.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_report_export_jobs_status_created_at",
+        "report_export_jobs",
+        ["status", "created_at"],
+    )
+    op.create_index(
+        "ix_report_export_jobs_requested_by",
+        "report_export_jobs",
+        ["requested_by"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_report_export_jobs_requested_by", table_name="report_export_jobs")
+    op.drop_index("ix_report_export_jobs_status_created_at", table_name="report_export_jobs")
+    op.drop_table("report_export_jobs")
@@ -0,0 +1,69 @@
+"""indexes for login_attempts and login_attempt_counters table
+
+Revision ID: 20261018_0024
+Revises: 20261018_0023
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261018_0024"
+down_revision = "20261018_0023"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    existing = {ix["name"] for ix in inspector.get_indexes("login_attempts")}
+    if "ix_login_attempts_created_at" not in existing:
+        op.create_index("ix_login_attempts_created_at", "login_attempts", ["created_at"])
+    if "ix_login_attempts_email_created_at" not in existing:
+        op.create_index("ix_login_attempts_email_created_at", "login_attempts", ["email", "created_at"])
+    if "ix_login_attempts_ip_address_created_at" not in existing:
+        op.create_index("ix_login_attempts_ip_address_created_at", "login_attempts", ["ip_address", "created_at"])
+
+    if "login_attempt_counters" in set(inspector.get_table_names()):
+        return
+
+    op.create_table(
+        "login_attempt_counters",
+        sa.Column("escopo", sa.String(length=10), nullable=False),
+        sa.Column("chave", sa.String(length=200), nullable=False),
+        sa.Column("falhas_janela", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("janela_inicio", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("total_falhas", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_sucessos", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("ultima_falha_em", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("ultimo_sucesso_em", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("escopo", "chave"),
+    )
+
+    # Carrega os totais a partir do histórico existente antes que a retenção o expurgue
+    # (a troca de senha consulta total_sucessos para saber se o usuário já usou senha).
+    for escopo, coluna in (("email", "email"), ("ip", "ip_address")):
+        op.execute(
+            sa.text(
+                "INSERT INTO login_attempt_counters "
+                "(escopo, chave, falhas_janela, janela_inicio, total_falhas, total_sucessos, "
+                "ultima_falha_em, ultimo_sucesso_em) "
+                f"SELECT '{escopo}', {coluna}, 0, CURRENT_TIMESTAMP, "
+                "SUM(CASE WHEN sucesso THEN 0 ELSE 1 END), "
+                "SUM(CASE WHEN sucesso THEN 1 ELSE 0 END), "
+                "MAX(CASE WHEN sucesso THEN NULL ELSE created_at END), "
+                "MAX(CASE WHEN sucesso THEN created_at ELSE NULL END) "
+                f"FROM login_attempts WHERE {coluna} IS NOT NULL GROUP BY {coluna}"
+            )
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("login_attempt_counters")
+    op.drop_index("ix_login_attempts_ip_address_created_at", table_name="login_attempts")
+    op.drop_index("ix_login_attempts_email_created_at", table_name="login_attempts")
+    op.drop_index("ix_login_attempts_created_at", table_name="login_attempts")
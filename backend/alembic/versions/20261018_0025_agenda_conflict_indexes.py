@@ -0,0 +1,70 @@
+"""composite indexes and active-slot unique index for agendamentos
+
+Revision ID: 20261018_0025
+Revises: 20261018_0024
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261018_0025"
+down_revision = "20261018_0024"
+branch_labels = None
+depends_on = None
+
+ATIVO_WHERE = sa.text("status IN ('AGENDADO', 'REAGENDADO')")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    existing = {ix["name"] for ix in inspector.get_indexes("agendamentos")}
+    if "ix_agendamentos_profissional_data_status" not in existing:
+        op.create_index(
+            "ix_agendamentos_profissional_data_status",
+            "agendamentos",
+            ["profissional_id", "data_hora", "status"],
+        )
+
+    if "uq_agendamentos_profissional_horario_ativo" not in existing:
+        # O índice único falharia com mensagem pouco clara se já houver horários duplicados;
+        # eles precisam ser resolvidos (cancelados/reagendados) manualmente antes.
+        duplicados = bind.execute(
+            sa.text(
+                "SELECT profissional_id, data_hora, COUNT(*) FROM agendamentos "
+                "WHERE status IN ('AGENDADO', 'REAGENDADO') "
+                "GROUP BY profissional_id, data_hora HAVING COUNT(*) > 1"
+            )
+        ).fetchall()
+        if duplicados:
+            lista = ", ".join(f"profissional {p} em {d} ({n}x)" for p, d, n in duplicados[:20])
+            raise RuntimeError(
+                "Existem agendamentos ativos duplicados no mesmo horário; resolva-os antes "
+                f"de aplicar esta migration: {lista}"
+            )
+        op.create_index(
+            "uq_agendamentos_profissional_horario_ativo",
+            "agendamentos",
+            ["profissional_id", "data_hora"],
+            unique=True,
+            postgresql_where=ATIVO_WHERE,
+            sqlite_where=ATIVO_WHERE,
+        )
+
+    existing = {ix["name"] for ix in inspector.get_indexes("bloqueios_agenda")}
+    if "ix_bloqueios_agenda_profissional_periodo" not in existing:
+        op.create_index(
+            "ix_bloqueios_agenda_profissional_periodo",
+            "bloqueios_agenda",
+            ["profissional_id", "data_inicio", "data_fim"],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_bloqueios_agenda_profissional_periodo", table_name="bloqueios_agenda")
+    op.drop_index("uq_agendamentos_profissional_horario_ativo", table_name="agendamentos")
+    op.drop_index("ix_agendamentos_profissional_data_status", table_name="agendamentos")
@@ -0,0 +1,43 @@
+"""ocupacao_agenda_diaria table
+
+Revision ID: 20261018_0026
+Revises: 20261018_0025
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261018_0026"
+down_revision = "20261018_0025"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    if "ocupacao_agenda_diaria" in set(inspector.get_table_names()):
+        return
+
+    # Preenchida pela aplicação: a janela recente no startup e o histórico com
+    # scripts/rebuild_ocupacao_agenda.py
+    op.create_table(
+        "ocupacao_agenda_diaria",
+        sa.Column("profissional_id", sa.Integer(), sa.ForeignKey("profissionais.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("dia", sa.Date(), nullable=False),
+        sa.Column("minutos_capacidade", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("minutos_agendados", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("minutos_reagendados", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("minutos_realizados", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("minutos_cancelados", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("minutos_bloqueados", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("atualizado_em", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("profissional_id", "dia"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ocupacao_agenda_diaria")
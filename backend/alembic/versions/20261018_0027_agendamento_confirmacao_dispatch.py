@@ -0,0 +1,51 @@
+"""claim/backoff columns for the appointment confirmation dispatcher
+
+Revision ID: 20261018_0027
+Revises: 20261018_0026
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261018_0027"
+down_revision = "20261018_0026"
+branch_labels = None
+depends_on = None
+
+PENDENTE_WHERE = sa.text("confirmacao_enviada IS NULL")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    columns = {c["name"] for c in inspector.get_columns("agendamentos")}
+    if "confirmacao_lote" not in columns:
+        op.add_column("agendamentos", sa.Column("confirmacao_lote", sa.String(length=36), nullable=True))
+    if "confirmacao_proxima_em" not in columns:
+        op.add_column("agendamentos", sa.Column("confirmacao_proxima_em", sa.DateTime(timezone=True), nullable=True))
+    if "confirmacao_tentativas" not in columns:
+        op.add_column(
+            "agendamentos",
+            sa.Column("confirmacao_tentativas", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+    existing = {ix["name"] for ix in inspector.get_indexes("agendamentos")}
+    if "ix_agendamentos_confirmacao_pendente" not in existing:
+        op.create_index(
+            "ix_agendamentos_confirmacao_pendente",
+            "agendamentos",
+            ["data_hora"],
+            postgresql_where=PENDENTE_WHERE,
+            sqlite_where=PENDENTE_WHERE,
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_agendamentos_confirmacao_pendente", table_name="agendamentos")
+    op.drop_column("agendamentos", "confirmacao_tentativas")
+    op.drop_column("agendamentos", "confirmacao_proxima_em")
+    op.drop_column("agendamentos", "confirmacao_lote")
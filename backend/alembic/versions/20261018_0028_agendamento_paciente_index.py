@@ -0,0 +1,26 @@
+"""index on agendamentos (paciente_id, data_hora) for paginated patient history
+
+Revision ID: 20261018_0028
+Revises: 20261018_0027
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+from sqlalchemy import inspect
+
+revision = "20261018_0028"
+down_revision = "20261018_0027"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    existing = {ix["name"] for ix in inspect(bind).get_indexes("agendamentos")}
+    if "ix_agendamentos_paciente_data" not in existing:
+        op.create_index("ix_agendamentos_paciente_data", "agendamentos", ["paciente_id", "data_hora"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_agendamentos_paciente_data", table_name="agendamentos")
@@ -0,0 +1,27 @@
+"""content hash column on educational_material_files
+
+Revision ID: 20261018_0029
+Revises: 20261018_0028
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261018_0029"
+down_revision = "20261018_0028"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns = {c["name"] for c in inspect(bind).get_columns("educational_material_files")}
+    if "sha256" not in columns:
+        op.add_column("educational_material_files", sa.Column("sha256", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("educational_material_files", "sha256")
@@ -0,0 +1,48 @@
+"""resumable upload sessions for educational materials
+
+Revision ID: 20261018_0030
+Revises: 20261018_0029
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261018_0030"
+down_revision = "20261018_0029"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if "material_upload_sessions" in inspect(bind).get_table_names():
+        return
+    op.create_table(
+        "material_upload_sessions",
+        sa.Column("id", sa.String(length=36), primary_key=True),
+        sa.Column(
+            "material_id",
+            sa.Integer(),
+            sa.ForeignKey("educational_materials.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("created_by", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=True),
+        sa.Column("original_filename", sa.String(length=255), nullable=False),
+        sa.Column("content_type", sa.String(length=100), nullable=True),
+        sa.Column("tamanho_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("recebido_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("arquivo_parcial", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("expira_em", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_material_upload_sessions_material_id", "material_upload_sessions", ["material_id"])
+    op.create_index("ix_material_upload_sessions_expira_em", "material_upload_sessions", ["expira_em"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_material_upload_sessions_expira_em", table_name="material_upload_sessions")
+    op.drop_index("ix_material_upload_sessions_material_id", table_name="material_upload_sessions")
+    op.drop_table("material_upload_sessions")
@@ -0,0 +1,40 @@
+"""content-addressed blobs shared by educational material files
+
+Revision ID: 20261018_0031
+Revises: 20261018_0030
+Create Date: 2026-10-18
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+revision = "20261018_0031"
+down_revision = "20261018_0030"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+
+    if "material_blobs" not in inspector.get_table_names():
+        op.create_table(
+            "material_blobs",
+            sa.Column("sha256", sa.String(length=64), primary_key=True),
+            sa.Column("size_bytes", sa.BigInteger(), nullable=False),
+            sa.Column("storage_path", sa.Text(), nullable=False),
+            sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+
+    existing = {ix["name"] for ix in inspector.get_indexes("educational_material_files")}
+    if "ix_educational_material_files_sha256" not in existing:
+        op.create_index("ix_educational_material_files_sha256", "educational_material_files", ["sha256"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_educational_material_files_sha256", table_name="educational_material_files")
+    op.drop_table("material_blobs")
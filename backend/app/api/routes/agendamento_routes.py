@@ -1,25 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from collections import defaultdict
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
+from sqlalchemy import func, select, or_
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 
 from app.database import get_db
 from app.models.auth_models import Usuario, ProfissionalUbs
-from app.models.agendamento_models import Agendamento, BloqueioAgenda, StatusAgendamento
+from app.models.agendamento_models import (
+    Agendamento,
+    BloqueioAgenda,
+    OcupacaoAgendaDiaria,
+    StatusAgendamento,
+    STATUS_ATIVOS,
+)
 from app.schemas.agendamento_schemas import (
     AgendamentoCreate, 
     AgendamentoUpdate, 
     AgendamentoResponse,
     BloqueioAgendaCreate,
-    BloqueioAgendaResponse
+    BloqueioAgendaResponse,
+    DisponibilidadeProfissional,
+    AgendamentoLoteCreate,
+    BloqueioAgendaLoteCreate,
+    ResultadoLote,
+    ResultadoLoteItem,
+    OcupacaoDiariaResponse,
+)
+from app.services.agenda_disponibilidade import (
+    AGENDA_TIMEZONE,
+    as_utc,
+    free_slots,
+    is_blocked,
+    merge_intervals,
+    slot_grid,
+)
+from app.services.diretorio_profissionais import get_directory
+from app.services.ics_feed import (
+    CALENDAR_FEED_PAST_DAYS,
+    agendamento_component,
+    conditional_headers,
+    feed_validators,
+    iter_calendar,
 )
-from app.utils.deps import get_current_user
+from app.utils.deps import get_calendar_feed_user, get_current_gestor_user, get_current_user
+from app.utils.http_cache import etag_matches, not_modified, quote_etag
+from app.utils.pagination import NEXT_CURSOR_HEADER, keyset_filter, page_with_cursor
 
 agendamento_router = APIRouter(tags=["Agendamentos"])
 
 STAFF_ROLES = {"PROFISSIONAL", "GESTOR"}
 AGENDA_VIEW_ROLES = {"PROFISSIONAL", "GESTOR"}
+# Tamanho máximo de um lote (agendamentos ou bloqueios)
+AGENDA_BULK_MAX_ITEMS = int(os.getenv("AGENDA_BULK_MAX_ITEMS", "500"))
+# Paginação das listas de agendamentos (paciente e agenda do profissional)
+AGENDA_PAGE_SIZE = int(os.getenv("AGENDA_PAGE_SIZE", "50"))
+AGENDA_PAGE_MAX_SIZE = int(os.getenv("AGENDA_PAGE_MAX_SIZE", "500"))
+AGENDA_MAX_RANGE_DAYS = int(os.getenv("AGENDA_MAX_RANGE_DAYS", "62"))
 
 
 def _validate_two_week_window(target: datetime, now_utc: datetime) -> None:
@@ -34,60 +74,112 @@ async def check_availability(
     data_hora: datetime, 
     exclude_agendamento_id: int = None
 ):
-    # Verifica se já existe agendamento ativo no horário (exceto o próprio se for reagendamento)
-    query = select(Agendamento).where(
+    """Verifica, numa única consulta, agendamento ativo no horário ou bloqueio que o cubra."""
+    conflito_agendamento = select(Agendamento.id).where(
         Agendamento.profissional_id == profissional_id,
         Agendamento.data_hora == data_hora,
-        Agendamento.status.in_([StatusAgendamento.AGENDADO, StatusAgendamento.REAGENDADO])
+        Agendamento.status.in_(STATUS_ATIVOS)
     )
+    # Exceto o próprio agendamento, se for reagendamento
     if exclude_agendamento_id:
-        query = query.where(Agendamento.id != exclude_agendamento_id)
-        
-    result = await db.execute(query)
-    if result.scalars().first():
-        return False
+        conflito_agendamento = conflito_agendamento.where(Agendamento.id != exclude_agendamento_id)
 
-    # Verifica bloqueios
-    query_bloqueio = select(BloqueioAgenda).where(
+    conflito_bloqueio = select(BloqueioAgenda.id).where(
         BloqueioAgenda.profissional_id == profissional_id,
-        and_(BloqueioAgenda.data_inicio <= data_hora, BloqueioAgenda.data_fim >= data_hora)
+        BloqueioAgenda.data_inicio <= data_hora,
+        BloqueioAgenda.data_fim >= data_hora,
     )
-    result_bloqueio = await db.execute(query_bloqueio)
-    if result_bloqueio.scalars().first():
-        return False
-        
-    return True
+
+    result = await db.execute(select(or_(conflito_agendamento.exists(), conflito_bloqueio.exists())))
+    return not result.scalar()
+
+
+async def _commit_agendamento(db: AsyncSession, detail: str) -> None:
+    """Commita tratando a corrida entre POSTs simultâneos (índice único de horário ativo)."""
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=detail)
+
+
+async def _enrich_agendamentos(
+    db: AsyncSession,
+    agendamentos: List[Agendamento],
+) -> List[AgendamentoResponse]:
+    """
+    Monta as respostas com nome do paciente, nome e cargo do profissional.
+    Resolve todos os nomes em duas consultas (IN-list), independentemente da
+    quantidade de agendamentos, em vez de um db.get por linha.
+    """
+    if not agendamentos:
+        return []
+
+    profissional_ids = {a.profissional_id for a in agendamentos}
+    paciente_ids = {a.paciente_id for a in agendamentos}
+
+    result_profs = await db.execute(
+        select(ProfissionalUbs.id, ProfissionalUbs.cargo, Usuario.nome)
+        .join(Usuario, ProfissionalUbs.usuario_id == Usuario.id)
+        .where(ProfissionalUbs.id.in_(profissional_ids))
+    )
+    profissionais = {row.id: (row.nome, row.cargo) for row in result_profs.all()}
+
+    result_pacientes = await db.execute(
+        select(Usuario.id, Usuario.nome).where(Usuario.id.in_(paciente_ids))
+    )
+    nomes_pacientes = {row.id: row.nome for row in result_pacientes.all()}
+
+    response = []
+    for a in agendamentos:
+        a_resp = AgendamentoResponse.model_validate(a)
+        a_resp.nome_paciente = nomes_pacientes.get(a.paciente_id)
+        prof = profissionais.get(a.profissional_id)
+        if prof:
+            a_resp.nome_profissional, a_resp.cargo_profissional = prof
+        response.append(a_resp)
+    return response
 
 # --- Rotas de Agendamento ---
 
 @agendamento_router.get("/agendamentos/meus", response_model=List[AgendamentoResponse])
 async def get_meus_agendamentos(
+    response: Response,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(AGENDA_PAGE_SIZE, ge=1, le=AGENDA_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
     current_user: Usuario = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Retorna apenas os agendamentos onde o usuário logado é o paciente."""
+    """
+    Retorna apenas os agendamentos onde o usuário logado é o paciente,
+    do mais recente para o mais antigo.
+
+    Sempre paginado: páginas de até ``limit`` itens (AGENDA_PAGE_SIZE por
+    padrão, no máximo AGENDA_PAGE_MAX_SIZE); havendo mais, o cabeçalho
+    X-Next-Cursor traz o ``cursor`` da próxima.
+    """
     usuario_id = int(current_user.id)
 
-    result = await db.execute(
-        select(Agendamento)
-        .where(Agendamento.paciente_id == usuario_id)
-        .order_by(Agendamento.data_hora.desc())
+    query = select(Agendamento).where(Agendamento.paciente_id == usuario_id)
+    if start_date is not None:
+        query = query.where(Agendamento.data_hora >= start_date)
+    if end_date is not None:
+        query = query.where(Agendamento.data_hora <= end_date)
+    apos_cursor = keyset_filter(Agendamento.data_hora, Agendamento.id, cursor, descendente=True)
+    if apos_cursor is not None:
+        query = query.where(apos_cursor)
+
+    query = query.order_by(Agendamento.data_hora.desc(), Agendamento.id.desc())
+    result = await db.execute(query.limit(limit + 1))
+    agendamentos, proximo = page_with_cursor(
+        result.scalars().all(), limit, lambda a: (a.data_hora, a.id)
     )
-    agendamentos = [a for a in result.scalars().all() if int(a.paciente_id) == usuario_id]
-
-    response = []
-    for a in agendamentos:
-        prof = await db.get(ProfissionalUbs, a.profissional_id)
-        prof_user = await db.get(Usuario, prof.usuario_id) if prof else None
-
-        a_resp = AgendamentoResponse.model_validate(a)
-        a_resp.nome_paciente = current_user.nome
-        if prof_user:
-            a_resp.nome_profissional = prof_user.nome
-            a_resp.cargo_profissional = prof.cargo
-        response.append(a_resp)
+    if proximo:
+        response.headers[NEXT_CURSOR_HEADER] = proximo
 
-    return response
+    return await _enrich_agendamentos(db, agendamentos)
 
 @agendamento_router.post("/agendamentos", response_model=AgendamentoResponse)
 async def criar_agendamento(
@@ -121,11 +213,126 @@ async def criar_agendamento(
     )
     
     db.add(novo_agendamento)
-    await db.commit()
+    await _commit_agendamento(db, "Horário indisponível.")
     await db.refresh(novo_agendamento)
     
     return AgendamentoResponse.from_orm(novo_agendamento)
 
+
+def _validate_lote(itens: list) -> None:
+    if not itens:
+        raise HTTPException(status_code=400, detail="Lote vazio.")
+    if len(itens) > AGENDA_BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400, detail=f"Lote excede o limite de {AGENDA_BULK_MAX_ITEMS} itens."
+        )
+
+
+async def _gravar_lote(db: AsyncSession, novos: dict, erros: dict, total: int, atomico: bool) -> ResultadoLote:
+    """Grava os itens válidos (índice -> objeto) numa única transação e monta o relatório."""
+    if atomico and erros:
+        novos = {}
+    if novos:
+        db.add_all(novos.values())
+        await _commit_agendamento(db, "Conflito com outra requisição simultânea; reenvie o lote.")
+
+    itens = []
+    for indice in range(total):
+        if indice in novos:
+            itens.append(ResultadoLoteItem(indice=indice, sucesso=True, id=novos[indice].id))
+        else:
+            erro = erros.get(indice, "Não gravado: lote atômico com itens inválidos.")
+            itens.append(ResultadoLoteItem(indice=indice, sucesso=False, erro=erro))
+    return ResultadoLote(criados=len(novos), falhas=total - len(novos), itens=itens)
+
+
+@agendamento_router.post("/agendamentos/lote", response_model=ResultadoLote)
+async def criar_agendamentos_lote(
+    lote: AgendamentoLoteCreate,
+    current_user: Usuario = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Agenda várias consultas de uma vez, com as mesmas regras de ``criar_agendamento``.
+    Os itens são validados contra agendamentos, bloqueios e entre si com um número
+    fixo de consultas; os válidos são gravados numa única transação.
+    Com ``atomico``, qualquer item inválido cancela o lote inteiro.
+    """
+    _validate_lote(lote.itens)
+    now_utc = datetime.now(timezone.utc)
+    is_staff = current_user.role in STAFF_ROLES
+    erros = {}
+
+    horarios = {i: as_utc(item.data_hora) for i, item in enumerate(lote.itens)}
+    prof_ids = {item.profissional_id for item in lote.itens}
+    paciente_ids = {item.paciente_id for item in lote.itens if item.paciente_id is not None}
+
+    result = await db.execute(
+        select(ProfissionalUbs.id).where(ProfissionalUbs.id.in_(prof_ids), ProfissionalUbs.ativo == True)
+    )
+    profs_validos = set(result.scalars().all())
+
+    pacientes_validos = set()
+    if paciente_ids:
+        result = await db.execute(select(Usuario.id).where(Usuario.id.in_(paciente_ids)))
+        pacientes_validos = set(result.scalars().all())
+
+    ocupados = set()
+    bloqueios = defaultdict(list)
+    if horarios:
+        inicio, fim = min(horarios.values()), max(horarios.values())
+        result = await db.execute(
+            select(Agendamento.profissional_id, Agendamento.data_hora).where(
+                Agendamento.profissional_id.in_(prof_ids),
+                Agendamento.data_hora >= inicio,
+                Agendamento.data_hora <= fim,
+                Agendamento.status.in_(STATUS_ATIVOS),
+            )
+        )
+        ocupados = {(row.profissional_id, as_utc(row.data_hora)) for row in result.all()}
+
+        result = await db.execute(
+            select(BloqueioAgenda.profissional_id, BloqueioAgenda.data_inicio, BloqueioAgenda.data_fim).where(
+                BloqueioAgenda.profissional_id.in_(prof_ids),
+                BloqueioAgenda.data_inicio <= fim,
+                BloqueioAgenda.data_fim >= inicio,
+            )
+        )
+        for row in result.all():
+            bloqueios[row.profissional_id].append((as_utc(row.data_inicio), as_utc(row.data_fim)))
+    bloqueios = {prof_id: merge_intervals(intervalos) for prof_id, intervalos in bloqueios.items()}
+
+    novos = {}
+    for i, item in enumerate(lote.itens):
+        data_hora = horarios[i]
+        paciente_id = item.paciente_id if item.paciente_id is not None else current_user.id
+        if paciente_id != current_user.id and not is_staff:
+            erros[i] = "Sem permissão para agendar para outro paciente."
+        elif paciente_id != current_user.id and paciente_id not in pacientes_validos:
+            erros[i] = "Paciente não encontrado."
+        elif item.profissional_id not in profs_validos:
+            erros[i] = "Profissional não encontrado."
+        elif data_hora < now_utc:
+            erros[i] = "Data inválida (passado)."
+        elif data_hora > now_utc + timedelta(days=14):
+            erros[i] = "Data invalida (maior que 2 semanas)."
+        elif (item.profissional_id, data_hora) in ocupados or is_blocked(
+            bloqueios.get(item.profissional_id, []), data_hora
+        ):
+            erros[i] = "Horário indisponível."
+        else:
+            # Ocupa o horário também para os itens seguintes do mesmo lote
+            ocupados.add((item.profissional_id, data_hora))
+            novos[i] = Agendamento(
+                paciente_id=paciente_id,
+                profissional_id=item.profissional_id,
+                data_hora=item.data_hora,
+                observacoes=item.observacoes,
+                status=StatusAgendamento.AGENDADO
+            )
+
+    return await _gravar_lote(db, novos, erros, len(lote.itens), lote.atomico)
+
 @agendamento_router.patch("/agendamentos/{agendamento_id}", response_model=AgendamentoResponse)
 async def atualizar_agendamento(
     agendamento_id: int,
@@ -161,6 +368,12 @@ async def atualizar_agendamento(
         if not disponivel:
             raise HTTPException(status_code=409, detail="Novo horário indisponível.")
         agendamento.data_hora = agendamento_update.data_hora
+        # Novo horário: a confirmação precisa ser enviada de novo
+        agendamento.confirmacao_enviada = None
+        agendamento.confirmacao_tentativas = 0
+        agendamento.confirmacao_proxima_em = None
+        # Tira do lote em andamento: o envio do horário antigo não conta como confirmação
+        agendamento.confirmacao_lote = None
         if not agendamento_update.status:
             # Se apenas mudou data, marca como reagendado
             agendamento.status = StatusAgendamento.REAGENDADO
@@ -171,7 +384,7 @@ async def atualizar_agendamento(
     if agendamento_update.observacoes:
         agendamento.observacoes = agendamento_update.observacoes
 
-    await db.commit()
+    await _commit_agendamento(db, "Novo horário indisponível.")
     await db.refresh(agendamento)
     return AgendamentoResponse.from_orm(agendamento)
 
@@ -213,56 +426,113 @@ async def get_meu_profissional(
     return {"profissional_id": prof.id, "nome": current_user.nome, "cargo": prof.cargo}
 
 
+async def _ensure_can_view_agenda(db: AsyncSession, current_user: Usuario, profissional_id: int) -> None:
+    if current_user.role not in AGENDA_VIEW_ROLES:
+        raise HTTPException(status_code=403, detail="Acesso restrito a profissionais.")
+
+    # PROFISSIONAL só pode ver a própria agenda
+    if current_user.role == "PROFISSIONAL":
+        result_me = await db.execute(
+            select(ProfissionalUbs).where(ProfissionalUbs.usuario_id == current_user.id)
+        )
+        me_prof = result_me.scalars().first()
+        if not me_prof or me_prof.id != profissional_id:
+            raise HTTPException(status_code=403, detail="Você só pode visualizar sua própria agenda.")
+
+
 @agendamento_router.get("/agenda/profissional/{profissional_id}", response_model=List[AgendamentoResponse])
 async def get_agenda_profissional(
     profissional_id: int,
     start_date: datetime,
     end_date: datetime,
+    response: Response,
+    limit: int = Query(AGENDA_PAGE_MAX_SIZE, ge=1, le=AGENDA_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
     current_user: Usuario = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Ver agenda semanal de um profissional.
     Acessível por: Recepcionista, ACS, Profissional (para ver a própria).
+    O período vai até AGENDA_MAX_RANGE_DAYS dias; a resposta é paginada como
+    em ``/agendamentos/meus`` (cabeçalho X-Next-Cursor), em ordem crescente.
     """
-    if current_user.role not in AGENDA_VIEW_ROLES:
-        raise HTTPException(status_code=403, detail="Acesso restrito a profissionais.")
-
-    # PROFISSIONAL só pode ver a própria agenda
-    if current_user.role == "PROFISSIONAL":
-        result_me = await db.execute(
-            select(ProfissionalUbs).where(ProfissionalUbs.usuario_id == current_user.id)
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date deve ser posterior a start_date.")
+    if end_date - start_date > timedelta(days=AGENDA_MAX_RANGE_DAYS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Período máximo de {AGENDA_MAX_RANGE_DAYS} dias.",
         )
-        me_prof = result_me.scalars().first()
-        if not me_prof or me_prof.id != profissional_id:
-            raise HTTPException(status_code=403, detail="Você só pode visualizar sua própria agenda.")
+
+    await _ensure_can_view_agenda(db, current_user, profissional_id)
 
     query = select(Agendamento).where(
         Agendamento.profissional_id == profissional_id,
         Agendamento.data_hora >= start_date,
         Agendamento.data_hora <= end_date
-    ).order_by(Agendamento.data_hora)
-    
-    result = await db.execute(query)
-    agendamentos = result.scalars().all()
-    
-    # Enriquecer resposta
-    response = []
-    prof = await db.get(ProfissionalUbs, profissional_id)
-    prof_user = await db.get(Usuario, prof.usuario_id) if prof else None
+    )
+    apos_cursor = keyset_filter(Agendamento.data_hora, Agendamento.id, cursor)
+    if apos_cursor is not None:
+        query = query.where(apos_cursor)
 
-    for a in agendamentos:
-        paciente = await db.get(Usuario, a.paciente_id)
-        
-        a_resp = AgendamentoResponse.from_orm(a)
-        if paciente:
-            a_resp.nome_paciente = paciente.nome
-        if prof_user:
-            a_resp.nome_profissional = prof_user.nome
-            a_resp.cargo_profissional = prof.cargo
-        response.append(a_resp)
-        
-    return response
+    result = await db.execute(query.order_by(Agendamento.data_hora, Agendamento.id).limit(limit + 1))
+    agendamentos, proximo = page_with_cursor(
+        result.scalars().all(), limit, lambda a: (a.data_hora, a.id)
+    )
+    if proximo:
+        response.headers[NEXT_CURSOR_HEADER] = proximo
+
+    return await _enrich_agendamentos(db, agendamentos)
+
+
+@agendamento_router.get("/agenda/profissional/{profissional_id}/feed.ics")
+async def get_agenda_profissional_ics(
+    profissional_id: int,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    current_user: Usuario = Depends(get_calendar_feed_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Feed iCalendar da agenda de um profissional (mesmas permissões da agenda).
+    Autentica pelo cabeçalho Authorization ou por ``?token=``; responde 304 a
+    If-None-Match/If-Modified-Since sem ler os agendamentos.
+    """
+    await _ensure_can_view_agenda(db, current_user, profissional_id)
+
+    filtro = (
+        Agendamento.profissional_id == profissional_id,
+        Agendamento.data_hora >= datetime.now(timezone.utc) - timedelta(days=CALENDAR_FEED_PAST_DAYS),
+    )
+    agregado = (await db.execute(
+        select(
+            func.count(Agendamento.id),
+            func.max(Agendamento.id),
+            func.max(func.coalesce(Agendamento.updated_at, Agendamento.created_at)),
+        ).where(*filtro)
+    )).one()
+    etag, ultima_alteracao = feed_validators(f"agenda:{profissional_id}", *agregado)
+    headers = conditional_headers(etag, ultima_alteracao)
+    if not_modified(if_none_match, if_modified_since, headers["ETag"], ultima_alteracao):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    result = await db.execute(
+        select(Agendamento, Usuario.nome)
+        .outerjoin(Usuario, Agendamento.paciente_id == Usuario.id)
+        .where(*filtro)
+        .order_by(Agendamento.data_hora, Agendamento.id)
+    )
+    linhas = result.all()
+    headers["Content-Disposition"] = f'inline; filename="agenda_profissional_{profissional_id}.ics"'
+    return StreamingResponse(
+        iter_calendar(
+            f"Agenda - profissional {profissional_id}",
+            (agendamento_component(a, nome) for a, nome in linhas),
+        ),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers,
+    )
 
 # --- Bloqueios de Agenda ---
 
@@ -312,6 +582,74 @@ async def criar_bloqueio(
     await db.refresh(novo_bloqueio)
     return BloqueioAgendaResponse.from_orm(novo_bloqueio)
 
+@agendamento_router.post("/agenda/bloqueios/lote", response_model=ResultadoLote)
+async def criar_bloqueios_lote(
+    lote: BloqueioAgendaLoteCreate,
+    current_user: Usuario = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Cria vários bloqueios de uma vez (férias, feriados, ausências da equipe),
+    com as mesmas permissões de ``criar_bloqueio``. Bloqueios idênticos a um
+    existente (ou repetidos no lote) são rejeitados. Uma única transação.
+    """
+    _validate_lote(lote.itens)
+    pode_outros = current_user.role in ("GESTOR", "ADMIN")
+    erros = {}
+
+    result = await db.execute(
+        select(ProfissionalUbs.id).where(ProfissionalUbs.usuario_id == current_user.id)
+    )
+    me_prof_id = result.scalars().first()
+
+    alvos = {}
+    for i, item in enumerate(lote.itens):
+        alvos[i] = item.profissional_id or me_prof_id
+    ids = {prof_id for prof_id in alvos.values() if prof_id}
+
+    result = await db.execute(select(ProfissionalUbs.id).where(ProfissionalUbs.id.in_(ids)))
+    profs_validos = set(result.scalars().all())
+
+    existentes = set()
+    if ids:
+        inicio = min(as_utc(item.data_inicio) for item in lote.itens)
+        fim = max(as_utc(item.data_fim) for item in lote.itens)
+        result = await db.execute(
+            select(BloqueioAgenda.profissional_id, BloqueioAgenda.data_inicio, BloqueioAgenda.data_fim).where(
+                BloqueioAgenda.profissional_id.in_(ids),
+                BloqueioAgenda.data_inicio >= inicio,
+                BloqueioAgenda.data_fim <= fim,
+            )
+        )
+        existentes = {
+            (row.profissional_id, as_utc(row.data_inicio), as_utc(row.data_fim)) for row in result.all()
+        }
+
+    novos = {}
+    for i, item in enumerate(lote.itens):
+        prof_id = alvos[i]
+        chave = (prof_id, as_utc(item.data_inicio), as_utc(item.data_fim))
+        if not prof_id:
+            erros[i] = "Usuário não é um profissional de saúde e nenhum ID foi fornecido."
+        elif prof_id not in profs_validos:
+            erros[i] = "Profissional não encontrado."
+        elif prof_id != me_prof_id and not pode_outros:
+            erros[i] = "Sem permissão para bloquear a agenda de outro profissional."
+        elif item.data_fim < item.data_inicio:
+            erros[i] = "data_fim deve ser posterior a data_inicio."
+        elif chave in existentes:
+            erros[i] = "Bloqueio já existe."
+        else:
+            existentes.add(chave)
+            novos[i] = BloqueioAgenda(
+                profissional_id=prof_id,
+                data_inicio=item.data_inicio,
+                data_fim=item.data_fim,
+                motivo=item.motivo
+            )
+
+    return await _gravar_lote(db, novos, erros, len(lote.itens), lote.atomico)
+
 @agendamento_router.get("/agenda/bloqueios", response_model=List[BloqueioAgendaResponse])
 async def listar_meus_bloqueios(
     profissional_id: Optional[int] = None,
@@ -384,34 +722,166 @@ async def deletar_bloqueio(
     await db.commit()
     return None
 
+def _directory_response(response: Response, if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """Aplica os cabeçalhos de cache do diretório; devolve um 304 se o cliente já tem a versão."""
+    headers = {"ETag": quote_etag(etag), "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @agendamento_router.get("/agendamentos/especialidades", response_model=List[str])
 async def list_especialidades(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    """Lista especialidades (cargos) ativas para agendamento."""
-    query = select(ProfissionalUbs.cargo).where(ProfissionalUbs.ativo == True).distinct().order_by(ProfissionalUbs.cargo)
-    result = await db.execute(query)
-    return [row[0] for row in result.all() if row[0]]
+    """Lista especialidades (cargos) ativas para agendamento (em cache, com ETag)."""
+    diretorio = await get_directory(db)
+    nao_modificado = _directory_response(response, if_none_match, diretorio["etag"])
+    if nao_modificado is not None:
+        return nao_modificado
+    return diretorio["especialidades"]
 
 
 @agendamento_router.get("/agendamentos/profissionais", response_model=List[dict])
 async def list_profissionais_ativos(
+    response: Response,
     cargo: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    """Lista profissionais para agendamento."""
-    query = select(ProfissionalUbs, Usuario).join(Usuario, ProfissionalUbs.usuario_id == Usuario.id).where(ProfissionalUbs.ativo == True)
+    """Lista profissionais para agendamento (em cache, com ETag)."""
+    diretorio = await get_directory(db)
+    nao_modificado = _directory_response(response, if_none_match, diretorio["etag"])
+    if nao_modificado is not None:
+        return nao_modificado
     if cargo:
-        query = query.where(ProfissionalUbs.cargo == cargo)
-    result = await db.execute(query)
-    profissionais = []
-    for prof, user in result.all():
-        profissionais.append({
-            "id": prof.id,
-            "nome": user.nome,
-            "cargo": prof.cargo
-        })
-    return profissionais
+        return diretorio["por_cargo"].get(cargo, [])
+    return diretorio["profissionais"]
+
+
+@agendamento_router.get("/agendamentos/disponibilidade", response_model=List[DisponibilidadeProfissional])
+async def get_disponibilidade(
+    start_date: date,
+    end_date: date,
+    cargo: Optional[str] = None,
+    profissional_id: Optional[List[int]] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Horários livres de um ou mais profissionais (por ID e/ou especialidade)
+    entre start_date e end_date, dentro da janela de duas semanas.
+    Usa três consultas no total, independentemente do número de profissionais e dias.
+    """
+    if not cargo and not profissional_id:
+        raise HTTPException(status_code=400, detail="Informe cargo ou profissional_id.")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date deve ser posterior a start_date.")
 
+    now_utc = datetime.now(timezone.utc)
+    hoje = now_utc.astimezone(AGENDA_TIMEZONE).date()
+    if end_date > hoje + timedelta(days=14):
+        raise HTTPException(status_code=400, detail="Data invalida (maior que 2 semanas).")
+    start_date = max(start_date, hoje)
+    if end_date < start_date:
+        return []
+
+    query_profs = (
+        select(ProfissionalUbs.id, ProfissionalUbs.cargo, Usuario.nome)
+        .join(Usuario, ProfissionalUbs.usuario_id == Usuario.id)
+        .where(ProfissionalUbs.ativo == True)
+        .order_by(Usuario.nome, ProfissionalUbs.id)
+    )
+    if cargo:
+        query_profs = query_profs.where(ProfissionalUbs.cargo == cargo)
+    if profissional_id:
+        query_profs = query_profs.where(ProfissionalUbs.id.in_(profissional_id))
+    profissionais = (await db.execute(query_profs)).all()
+    if not profissionais:
+        return []
+
+    # O último dia da janela só vale até o horário de agora (POST /agendamentos recusa o resto)
+    limite = now_utc + timedelta(days=14)
+    grade = [slot for slot in slot_grid(start_date, end_date) if slot <= limite]
+    if not grade:
+        return []
+    ids = [p.id for p in profissionais]
+
+    ocupados = defaultdict(list)
+    result = await db.execute(
+        select(Agendamento.profissional_id, Agendamento.data_hora).where(
+            Agendamento.profissional_id.in_(ids),
+            Agendamento.data_hora >= grade[0],
+            Agendamento.data_hora <= grade[-1],
+            Agendamento.status.in_(STATUS_ATIVOS),
+        )
+    )
+    for row in result.all():
+        ocupados[row.profissional_id].append(as_utc(row.data_hora))
+
+    bloqueios = defaultdict(list)
+    result = await db.execute(
+        select(BloqueioAgenda.profissional_id, BloqueioAgenda.data_inicio, BloqueioAgenda.data_fim).where(
+            BloqueioAgenda.profissional_id.in_(ids),
+            BloqueioAgenda.data_inicio <= grade[-1],
+            BloqueioAgenda.data_fim >= grade[0],
+        )
+    )
+    for row in result.all():
+        bloqueios[row.profissional_id].append((as_utc(row.data_inicio), as_utc(row.data_fim)))
+
+    return [
+        DisponibilidadeProfissional(
+            profissional_id=p.id,
+            nome=p.nome,
+            cargo=p.cargo,
+            slots=free_slots(grade, ocupados[p.id], bloqueios[p.id], depois_de=now_utc),
+        )
+        for p in profissionais
+    ]
+
+
+@agendamento_router.get("/agenda/ocupacao", response_model=List[OcupacaoDiariaResponse])
+async def get_ocupacao_agendas(
+    start_date: date,
+    end_date: date,
+    cargo: Optional[str] = None,
+    profissional_id: Optional[List[int]] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_gestor_user)
+):
+    """
+    Ocupação diária por profissional (gestor), lida da tabela pré-calculada
+    ``ocupacao_agenda_diaria``. Dias sem linha não tiveram agendamentos nem bloqueios.
+    """
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date deve ser posterior a start_date.")
+    if (end_date - start_date).days > 366:
+        raise HTTPException(status_code=400, detail="Período maior que 366 dias.")
+
+    query = select(OcupacaoAgendaDiaria).where(
+        OcupacaoAgendaDiaria.dia >= start_date,
+        OcupacaoAgendaDiaria.dia <= end_date,
+    )
+    if profissional_id:
+        query = query.where(OcupacaoAgendaDiaria.profissional_id.in_(profissional_id))
+    if cargo:
+        query = query.join(ProfissionalUbs, ProfissionalUbs.id == OcupacaoAgendaDiaria.profissional_id).where(
+            ProfissionalUbs.cargo == cargo
+        )
+    result = await db.execute(query.order_by(OcupacaoAgendaDiaria.dia, OcupacaoAgendaDiaria.profissional_id))
+
+    response = []
+    for linha in result.scalars().all():
+        item = OcupacaoDiariaResponse.model_validate(linha)
+        disponivel = linha.minutos_capacidade - linha.minutos_bloqueados
+        if disponivel > 0:
+            ocupado = linha.minutos_agendados + linha.minutos_reagendados + linha.minutos_realizados
+            item.taxa_ocupacao = round(ocupado / disponivel, 4)
+        response.append(item)
+    return response
@@ -4,7 +4,6 @@ from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
 from typing import Literal, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 import re
 import os
@@ -19,7 +18,9 @@ import httpx
 from app.database import get_db
 from app.models.auth_models import Usuario, ProfissionalUbs, LoginAttempt, ProfessionalRequest, Cargo
 from app.utils.jwt_handler import (
+    CALENDAR_FEED_TOKEN_DAYS,
     create_access_token,
+    create_calendar_feed_token,
     create_password_reset_token,
     verify_password_reset_token,
 )
@@ -27,6 +28,8 @@ from app.utils.email_sender import send_password_reset_email
 from app.utils.cpf_validator import validate_cpf
 from app.utils.deps import get_current_active_user, get_current_gestor_user, get_current_admin_user
 from app.utils.limiter import limiter
+from app.utils.password_hasher import hash_password, verify_password, verify_and_update
+from app.services.login_audit import login_audit_writer, bump_login_counters, has_successful_login, recent_failures
 from slowapi.util import get_remote_address
 
 logger = logging.getLogger(__name__)
@@ -34,11 +37,10 @@ logger = logging.getLogger(__name__)
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
 cargos_router = APIRouter(tags=["cargos"])
 
-# Usa pbkdf2_sha256 para evitar dependência direta do backend bcrypt
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-
 MAX_LOGIN_ATTEMPTS = 5
 LOCKOUT_DURATION_MINUTES = 15
+# Falhas de um mesmo IP, somadas entre contas, na janela LOGIN_FAILURE_WINDOW_MINUTES (0 desativa)
+LOGIN_IP_MAX_FAILURES = int(os.getenv("LOGIN_IP_MAX_FAILURES", "50"))
 
 # Google OAuth
 _render_url = os.getenv("RENDER_EXTERNAL_URL", "").strip().rstrip("/")
@@ -257,15 +259,21 @@ class ProfessionalRequestApprove(BaseModel):
         return role
 
 
-def hash_password(raw: str) -> str:
-    return pwd_context.hash(raw)
+def _has_pending_changes(db: AsyncSession) -> bool:
+    return bool(db.new or db.deleted or any(db.is_modified(obj) for obj in db.dirty))
 
 
-def verify_password(raw: str, hashed: str) -> bool:
-    return pwd_context.verify(raw, hashed)
+async def log_login_attempt(db: AsyncSession, email: str, ip_address: str, sucesso: bool, motivo: str = None):
+    """Registra a tentativa de login.
 
+    Se a tentativa mudou o estado do usuário (contador, bloqueio, rehash) ou
+    foi bem-sucedida, a linha de auditoria vai no mesmo commit da mudança.
+    Caso contrário vai para o buffer de gravação em lote.
+    """
+    if login_audit_writer.running and not sucesso and not _has_pending_changes(db):
+        login_audit_writer.record(email, ip_address, sucesso, motivo)
+        return
 
-async def log_login_attempt(db: AsyncSession, email: str, ip_address: str, sucesso: bool, motivo: str = None):
     tentativa = LoginAttempt(
         email=email,
         ip_address=ip_address,
@@ -273,6 +281,7 @@ async def log_login_attempt(db: AsyncSession, email: str, ip_address: str, suces
         motivo=motivo
     )
     db.add(tentativa)
+    await bump_login_counters(db, [{"email": email, "ip_address": ip_address, "sucesso": sucesso}])
     await db.commit()
 
 
@@ -297,9 +306,9 @@ async def check_account_lockout(db: AsyncSession, user: Usuario) -> bool:
         return True
 
     if bloqueado_ate and bloqueado_ate <= agora:
+        # Commitado junto com o registro da tentativa (log_login_attempt)
         user.tentativas_login = 0
         user.bloqueado_ate = None
-        await db.commit()
 
     return False
 
@@ -310,14 +319,24 @@ async def handle_failed_login(db: AsyncSession, user: Usuario):
     if user.tentativas_login >= MAX_LOGIN_ATTEMPTS:
         user.bloqueado_ate = datetime.now(timezone.utc) + timedelta(minutes=LOCKOUT_DURATION_MINUTES)
         user.tentativas_login = 0
-    
-    await db.commit()
 
 
 async def reset_login_attempts(db: AsyncSession, user: Usuario):
-    user.tentativas_login = 0
-    user.bloqueado_ate = None
-    await db.commit()
+    if user.tentativas_login:
+        user.tentativas_login = 0
+    if user.bloqueado_ate is not None:
+        user.bloqueado_ate = None
+
+
+@auth_router.post("/calendar-feed-token", status_code=status.HTTP_200_OK)
+async def create_calendar_feed_token_route(
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Token para assinar os feeds ICS (?token=...) em clientes de calendário."""
+    return {
+        "token": create_calendar_feed_token(current_user.id),
+        "expires_in_days": CALENDAR_FEED_TOKEN_DAYS,
+    }
 
 
 @auth_router.post("/register", response_model=UsuarioOut, status_code=status.HTTP_201_CREATED)
@@ -338,7 +357,7 @@ async def register_user(
     usuario = Usuario(
         nome=payload.nome,
         email=payload.email,
-        senha=hash_password(payload.senha),
+        senha=await hash_password(payload.senha),
         cpf=payload.cpf,
         role="USER",
         cargo=None,
@@ -379,7 +398,7 @@ async def create_acs_user(
     usuario = Usuario(
         nome=payload.nome,
         email=payload.email,
-        senha=hash_password(payload.senha),
+        senha=await hash_password(payload.senha),
         cpf=payload.cpf,
         role="PROFISSIONAL",
         cargo="Agente Comunitário de Saúde",
@@ -414,7 +433,7 @@ async def reset_password_internal(
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-    usuario.senha = hash_password(payload.senha)
+    usuario.senha = await hash_password(payload.senha)
     usuario.tentativas_login = 0
     usuario.bloqueado_ate = None
     await db.commit()
@@ -491,7 +510,7 @@ async def reset_password_with_token(
     if not usuario or not usuario.ativo:
         raise HTTPException(status_code=400, detail="Link inválido ou expirado. Solicite um novo.")
 
-    usuario.senha = hash_password(payload.nova_senha)
+    usuario.senha = await hash_password(payload.nova_senha)
     usuario.tentativas_login = 0
     usuario.bloqueado_ate = None
     await db.commit()
@@ -503,6 +522,14 @@ async def reset_password_with_token(
 @limiter.limit("10/minute")
 async def login_user(request: Request, payload: UsuarioLogin, db: AsyncSession = Depends(get_db)):
     ip_cliente = get_remote_address(request)
+
+    # Credential stuffing: muitas contas diferentes a partir do mesmo IP (lê só o contador agregado)
+    if LOGIN_IP_MAX_FAILURES > 0 and await recent_failures(db, "ip", ip_cliente) >= LOGIN_IP_MAX_FAILURES:
+        await log_login_attempt(db, payload.email, ip_cliente, False, "IP bloqueado por excesso de falhas")
+        raise HTTPException(
+            status_code=429,
+            detail="Muitas tentativas de login a partir deste endereço. Tente novamente mais tarde.",
+        )
     
     resultado = await db.execute(select(Usuario).filter(Usuario.email == payload.email))
     usuario = resultado.scalar_one_or_none()
@@ -523,7 +550,8 @@ async def login_user(request: Request, payload: UsuarioLogin, db: AsyncSession =
         await log_login_attempt(db, payload.email, ip_cliente, False, "Usuario inativo")
         raise HTTPException(status_code=403, detail="Usuario inativo")
     
-    if not verify_password(payload.senha, usuario.senha):
+    senha_ok, novo_hash = await verify_and_update(payload.senha, usuario.senha)
+    if not senha_ok:
         await handle_failed_login(db, usuario)
         tentativas_restantes = MAX_LOGIN_ATTEMPTS - usuario.tentativas_login
         await log_login_attempt(db, payload.email, ip_cliente, False, f"Senha incorreta ({tentativas_restantes} tentativas restantes)")
@@ -536,6 +564,9 @@ async def login_user(request: Request, payload: UsuarioLogin, db: AsyncSession =
         
         raise HTTPException(status_code=401, detail="Email ou senha incorretos")
     
+    if novo_hash:
+        # Hash legado (menos rounds que o configurado): regrava com o custo atual
+        usuario.senha = novo_hash
     await reset_login_attempts(db, usuario)
     
     role = (usuario.role or "USER").upper()
@@ -829,27 +860,22 @@ async def change_password(
         raise HTTPException(status_code=400, detail="As senhas não conferem.")
 
     # Verifica se o usuário já fez algum login bem-sucedido via email/senha
-    resultado = await db.execute(
-        select(LoginAttempt).where(
-            LoginAttempt.email == current_user.email,
-            LoginAttempt.sucesso == True,
-        ).limit(1)
-    )
-    has_email_login = resultado.scalar_one_or_none() is not None
+    # (pelo contador agregado: o histórico de login_attempts é expurgado)
+    has_email_login = await has_successful_login(db, current_user.email)
 
     if has_email_login:
         # Usuário com senha própria: exige confirmação da senha atual
         if not payload.senha_atual:
             raise HTTPException(status_code=400, detail="Informe sua senha atual.")
-        if not verify_password(payload.senha_atual, current_user.senha):
+        if not await verify_password(payload.senha_atual, current_user.senha):
             raise HTTPException(status_code=401, detail="Senha atual incorreta.")
     else:
         # Usuário Google-only: permite definir senha sem confirmar a atual,
         # mas se informou a atual, valida mesmo assim
-        if payload.senha_atual and not verify_password(payload.senha_atual, current_user.senha):
+        if payload.senha_atual and not await verify_password(payload.senha_atual, current_user.senha):
             raise HTTPException(status_code=401, detail="Senha atual incorreta.")
 
-    current_user.senha = hash_password(payload.nova_senha)
+    current_user.senha = await hash_password(payload.nova_senha)
     await db.commit()
     return {"message": "Senha alterada com sucesso."}
 
@@ -926,7 +952,7 @@ async def google_callback(
         usuario = Usuario(
             nome=nome,
             email=email,
-            senha=hash_password(secrets.token_hex(32)),
+            senha=await hash_password(secrets.token_hex(32)),
             cpf=None,
             role="USER",
             ativo=True,
@@ -1,19 +1,40 @@
-from datetime import datetime
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, select
 
 from app.database import get_db
 from app.models.cronograma_models import CronogramaEvent, CronogramaTipo, RecurrenceType
 from app.models.diagnostico_models import UBS
 from app.models.auth_models import Usuario
-from app.schemas.cronograma_schemas import CronogramaCreate, CronogramaUpdate, CronogramaOut
-from app.utils.deps import get_current_active_user
+from app.schemas.cronograma_schemas import (
+    CronogramaCreate,
+    CronogramaUpdate,
+    CronogramaOut,
+    CronogramaOcorrenciaOut,
+    CronogramaMesOut,
+)
+from app.services.cronograma_mes import build_month
+from app.services.cronograma_recorrencia import list_occurrences, reaches_window
+from app.services.ics_feed import (
+    CALENDAR_FEED_PAST_DAYS,
+    conditional_headers,
+    cronograma_component,
+    feed_validators,
+    iter_calendar,
+)
+from app.utils.deps import get_calendar_feed_user, get_current_active_user
+from app.utils.http_cache import not_modified
 
 cronograma_router = APIRouter(prefix="/cronograma", tags=["cronograma"])
 
 EDIT_ROLES = {"GESTOR", "PROFISSIONAL", "ADMIN"}
+# Maior janela aceita em /cronograma/ocorrencias
+CRONOGRAMA_MAX_WINDOW_DAYS = int(os.getenv("CRONOGRAMA_MAX_WINDOW_DAYS", "366"))
 
 
 def _ensure_role(current_user: Usuario) -> None:
@@ -71,7 +92,8 @@ async def list_events(
 
     query = select(CronogramaEvent).where(CronogramaEvent.ubs_id == ubs_id)
     if start:
-        query = query.where(CronogramaEvent.inicio >= start)
+        # Inclui séries recorrentes iniciadas antes da janela que ainda a alcançam
+        query = query.where(reaches_window(start))
     if end:
         query = query.where(CronogramaEvent.inicio <= end)
 
@@ -79,6 +101,88 @@ async def list_events(
     return resultado.scalars().all()
 
 
+@cronograma_router.get("/ocorrencias", response_model=list[CronogramaOcorrenciaOut])
+async def list_occurrences_in_window(
+    ubs_id: int = Query(..., ge=1),
+    start: datetime = Query(...),
+    end: datetime = Query(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Ocorrências já expandidas (DAILY/WEEKLY/MONTHLY) que tocam [start, end]."""
+    if end < start:
+        raise HTTPException(status_code=400, detail="end deve ser posterior a start")
+    if end - start > timedelta(days=CRONOGRAMA_MAX_WINDOW_DAYS):
+        raise HTTPException(
+            status_code=400, detail=f"Janela maior que {CRONOGRAMA_MAX_WINDOW_DAYS} dias"
+        )
+    await _get_ubs_or_404(ubs_id, db)
+    return await list_occurrences(db, ubs_id, start, end)
+
+
+@cronograma_router.get("/{ubs_id}/mes", response_model=CronogramaMesOut)
+async def get_month_view(
+    ubs_id: int,
+    ano: int = Query(..., ge=2000, le=2100),
+    mes: int = Query(..., ge=1, le=12),
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Mês da UBS numa resposta: ocorrências do cronograma e bloqueios de agenda
+    intercalados por início, mais a contagem diária de consultas.
+
+    Bloqueios e contagens só vão para a equipe (GESTOR/PROFISSIONAL/ADMIN).
+    """
+    await _get_ubs_or_404(ubs_id, db)
+    equipe = (current_user.role or "USER").upper() in EDIT_ROLES
+    return await build_month(db, ubs_id, ano, mes, incluir_agenda=equipe)
+
+
+@cronograma_router.get("/{ubs_id}/feed.ics")
+async def cronograma_ics_feed(
+    ubs_id: int,
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_calendar_feed_user),
+):
+    """Feed iCalendar da UBS para assinatura em clientes de calendário.
+
+    Recorrências saem como RRULE. Autentica pelo cabeçalho Authorization ou por
+    ``?token=`` (ver ``POST /auth/calendar-feed-token``). ETag/Last-Modified vêm
+    de um agregado (contagem, maior id, maior updated_at), então a revalidação
+    com If-None-Match/If-Modified-Since responde 304 sem ler os eventos.
+    """
+    ubs = await _get_ubs_or_404(ubs_id, db)
+
+    filtro = (
+        CronogramaEvent.ubs_id == ubs_id,
+        reaches_window(datetime.now(timezone.utc) - timedelta(days=CALENDAR_FEED_PAST_DAYS)),
+    )
+    agregado = (await db.execute(
+        select(
+            func.count(CronogramaEvent.id),
+            func.max(CronogramaEvent.id),
+            func.max(func.coalesce(CronogramaEvent.updated_at, CronogramaEvent.created_at)),
+        ).where(*filtro)
+    )).one()
+    etag, ultima_alteracao = feed_validators(f"cronograma:{ubs_id}", *agregado)
+    headers = conditional_headers(etag, ultima_alteracao)
+    if not_modified(if_none_match, if_modified_since, headers["ETag"], ultima_alteracao):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    resultado = await db.execute(
+        select(CronogramaEvent).where(*filtro).order_by(CronogramaEvent.inicio, CronogramaEvent.id)
+    )
+    eventos = resultado.scalars().all()
+    headers["Content-Disposition"] = f'inline; filename="cronograma_ubs_{ubs_id}.ics"'
+    return StreamingResponse(
+        iter_calendar(f"Cronograma - {ubs.nome_ubs}", (cronograma_component(e) for e in eventos)),
+        media_type="text/calendar; charset=utf-8",
+        headers=headers,
+    )
+
+
 @cronograma_router.post("", response_model=CronogramaOut, status_code=status.HTTP_201_CREATED)
 async def create_event(
     payload: CronogramaCreate,
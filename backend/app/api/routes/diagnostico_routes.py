@@ -1,17 +1,15 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 import logging
-from fastapi.responses import Response as FastAPIResponse
+from fastapi.responses import FileResponse, Response as FastAPIResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, delete as sql_delete
-from sqlalchemy.orm import selectinload
 
 from app.database import get_db
 from app.models.diagnostico_models import (
     UBS,
     Service,
-    UBSService,
     Indicator,
     ProfessionalGroup,
     TerritoryProfile,
@@ -27,8 +25,6 @@ from app.schemas.diagnostico_schemas import (
     UBSOut,
     PaginatedUBS,
     UBSServicesPayload,
-    UBSServicesOut,
-    ServicesCatalogItem,
     IndicatorCreate,
     IndicatorUpdate,
     IndicatorOut,
@@ -52,12 +48,21 @@ from app.schemas.diagnostico_schemas import (
     UBSInterventionActionOut,
     UBSStatus,
     FullDiagnosisOut,
-    UBSSubmissionMetadata,
     ValidationErrorResponse,
     ErrorDetail,
     UBSSubmitRequest,
 )
 from app.utils.deps import get_current_professional_user, get_current_active_user
+from app.services.reporting.render_pool import (
+    REPORT_RENDER_RETRY_AFTER,
+    RenderQueueFull,
+    render_report,
+)
+from app.services.reporting import pdf_cache
+from app.services.reporting.situational_report import build_situational_report_payload, load_full_diagnosis
+from app.services.reporting.report_jobs import job_out, new_job, report_job_worker
+from app.schemas.relatorios_schemas import ReportExportJobOut
+from app.utils.http_cache import etag_matches, quote_etag
 
 
 diagnostico_router = APIRouter(prefix="/ubs", tags=["diagnostico"])
@@ -671,7 +676,7 @@ async def submit_diagnosis(
     await db.refresh(ubs)
 
     # Reaproveita a implementação do endpoint de agregação
-    return await get_full_diagnosis(ubs_id=ubs.id, db=db, current_user=current_user)
+    return await load_full_diagnosis(db, ubs.id)
 
 
 # ----------------------- Modelo agregado de leitura do diagnóstico -----------------------
@@ -684,84 +689,7 @@ async def get_full_diagnosis(
     current_user: Usuario = Depends(get_current_active_user),
 ):
     ubs = await _get_ubs_or_404(ubs_id, current_user, db)
-
-    # Carrega relacionamentos de forma eficiente
-    resultado = await db.execute(
-        select(UBS)
-        .options(
-            selectinload(UBS.services).selectinload(UBSService.service),
-            selectinload(UBS.indicators),
-            selectinload(UBS.professional_groups),
-            selectinload(UBS.territory_profile),
-            selectinload(UBS.needs),
-        )
-        .where(UBS.id == ubs.id)
-    )
-    ubs_obj: UBS = resultado.scalar_one()
-
-    # Serviços
-    itens_servicos: List[ServicesCatalogItem] = [
-        ServicesCatalogItem(id=link.service.id, name=link.service.name)
-        for link in sorted(ubs_obj.services, key=lambda l: l.service.name)
-    ]
-    saida_servicos = UBSServicesOut(services=itens_servicos, outros_servicos=ubs_obj.outros_servicos)
-
-    # Indicadores (último valor por nome)
-
-    indicadores_ordenados = sorted(
-        ubs_obj.indicators,
-        key=lambda i: (i.nome_indicador, i.created_at or i.id),
-    )
-    ultimo_por_nome: dict[str, Indicator] = {}
-    for ind in indicadores_ordenados:
-        ultimo_por_nome[ind.nome_indicador] = ind
-
-    indicators_latest: List[IndicatorOut] = [
-        IndicatorOut(
-            id=ind.id,
-            ubs_id=ind.ubs_id,
-            nome_indicador=ind.nome_indicador,
-            valor=float(ind.valor),
-            meta=float(ind.meta) if ind.meta is not None else None,
-            tipo_valor=ind.tipo_valor,
-            periodo_referencia=ind.periodo_referencia,
-            observacoes=ind.observacoes,
-            created_at=ind.created_at,
-            updated_at=ind.updated_at,
-        )
-        for ind in ultimo_por_nome.values()
-    ]
-
-    # Grupos profissionais
-    saida_profissionais: List[ProfessionalGroupOut] = [
-        ProfessionalGroupOut.model_validate(pg) for pg in ubs_obj.professional_groups
-    ]
-
-    # Território e necessidades
-    saida_territorio = (
-        TerritoryProfileOut.model_validate(ubs_obj.territory_profile)
-        if ubs_obj.territory_profile
-        else None
-    )
-    saida_necessidades = UBSNeedsOut.model_validate(ubs_obj.needs) if ubs_obj.needs else None
-
-    metadados_envio = UBSSubmissionMetadata(
-        status=UBSStatus(ubs_obj.status),
-        submitted_at=ubs_obj.submitted_at,
-        submitted_by=ubs_obj.submitted_by,
-    )
-
-    saida_ubs = UBSOut.model_validate(ubs_obj)
-
-    return FullDiagnosisOut(
-        ubs=saida_ubs,
-        services=saida_servicos,
-        indicators_latest=indicators_latest,
-        professional_groups=saida_profissionais,
-        territory_profile=saida_territorio,
-        needs=saida_necessidades,
-        submission=metadados_envio,
-    )
+    return await load_full_diagnosis(db, ubs.id)
 
 
 # ----------------------- Priorização de Problemas (GUT) -----------------------
@@ -1062,9 +990,30 @@ async def delete_intervention_action(
 # ----------------------- Exportação (PDF/ReportLab) -----------------------
 
 
+def _cached_pdf_response(
+    path,
+    digest: str,
+    filename_base: str,
+    if_none_match: Optional[str],
+    cache_status: str,
+):
+    etag = quote_etag(digest)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "X-Report-Cache": cache_status,
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    headers["Content-Disposition"] = f'attachment; filename="{filename_base}.pdf"'
+    headers["X-Report-Engine"] = "reportlab"
+    return FileResponse(path, media_type="application/pdf", headers=headers)
+
+
 @diagnostico_router.get("/{ubs_id}/export/pdf")
 async def export_situational_report_pdf(
     ubs_id: int,
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
     current_user: Usuario = Depends(get_current_active_user),
 ):
@@ -1074,64 +1023,80 @@ async def export_situational_report_pdf(
     problemas e necessidades, a matriz de priorização GUT, indicadores e recursos
     humanos. Os módulos de agendamento, materiais e microáreas ficaram fora do
     relatório desde a simplificação de escopo em baa9d13.
+
+    O PDF fica em cache em disco (ver ``pdf_cache``) e é servido com ETag; o
+    cliente pode revalidar com If-None-Match e receber 304.
     """
+    await _get_ubs_or_404(ubs_id, current_user, db)
 
-    diagnosis = await get_full_diagnosis(ubs_id=ubs_id, db=db, current_user=current_user)
+    cached = pdf_cache.lookup_ubs(ubs_id)
+    if cached:
+        digest, filename_base, path = cached
+        return _cached_pdf_response(path, digest, filename_base, if_none_match, "HIT")
 
-    # Matriz GUT: única parte do relatório que não vem de "/diagnosis".
-    problems_stmt = (
-        select(UBSProblem)
-        .options(
-            selectinload(UBSProblem.interventions).selectinload(UBSIntervention.actions)
-        )
-        .where(UBSProblem.ubs_id == ubs_id)
-        .order_by(UBSProblem.gut_score.desc(), UBSProblem.titulo)
-    )
-    problems_data = [
-        {
-            "titulo": p.titulo,
-            "gut_gravidade": p.gut_gravidade,
-            "gut_urgencia": p.gut_urgencia,
-            "gut_tendencia": p.gut_tendencia,
-            "gut_score": p.gut_score,
-            "is_prioritario": p.is_prioritario,
-            "interventions": [
-                {
-                    "objetivo": iv.objetivo,
-                    "responsavel": iv.responsavel,
-                    "status": iv.status,
-                    "actions": [
-                        {
-                            "acao": a.acao,
-                            "prazo": a.prazo.isoformat() if a.prazo else None,
-                            "status": a.status,
-                        }
-                        for a in (iv.actions or [])
-                    ],
-                }
-                for iv in (p.interventions or [])
-            ],
-        }
-        for p in (await db.execute(problems_stmt)).scalars().all()
-    ]
+    payload, digest, filename_base = await build_situational_report_payload(db, ubs_id)
 
-    try:
-        from app.services.reporting.simple_situational_report_pdf import (
-            generate_situational_report_pdf_simple,
-        )
+    # Mesmo conteúdo já renderizado antes (ex.: edição desfeita): só reaponta o índice.
+    path = pdf_cache.get_blob(digest)
+    if path is not None:
+        pdf_cache.remember_ubs(ubs_id, digest, filename_base)
+        return _cached_pdf_response(path, digest, filename_base, if_none_match, "HIT")
 
-        pdf_bytes, filename_base = generate_situational_report_pdf_simple(
-            diagnosis,
-            municipality="Município de Parnaíba",
-            reference_period=(diagnosis.ubs.periodo_referencia or ""),
-            problems=problems_data,
-        )
+    # A renderização roda no pool de processos para não travar o event loop.
+    try:
+        pdf_bytes, filename_base, render_ms = await render_report("situational", payload)
+    except RenderQueueFull as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Muitos relatórios em geração no momento. Tente novamente em instantes.",
+            headers={"Retry-After": str(REPORT_RENDER_RETRY_AFTER)},
+        ) from exc
     except Exception as exc:
         logger.exception("Erro ao gerar PDF")
         raise HTTPException(status_code=500, detail=f"Erro ao gerar PDF: {exc}") from exc
 
+    try:
+        pdf_cache.put_blob(digest, pdf_bytes)
+        pdf_cache.remember_ubs(ubs_id, digest, filename_base)
+    except OSError as exc:
+        logger.warning("Não foi possível gravar o PDF no cache: %s", exc)
+
     headers = {
         "Content-Disposition": f'attachment; filename="{filename_base}.pdf"',
         "X-Report-Engine": "reportlab",
+        "X-Report-Render-Ms": f"{render_ms:.0f}",
+        "X-Report-Cache": "MISS",
+        "ETag": quote_etag(digest),
+        "Cache-Control": "private, no-cache",
     }
     return FastAPIResponse(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+@diagnostico_router.post(
+    "/{ubs_id}/export/jobs",
+    response_model=ReportExportJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def enqueue_situational_report_job(
+    ubs_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Enfileira a exportação do relatório situacional e devolve o job para acompanhamento.
+
+    O payload é montado aqui (consultas rápidas); só a renderização vai para o worker.
+    Acompanhe em ``GET /relatorios/jobs/{job_id}``.
+    """
+    await _get_ubs_or_404(ubs_id, current_user, db)
+    payload, _digest, filename_base = await build_situational_report_payload(db, ubs_id)
+    job = new_job(
+        "situational",
+        ubs_id=ubs_id,
+        requested_by=current_user.id,
+        payload=payload,
+        filename=filename_base,
+    )
+    db.add(job)
+    await db.commit()
+    report_job_worker.enqueue(job.id)
+    return job_out(job)
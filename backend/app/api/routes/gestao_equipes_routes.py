@@ -21,6 +21,14 @@ from app.schemas.gestao_equipes_schemas import (
 )
 from app.utils.deps import get_current_user
 from app.models.diagnostico_models import UBS
+from app.services.reporting.render_pool import (
+    REPORT_RENDER_RETRY_AFTER,
+    RenderQueueFull,
+    build_microareas_payload,
+    render_report,
+)
+from app.services.reporting.report_jobs import job_out, new_job, report_job_worker
+from app.schemas.relatorios_schemas import ReportExportJobOut
 
 gestao_equipes_router = APIRouter(tags=["Gestão de Equipes e Microáreas"])
 
@@ -179,15 +187,7 @@ async def listar_microareas(
     return microareas
 
 
-@gestao_equipes_router.get("/gestao-equipes/microareas/export/pdf")
-async def export_microareas_pdf(
-    current_user: Usuario = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-    ubs_id: Optional[int] = Query(None, ge=1),
-):
-    """Exporta um PDF com a situacao atual das microareas."""
-    _ensure_can_view(current_user)
-
+async def _microareas_report_payload(db: AsyncSession, ubs_id: Optional[int], current_user: Usuario) -> dict:
     if not ubs_id:
         raise HTTPException(status_code=400, detail="Informe o ubs_id.")
 
@@ -214,25 +214,64 @@ async def export_microareas_pdf(
     for agente, usuario in agentes_rows:
         agentes_por_microarea.setdefault(agente.microarea_id, []).append(usuario.nome)
 
-    try:
-        from app.services.reporting.microareas_report_pdf import generate_microareas_report_pdf
+    return build_microareas_payload(
+        ubs=ubs,
+        microareas=microareas,
+        agentes_por_microarea=agentes_por_microarea,
+        emitted_by=(current_user.nome or None),
+    )
 
-        pdf_bytes, filename_base = generate_microareas_report_pdf(
-            ubs=ubs,
-            microareas=microareas,
-            agentes_por_microarea=agentes_por_microarea,
-            emitted_by=(current_user.nome or None),
-        )
+
+@gestao_equipes_router.get("/gestao-equipes/microareas/export/pdf")
+async def export_microareas_pdf(
+    current_user: Usuario = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    ubs_id: Optional[int] = Query(None, ge=1),
+):
+    """Exporta um PDF com a situacao atual das microareas."""
+    _ensure_can_view(current_user)
+
+    payload = await _microareas_report_payload(db, ubs_id, current_user)
+    try:
+        pdf_bytes, filename_base, render_ms = await render_report("microareas", payload)
+    except RenderQueueFull as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Muitos relatórios em geração no momento. Tente novamente em instantes.",
+            headers={"Retry-After": str(REPORT_RENDER_RETRY_AFTER)},
+        ) from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar PDF: {exc}") from exc
 
     headers = {
         "Content-Disposition": f'attachment; filename="{filename_base}.pdf"',
         "X-Report-Engine": "reportlab",
+        "X-Report-Render-Ms": f"{render_ms:.0f}",
     }
     return FastAPIResponse(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
 
+@gestao_equipes_router.post(
+    "/gestao-equipes/microareas/export/jobs",
+    response_model=ReportExportJobOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def enqueue_microareas_report_job(
+    current_user: Usuario = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    ubs_id: Optional[int] = Query(None, ge=1),
+):
+    """Enfileira a exportação do PDF de microareas; acompanhe em /relatorios/jobs/{job_id}."""
+    _ensure_can_view(current_user)
+
+    payload = await _microareas_report_payload(db, ubs_id, current_user)
+    job = new_job("microareas", ubs_id=ubs_id, requested_by=current_user.id, payload=payload)
+    db.add(job)
+    await db.commit()
+    report_job_worker.enqueue(job.id)
+    return job_out(job)
+
+
 @gestao_equipes_router.post(
     "/gestao-equipes/microareas",
     response_model=MicroareaOut,
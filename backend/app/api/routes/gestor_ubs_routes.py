@@ -1,14 +1,19 @@
 from typing import List
 import logging
 
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import or_, select
 
 from app.database import get_db
 from app.models.diagnostico_models import UBS
 from app.models.auth_models import Usuario
-from app.schemas.diagnostico_schemas import GestorUBSItem, UBSUpdate
+from app.schemas.diagnostico_schemas import GestorBulkExportRequest, GestorUBSItem, UBSUpdate
+from app.services.reporting.bulk_export import stream_reports_zip
+from app.services.reporting.situational_report import build_situational_report_payload
 from app.utils.deps import get_current_gestor_user
 
 gestor_ubs_router = APIRouter(prefix="/gestor/ubs", tags=["gestor-ubs"])
@@ -45,6 +50,43 @@ async def list_all_ubs(
     return items
 
 
+@gestor_ubs_router.post("/export/zip")
+async def export_ubs_reports_zip(
+    payload: GestorBulkExportRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_gestor_user),
+):
+    """Exporta os relatórios situacionais de várias UBS num único ZIP.
+
+    Seleciona por ``ubs_ids`` e/ou ``status``; sem nenhum dos dois, exporta
+    todas as UBS não deletadas. Os dados são lidos antes de a resposta
+    começar; a renderização (em paralelo, no pool de processos) e o ZIP são
+    transmitidos conforme cada PDF fica pronto.
+    """
+    stmt = select(UBS.id).where(_not_deleted()).order_by(UBS.id)
+    if payload.ubs_ids:
+        stmt = stmt.where(UBS.id.in_(payload.ubs_ids))
+    if payload.status:
+        stmt = stmt.where(UBS.status == payload.status.value)
+    ubs_ids = (await db.execute(stmt)).scalars().all()
+    if not ubs_ids:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Nenhuma UBS encontrada para exportar")
+
+    itens = []
+    for ubs_id in ubs_ids:
+        report_payload, _digest, filename_base = await build_situational_report_payload(db, ubs_id)
+        itens.append((f"{ubs_id}_{filename_base}.pdf", "situational", report_payload))
+
+    logger.info("Gestor %s: exportação em lote de %d UBS", current_user.id, len(itens))
+
+    nome_zip = f"relatorios_situacionais_{datetime.now().strftime('%Y%m%d_%H%M')}.zip"
+    return StreamingResponse(
+        stream_reports_zip(itens),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{nome_zip}"'},
+    )
+
+
 @gestor_ubs_router.patch("/{ubs_id}", response_model=GestorUBSItem)
 async def update_ubs_gestor(
     ubs_id: int,
@@ -1,23 +1,58 @@
+from datetime import datetime, timezone
 from pathlib import Path
+import os
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, status, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response, status, Query
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
+from sqlalchemy import select, or_, update
 from sqlalchemy.orm import selectinload
 
 from app.database import get_db
-from app.models.materiais_models import EducationalMaterial, EducationalMaterialFile
+from app.models.materiais_models import EducationalMaterial, EducationalMaterialFile, MaterialUploadSession
 from app.models.diagnostico_models import UBS
 from app.models.auth_models import Usuario
 from app.schemas.materiais_schemas import (
     EducationalMaterialUpdate,
     EducationalMaterialOut,
     EducationalMaterialFileOut,
+    MaterialDownloadUrlOut,
+    MaterialFileByHash,
+    MaterialUploadCreate,
+    MaterialUploadFinalize,
+    MaterialUploadOut,
+)
+from app.services.material_storage import (
+    StagedUpload,
+    abandon_blob,
+    acquire_blob,
+    discard,
+    blob_path,
+    is_blob_path,
+    purge_unreferenced_blob,
+    reference_existing_blob,
+    release_blob,
+    stage_upload,
+    tmp_dir,
+)
+from app.services.material_uploads import (
+    MATERIAIS_RESUMABLE_MAX_BYTES,
+    forget_running_hash,
+    is_expired,
+    keep_running_hash,
+    session_expiry,
+    take_running_hash,
+    upload_sha256,
+    write_chunk,
 )
 from app.utils.deps import get_current_active_user
-from app.utils.jwt_handler import verify_token
+from app.utils.http_cache import ValidatedFileResponse, http_date, not_modified, quote_etag
+from app.utils.jwt_handler import (
+    sign_material_download,
+    verify_material_download,
+    verify_token,
+)
 
 materiais_router = APIRouter(prefix="/materiais", tags=["materiais"])
 
@@ -31,6 +66,7 @@ PUBLICO_ALVO_AMBOS = "AMBOS"
 
 _UPLOADS_BASE_DIR = Path(__file__).resolve().parents[1] / "uploads" / "materials"
 _MAX_FILE_SIZE_BYTES = 20 * 1024 * 1024
+_MAX_FILE_SIZE_LABEL = "20MB"
 
 
 def _sanitize_filename(name: str) -> str:
@@ -122,6 +158,61 @@ async def _get_user_from_token(raw_token: str, db: AsyncSession) -> Usuario:
     return usuario
 
 
+async def _stage(file: UploadFile) -> StagedUpload:
+    return await stage_upload(file, _UPLOADS_BASE_DIR, _MAX_FILE_SIZE_BYTES, _MAX_FILE_SIZE_LABEL)
+
+
+async def _save_staged_file(
+    db: AsyncSession,
+    material: EducationalMaterial,
+    staged: StagedUpload,
+    original_filename: str | None,
+    content_type: str | None,
+) -> EducationalMaterialFile:
+    """Guarda o upload no blob do seu conteúdo, adiciona a linha e faz o commit.
+
+    Se o commit falhar, o blob criado por esta chamada sai do disco.
+    """
+    blob = await acquire_blob(db, staged, _UPLOADS_BASE_DIR)
+    file_entry = EducationalMaterialFile(
+        material_id=material.id,
+        original_filename=original_filename,
+        content_type=content_type,
+        size_bytes=staged.size_bytes,
+        sha256=staged.sha256,
+        storage_path=str(blob.path),
+    )
+    db.add(file_entry)
+    try:
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        await abandon_blob(blob)
+        raise
+    return file_entry
+
+
+async def _remove_stored_file(db: AsyncSession, file_row: EducationalMaterialFile, pendentes: list) -> None:
+    """Solta o arquivo da linha. O que sai do disco vai para ``pendentes``, apagado só após o commit.
+
+    Blob compartilhado: o hash, se era a última referência. Arquivo antigo (pasta do material): o caminho.
+    """
+    storage_path = _resolve_path(file_row.storage_path)
+    if is_blob_path(_UPLOADS_BASE_DIR, file_row.sha256, storage_path):
+        if await release_blob(db, file_row.sha256):
+            pendentes.append(file_row.sha256)
+    else:
+        pendentes.append(storage_path)
+
+
+async def _purge_removed_files(db: AsyncSession, pendentes: list) -> None:
+    for pendente in pendentes:
+        if isinstance(pendente, Path):
+            await run_in_threadpool(discard, pendente)
+        else:
+            await purge_unreferenced_blob(db, pendente)
+
+
 async def _get_ubs_or_404(ubs_id: int, db: AsyncSession) -> UBS:
     resultado = await db.execute(
         select(UBS).where(UBS.id == ubs_id, UBS.is_deleted.is_(False))
@@ -169,6 +260,9 @@ async def create_material(
     _ensure_role(current_user)
     await _get_ubs_or_404(ubs_id, db)
 
+    # O arquivo é validado (tamanho) antes de criar o material
+    staged = await _stage(file) if file is not None else None
+
     material = EducationalMaterial(
         ubs_id=ubs_id,
         titulo=titulo,
@@ -179,32 +273,15 @@ async def create_material(
         updated_by=current_user.id,
     )
     db.add(material)
-    await db.commit()
-
-    if file is not None:
-        safe_name = _sanitize_filename(file.filename)
-        filename = f"{uuid.uuid4().hex}_{safe_name}"
-        dest_dir = _UPLOADS_BASE_DIR / str(material.ubs_id) / str(material.id)
-        dest_dir.mkdir(parents=True, exist_ok=True)
-        storage_path = dest_dir / filename
-
-        content = await file.read()
-        if len(content) > _MAX_FILE_SIZE_BYTES:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="Arquivo excede o limite de 20MB",
-            )
-        storage_path.write_bytes(content)
-
-        file_entry = EducationalMaterialFile(
-            material_id=material.id,
-            original_filename=file.filename,
-            content_type=file.content_type,
-            size_bytes=len(content),
-            storage_path=str(storage_path),
-        )
-        db.add(file_entry)
+    try:
         await db.commit()
+    except Exception:
+        if staged is not None:
+            discard(staged.path)
+        raise
+
+    if staged is not None:
+        await _save_staged_file(db, material, staged, file.filename, file.content_type)
 
     result = await db.execute(
         select(EducationalMaterial)
@@ -253,16 +330,25 @@ async def delete_material(
     if not material:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material não encontrado")
 
+    pendentes: list = []
     resultado = await db.execute(
         select(EducationalMaterialFile).where(EducationalMaterialFile.material_id == material_id)
     )
     for file_row in resultado.scalars().all():
-        storage_path = _resolve_path(file_row.storage_path)
-        if storage_path.exists():
-            storage_path.unlink()
+        await _remove_stored_file(db, file_row, pendentes)
+
+    # Uploads retomáveis em andamento saem em cascata; os arquivos parciais, após o commit
+    parciais = await db.execute(
+        select(MaterialUploadSession.id, MaterialUploadSession.arquivo_parcial)
+        .where(MaterialUploadSession.material_id == material_id)
+    )
+    for upload_id, arquivo_parcial in parciais.all():
+        forget_running_hash(upload_id)
+        pendentes.append(Path(arquivo_parcial))
 
     await db.delete(material)
     await db.commit()
+    await _purge_removed_files(db, pendentes)
     return None
 
 
@@ -279,33 +365,269 @@ async def upload_material_file(
     if not material:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material não encontrado")
 
-    safe_name = _sanitize_filename(file.filename)
-    filename = f"{uuid.uuid4().hex}_{safe_name}"
-    dest_dir = _UPLOADS_BASE_DIR / str(material.ubs_id) / str(material.id)
-    dest_dir.mkdir(parents=True, exist_ok=True)
-    storage_path = dest_dir / filename
+    staged = await _stage(file)
+    file_entry = await _save_staged_file(db, material, staged, file.filename, file.content_type)
+    await db.refresh(file_entry)
+    return file_entry
+
+
+@materiais_router.post(
+    "/{material_id}/files/existente",
+    response_model=EducationalMaterialFileOut,
+    status_code=status.HTTP_201_CREATED,
+)
+async def attach_existing_file(
+    material_id: int,
+    payload: MaterialFileByHash,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Anexa um conteúdo já armazenado, pelo SHA-256, sem reenviar os bytes.
+
+    Só vale para conteúdo de um material que o usuário pode ver — o hash sozinho
+    não dá acesso aos bytes. 404 em qualquer outro caso (inclusive quando o
+    servidor não tem o conteúdo): o cliente faz o upload normal.
+    """
+    _ensure_role(current_user)
 
-    content = await file.read()
-    if len(content) > _MAX_FILE_SIZE_BYTES:
+    material = await db.get(EducationalMaterial, material_id)
+    if not material:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material não encontrado")
+
+    sha256 = payload.sha256.lower()
+    visivel = (
+        select(EducationalMaterialFile.id)
+        .join(EducationalMaterial, EducationalMaterial.id == EducationalMaterialFile.material_id)
+        .where(EducationalMaterialFile.sha256 == sha256)
+    )
+    filtro = _build_material_view_filter(current_user.role or "USER")
+    if filtro is not None:
+        visivel = visivel.where(filtro)
+    if (await db.execute(visivel.limit(1))).first() is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conteúdo não encontrado")
+
+    blob = await reference_existing_blob(db, _UPLOADS_BASE_DIR, sha256)
+    if blob is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Conteúdo não encontrado")
+
+    file_entry = EducationalMaterialFile(
+        material_id=material.id,
+        original_filename=payload.filename,
+        content_type=payload.content_type,
+        size_bytes=blob.size_bytes,
+        sha256=sha256,
+        storage_path=blob.storage_path,
+    )
+    db.add(file_entry)
+    await db.commit()
+    await db.refresh(file_entry)
+    return file_entry
+
+
+# --- Uploads retomáveis (ver app/services/material_uploads.py) ---
+
+async def _get_upload_session(upload_id: str, db: AsyncSession, current_user: Usuario) -> MaterialUploadSession:
+    _ensure_role(current_user)
+    sessao = await db.get(MaterialUploadSession, upload_id)
+    if not sessao or is_expired(sessao):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sessão de upload não encontrada")
+    role = (current_user.role or "USER").upper()
+    if sessao.created_by != current_user.id and role not in ("GESTOR", "ADMIN"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito")
+    return sessao
+
+
+@materiais_router.post(
+    "/{material_id}/uploads", response_model=MaterialUploadOut, status_code=status.HTTP_201_CREATED
+)
+async def create_upload_session(
+    material_id: int,
+    payload: MaterialUploadCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Abre um upload retomável; o arquivo é enviado depois, em partes, via PUT."""
+    _ensure_role(current_user)
+
+    material = await db.get(EducationalMaterial, material_id)
+    if not material:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material não encontrado")
+    if payload.tamanho_bytes > MATERIAIS_RESUMABLE_MAX_BYTES:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="Arquivo excede o limite de 20MB",
+            detail="Arquivo excede o limite para upload retomável",
         )
-    storage_path.write_bytes(content)
 
-    file_entry = EducationalMaterialFile(
+    upload_id = str(uuid.uuid4())
+    arquivo_parcial = tmp_dir(_UPLOADS_BASE_DIR) / f"{upload_id}.upload"
+    arquivo_parcial.touch()
+
+    sessao = MaterialUploadSession(
+        id=upload_id,
         material_id=material.id,
-        original_filename=file.filename,
-        content_type=file.content_type,
-        size_bytes=len(content),
-        storage_path=str(storage_path),
+        created_by=current_user.id,
+        original_filename=payload.filename,
+        content_type=payload.content_type,
+        tamanho_bytes=payload.tamanho_bytes,
+        recebido_bytes=0,
+        arquivo_parcial=str(arquivo_parcial),
+        expira_em=session_expiry(),
     )
-    db.add(file_entry)
+    db.add(sessao)
     await db.commit()
+    return sessao
+
+
+@materiais_router.get("/uploads/{upload_id}", response_model=MaterialUploadOut)
+async def get_upload_session(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Estado do upload: ``recebido_bytes`` é o offset para retomar."""
+    return await _get_upload_session(upload_id, db, current_user)
+
+
+@materiais_router.put("/uploads/{upload_id}", response_model=MaterialUploadOut)
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Grava o corpo (bytes crus) a partir de ``offset``."""
+    sessao = await _get_upload_session(upload_id, db, current_user)
+    recebido = sessao.recebido_bytes
+    if offset > recebido:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Offset fora de ordem; retome a partir de {recebido}",
+        )
+    # O corpo chega na velocidade do cliente: devolve a conexão ao pool enquanto isso
+    await db.commit()
+
+    digest = take_running_hash(upload_id, offset)
+    try:
+        gravados, _ = await write_chunk(
+            Path(sessao.arquivo_parcial), offset, request.stream(), sessao.tamanho_bytes - offset, digest
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Parte ultrapassa o tamanho declarado do arquivo",
+        )
+
+    # Condicional: outro PUT simultâneo na mesma sessão não pode recuar o offset
+    novo_recebido = max(recebido, offset + gravados)
+    resultado = await db.execute(
+        update(MaterialUploadSession)
+        .where(MaterialUploadSession.id == upload_id, MaterialUploadSession.recebido_bytes == recebido)
+        .values(recebido_bytes=novo_recebido, expira_em=session_expiry())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if resultado.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload alterado por outra requisição")
+    if digest is not None and offset + gravados == novo_recebido:
+        keep_running_hash(upload_id, novo_recebido, digest)
+    await db.refresh(sessao)
+    return sessao
+
+
+@materiais_router.post("/uploads/{upload_id}/finalizar", response_model=EducationalMaterialFileOut)
+async def finalize_upload_session(
+    upload_id: str,
+    payload: MaterialUploadFinalize | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Conclui o upload e cria o arquivo do material."""
+    sessao = await _get_upload_session(upload_id, db, current_user)
+    if sessao.recebido_bytes != sessao.tamanho_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incompleto: {sessao.recebido_bytes} de {sessao.tamanho_bytes} bytes",
+        )
+    material = await db.get(EducationalMaterial, sessao.material_id)
+    if not material:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Material não encontrado")
+
+    caminho = Path(sessao.arquivo_parcial)
+    sha256 = await upload_sha256(upload_id, caminho, sessao.tamanho_bytes)
+    if payload is not None and payload.sha256 and payload.sha256.lower() != sha256:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="SHA-256 do arquivo não confere")
+
+    staged = StagedUpload(path=caminho, size_bytes=sessao.tamanho_bytes, sha256=sha256)
+    await db.delete(sessao)
+    file_entry = await _save_staged_file(db, material, staged, sessao.original_filename, sessao.content_type)
     await db.refresh(file_entry)
     return file_entry
 
 
+@materiais_router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_upload_session(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    sessao = await _get_upload_session(upload_id, db, current_user)
+    caminho = Path(sessao.arquivo_parcial)
+    await db.delete(sessao)
+    await db.commit()
+    forget_running_hash(upload_id)
+    discard(caminho)
+    return None
+
+
+async def _serve_file(
+    storage_path: Path,
+    sha256: str | None,
+    criado_em: datetime | None,
+    filename: str,
+    content_type: str | None,
+    request: Request,
+    cache_control: str = "private, no-cache",
+) -> Response:
+    """Download com ETag forte, GET condicional (304) e Range (206).
+
+    Com o SHA-256 guardado, ETag e Last-Modified saem da linha do arquivo e o
+    304 é respondido sem tocar no disco. Arquivos antigos, sem hash, usam
+    mtime e tamanho do arquivo.
+    """
+    stat_result = None
+    if sha256:
+        etag = quote_etag(sha256)
+        ultima_alteracao = criado_em.replace(tzinfo=timezone.utc) if criado_em and criado_em.tzinfo is None else criado_em
+    else:
+        stat_result = await _stat_or_404(storage_path)
+        etag = quote_etag(f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}")
+        ultima_alteracao = datetime.fromtimestamp(stat_result.st_mtime, tz=timezone.utc)
+
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if ultima_alteracao is not None:
+        headers["Last-Modified"] = http_date(ultima_alteracao)
+    if not_modified(
+        request.headers.get("if-none-match"), request.headers.get("if-modified-since"), etag, ultima_alteracao
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return ValidatedFileResponse(
+        path=str(storage_path),
+        filename=filename,
+        media_type=content_type or "application/octet-stream",
+        headers=headers,
+        stat_result=stat_result or await _stat_or_404(storage_path),
+    )
+
+
+async def _stat_or_404(storage_path: Path) -> os.stat_result:
+    try:
+        return await run_in_threadpool(os.stat, storage_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Arquivo não localizado")
+
+
 @materiais_router.get("/files/{file_id}/download")
 async def download_material_file(
     file_id: int,
@@ -334,14 +656,78 @@ async def download_material_file(
     if not material or not _can_view_material(material, usuario.role or "USER"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito")
 
-    storage_path = _resolve_path(file_entry.storage_path)
-    if not storage_path.exists():
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Arquivo não localizado")
+    return await _serve_file(
+        _resolve_path(file_entry.storage_path),
+        file_entry.sha256,
+        file_entry.created_at,
+        file_entry.original_filename,
+        file_entry.content_type,
+        request,
+    )
 
-    return FileResponse(
-        path=str(storage_path),
-        filename=file_entry.original_filename,
-        media_type=file_entry.content_type or "application/octet-stream",
+
+@materiais_router.post("/files/{file_id}/download-url", response_model=MaterialDownloadUrlOut)
+async def create_material_download_url(
+    file_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """URL de download assinada e de curta duração, válida só para este arquivo.
+
+    A permissão é checada aqui, uma vez; o download pela URL não consulta o
+    banco (ver ``download_signed_material_file``). Só arquivos guardados como
+    blob (pelo SHA-256) têm URL assinada: o caminho sai do hash, não da URL.
+    """
+    _ensure_view_role(current_user)
+
+    file_entry = await db.get(EducationalMaterialFile, file_id)
+    if not file_entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Arquivo não encontrado")
+
+    material = await db.get(EducationalMaterial, file_entry.material_id)
+    if not material or not _can_view_material(material, current_user.role or "USER"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito")
+
+    if not is_blob_path(_UPLOADS_BASE_DIR, file_entry.sha256, _resolve_path(file_entry.storage_path)):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Arquivo sem URL assinada; use /materiais/files/{id}/download",
+        )
+
+    nome = file_entry.original_filename or "arquivo"
+    content_type = file_entry.content_type or ""
+    assinatura, expira_em = sign_material_download(file_entry.id, file_entry.sha256, nome, content_type)
+    url = request.url_for("download_signed_material_file", file_id=file_entry.id).include_query_params(
+        h=file_entry.sha256, e=expira_em, n=nome, ct=content_type, assinatura=assinatura
+    )
+    return MaterialDownloadUrlOut(url=str(url), expira_em=datetime.fromtimestamp(expira_em, tz=timezone.utc))
+
+
+@materiais_router.get("/files/{file_id}/signed")
+async def download_signed_material_file(
+    file_id: int,
+    request: Request,
+    h: str = Query(..., pattern="^[0-9a-f]{64}$"),
+    e: int = Query(...),
+    n: str = Query(...),
+    ct: str = Query(""),
+    assinatura: str = Query(...),
+):
+    """Download por URL assinada: só verificação de assinatura, sem banco."""
+    if not verify_material_download(assinatura, file_id, h, e, n, ct):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Link de download inválido ou expirado")
+
+    restante = max(e - int(datetime.now(timezone.utc).timestamp()), 0)
+    return await _serve_file(
+        blob_path(_UPLOADS_BASE_DIR, h),
+        h,
+        None,
+        n,
+        ct or None,
+        request,
+        # A URL já é a credencial: pode ficar em cache até expirar
+        cache_control=f"private, max-age={restante}",
     )
 
 
@@ -357,10 +743,10 @@ async def delete_material_file(
     if not file_entry:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Arquivo não encontrado")
 
-    storage_path = _resolve_path(file_entry.storage_path)
-    if storage_path.exists():
-        storage_path.unlink()
+    pendentes: list = []
+    await _remove_stored_file(db, file_entry, pendentes)
 
     await db.delete(file_entry)
     await db.commit()
+    await _purge_removed_files(db, pendentes)
     return None
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models.auth_models import Usuario
+from app.models.relatorios_models import ReportExportJob, StatusReportJob
+from app.schemas.relatorios_schemas import ReportExportJobOut
+from app.services.reporting.report_jobs import job_out
+from app.utils.deps import get_current_active_user
+
+relatorios_router = APIRouter(prefix="/relatorios", tags=["relatorios"])
+
+
+async def _get_job_or_404(job_id: str, current_user: Usuario, db: AsyncSession) -> ReportExportJob:
+    job = await db.get(ReportExportJob, job_id)
+    # Só quem pediu (ou o admin) enxerga o job; para os demais ele "não existe".
+    role = (current_user.role or "USER").upper()
+    if not job or (job.requested_by != current_user.id and role != "ADMIN"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exportação não encontrada")
+    return job
+
+
+@relatorios_router.get("/jobs/{job_id}", response_model=ReportExportJobOut)
+async def get_report_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    """Status de uma exportação assíncrona (PENDENTE, PROCESSANDO, CONCLUIDO ou FALHOU)."""
+    job = await _get_job_or_404(job_id, current_user, db)
+    return job_out(job)
+
+
+@relatorios_router.get("/jobs/{job_id}/download")
+async def download_report_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user),
+):
+    job = await _get_job_or_404(job_id, current_user, db)
+    if job.status != StatusReportJob.CONCLUIDO.value:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Relatório ainda não está pronto (status: {job.status}).",
+        )
+    if not job.artifact_path or not Path(job.artifact_path).is_file():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Arquivo do relatório expirou.")
+
+    return FileResponse(
+        job.artifact_path,
+        media_type="application/pdf",
+        filename=f"{job.filename or 'relatorio'}.pdf",
+        headers={"X-Report-Engine": "reportlab"},
+    )
@@ -1,6 +1,6 @@
 # Torna `models` um pacote para que imports com efeitos colaterais (metadata) funcionem.
 
-from .auth_models import Usuario, ProfissionalUbs, LoginAttempt, ProfessionalRequest  # noqa: F401
+from .auth_models import Usuario, ProfissionalUbs, LoginAttempt, LoginAttemptCounter, ProfessionalRequest  # noqa: F401
 from .diagnostico_models import (  # noqa: F401
     UBS,
     Service,
@@ -10,8 +10,9 @@ from .diagnostico_models import (  # noqa: F401
     TerritoryProfile,
     UBSNeeds,
 )
-from .agendamento_models import Agendamento, BloqueioAgenda # noqa: F401
-from .materiais_models import EducationalMaterial, EducationalMaterialFile  # noqa: F401
+from .agendamento_models import Agendamento, BloqueioAgenda, OcupacaoAgendaDiaria # noqa: F401
+from .materiais_models import EducationalMaterial, EducationalMaterialFile, MaterialBlob, MaterialUploadSession  # noqa: F401
 from .cronograma_models import CronogramaEvent  # noqa: F401
 from .suporte_feedback_models import SuporteFeedback, FeedbackMensagem  # noqa: F401
-from .gestao_equipes_models import Microarea, AgenteSaude  # noqa: F401
\ No newline at end of file
+from .gestao_equipes_models import Microarea, AgenteSaude  # noqa: F401
+from .relatorios_models import ReportExportJob  # noqa: F401
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Text, Enum, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -10,8 +10,35 @@ class StatusAgendamento(str, enum.Enum):
     REALIZADO = "REALIZADO"
     REAGENDADO = "REAGENDADO"
 
+# Status que ocupam o horário do profissional
+STATUS_ATIVOS = (StatusAgendamento.AGENDADO.value, StatusAgendamento.REAGENDADO.value)
+_ATIVO_WHERE = text("status IN ('AGENDADO', 'REAGENDADO')")
+_CONFIRMACAO_PENDENTE_WHERE = text("confirmacao_enviada IS NULL")
+
+
 class Agendamento(Base):
     __tablename__ = "agendamentos"
+    __table_args__ = (
+        Index("ix_agendamentos_profissional_data_status", "profissional_id", "data_hora", "status"),
+        # Histórico do paciente (/agendamentos/meus), paginado por data
+        Index("ix_agendamentos_paciente_data", "paciente_id", "data_hora"),
+        # Impede dois agendamentos ativos no mesmo horário mesmo com POSTs concorrentes
+        Index(
+            "uq_agendamentos_profissional_horario_ativo",
+            "profissional_id",
+            "data_hora",
+            unique=True,
+            postgresql_where=_ATIVO_WHERE,
+            sqlite_where=_ATIVO_WHERE,
+        ),
+        # Busca do despachante de confirmações: só as ainda não enviadas
+        Index(
+            "ix_agendamentos_confirmacao_pendente",
+            "data_hora",
+            postgresql_where=_CONFIRMACAO_PENDENTE_WHERE,
+            sqlite_where=_CONFIRMACAO_PENDENTE_WHERE,
+        ),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     paciente_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
@@ -23,6 +50,11 @@ class Agendamento(Base):
     
     # Campo para controle de notificações (Ex: enviado confirmação)
     confirmacao_enviada = Column(DateTime(timezone=True), nullable=True)
+    # Controle do despachante (app/services/confirmacao_dispatcher.py): lote que
+    # reivindicou a linha, quando ela volta a ser elegível (lease/backoff) e tentativas
+    confirmacao_lote = Column(String(36), nullable=True)
+    confirmacao_proxima_em = Column(DateTime(timezone=True), nullable=True)
+    confirmacao_tentativas = Column(Integer, nullable=False, default=0, server_default="0")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -32,6 +64,9 @@ class Agendamento(Base):
 
 class BloqueioAgenda(Base):
     __tablename__ = "bloqueios_agenda"
+    __table_args__ = (
+        Index("ix_bloqueios_agenda_profissional_periodo", "profissional_id", "data_inicio", "data_fim"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     profissional_id = Column(Integer, ForeignKey("profissionais.id"), nullable=False)
@@ -42,3 +77,20 @@ class BloqueioAgenda(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     profissional = relationship("ProfissionalUbs", backref="bloqueios")
+
+
+class OcupacaoAgendaDiaria(Base):
+    """Minutos por profissional e dia (fuso AGENDA_TIMEZONE), mantidos por app/services/agenda_ocupacao.py."""
+    __tablename__ = "ocupacao_agenda_diaria"
+
+    profissional_id = Column(Integer, ForeignKey("profissionais.id", ondelete="CASCADE"), primary_key=True)
+    dia = Column(Date, primary_key=True)
+
+    minutos_capacidade = Column(Integer, nullable=False, default=0)
+    minutos_agendados = Column(Integer, nullable=False, default=0)
+    minutos_reagendados = Column(Integer, nullable=False, default=0)
+    minutos_realizados = Column(Integer, nullable=False, default=0)
+    minutos_cancelados = Column(Integer, nullable=False, default=0)
+    minutos_bloqueados = Column(Integer, nullable=False, default=0)
+
+    atualizado_em = Column(DateTime(timezone=True), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, func, Text
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, func, Text, Index
 from app.database import Base
 
 class Usuario(Base):
@@ -33,6 +33,11 @@ class ProfissionalUbs(Base):
 
 class LoginAttempt(Base):
     __tablename__ = "login_attempts"
+    __table_args__ = (
+        Index("ix_login_attempts_created_at", "created_at"),
+        Index("ix_login_attempts_email_created_at", "email", "created_at"),
+        Index("ix_login_attempts_ip_address_created_at", "ip_address", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     email = Column(String(200), nullable=False)
@@ -42,6 +47,25 @@ class LoginAttempt(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class LoginAttemptCounter(Base):
+    """Contadores agregados de tentativas de login por e-mail e por IP.
+
+    Mantidos junto com cada gravação em ``login_attempts`` para que checagens
+    de abuso não precisem varrer o histórico (que é expurgado periodicamente).
+    ``falhas_janela`` conta as falhas desde ``janela_inicio``; os totais não expiram.
+    """
+    __tablename__ = "login_attempt_counters"
+
+    escopo = Column(String(10), primary_key=True)  # email | ip
+    chave = Column(String(200), primary_key=True)
+    falhas_janela = Column(Integer, nullable=False, default=0)
+    janela_inicio = Column(DateTime(timezone=True), nullable=False)
+    total_falhas = Column(Integer, nullable=False, default=0)
+    total_sucessos = Column(Integer, nullable=False, default=0)
+    ultima_falha_em = Column(DateTime(timezone=True), nullable=True)
+    ultimo_sucesso_em = Column(DateTime(timezone=True), nullable=True)
+
+
 class Cargo(Base):
     __tablename__ = "cargos"
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Text, Boolean, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -35,8 +35,43 @@ class EducationalMaterialFile(Base):
     original_filename = Column(String(255), nullable=False)
     content_type = Column(String(100), nullable=True)
     size_bytes = Column(Integer, nullable=False, default=0)
+    # SHA-256 (hex) calculado durante o upload; nulo em arquivos antigos.
+    # Quando storage_path é o blob desse hash, o conteúdo é compartilhado (MaterialBlob)
+    sha256 = Column(String(64), nullable=True, index=True)
     storage_path = Column(Text, nullable=False)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     material = relationship("EducationalMaterial", back_populates="files")
+
+
+class MaterialBlob(Base):
+    """Conteúdo de arquivo armazenado uma única vez, endereçado pelo SHA-256."""
+    __tablename__ = "material_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size_bytes = Column(BigInteger, nullable=False)
+    storage_path = Column(Text, nullable=False)
+    # Quantos EducationalMaterialFile apontam para o blob; em 0 o arquivo é apagado
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class MaterialUploadSession(Base):
+    """Upload retomável em andamento (ver app/services/material_uploads.py)."""
+    __tablename__ = "material_upload_sessions"
+
+    id = Column(String(36), primary_key=True)
+    material_id = Column(Integer, ForeignKey("educational_materials.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_by = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
+
+    original_filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=True)
+    tamanho_bytes = Column(BigInteger, nullable=False)
+    # Bytes já gravados (contíguos a partir do início): o offset do próximo PUT
+    recebido_bytes = Column(BigInteger, nullable=False, default=0)
+    arquivo_parcial = Column(Text, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expira_em = Column(DateTime(timezone=True), nullable=False, index=True)
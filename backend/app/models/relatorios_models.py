@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+import enum
+from app.database import Base
+
+
+class StatusReportJob(str, enum.Enum):
+    PENDENTE = "PENDENTE"
+    PROCESSANDO = "PROCESSANDO"
+    CONCLUIDO = "CONCLUIDO"
+    FALHOU = "FALHOU"
+
+
+class ReportExportJob(Base):
+    """Exportação assíncrona de relatório em PDF (situacional ou de microáreas)."""
+
+    __tablename__ = "report_export_jobs"
+    __table_args__ = (
+        Index("ix_report_export_jobs_status_created_at", "status", "created_at"),
+        Index("ix_report_export_jobs_requested_by", "requested_by"),
+    )
+
+    id = Column(String(36), primary_key=True)
+    tipo = Column(String(20), nullable=False)  # situational | microareas
+    ubs_id = Column(Integer, ForeignKey("ubs.id", ondelete="CASCADE"), nullable=False)
+    requested_by = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    status = Column(String(20), nullable=False, default=StatusReportJob.PENDENTE)
+
+    # Payload serializável montado na requisição; o worker só renderiza.
+    payload = Column(JSONB().with_variant(JSON, "sqlite"), nullable=False)
+
+    filename = Column(String(255), nullable=True)
+    artifact_path = Column(Text, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    render_ms = Column(Integer, nullable=True)
+    erro = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
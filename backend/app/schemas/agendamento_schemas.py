@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
 from app.models.agendamento_models import StatusAgendamento
 
@@ -49,3 +49,54 @@ class BloqueioAgendaResponse(BloqueioAgendaBase):
     created_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+# --- Schemas de Disponibilidade ---
+
+class DisponibilidadeProfissional(BaseModel):
+    profissional_id: int
+    nome: Optional[str] = None
+    cargo: Optional[str] = None
+    slots: List[datetime]
+
+# --- Schemas de Operações em Lote ---
+
+class AgendamentoLoteItem(AgendamentoBase):
+    # Apenas funcionários podem agendar para outro paciente
+    paciente_id: Optional[int] = None
+
+class AgendamentoLoteCreate(BaseModel):
+    itens: List[AgendamentoLoteItem]
+    # Se True, nada é gravado quando algum item for inválido
+    atomico: bool = False
+
+class BloqueioAgendaLoteCreate(BaseModel):
+    itens: List[BloqueioAgendaCreate]
+    atomico: bool = False
+
+class ResultadoLoteItem(BaseModel):
+    indice: int
+    sucesso: bool
+    id: Optional[int] = None
+    erro: Optional[str] = None
+
+class ResultadoLote(BaseModel):
+    criados: int
+    falhas: int
+    itens: List[ResultadoLoteItem]
+
+# --- Schemas de Ocupação ---
+
+class OcupacaoDiariaResponse(BaseModel):
+    profissional_id: int
+    dia: date
+    minutos_capacidade: int
+    minutos_agendados: int
+    minutos_reagendados: int
+    minutos_realizados: int
+    minutos_cancelados: int
+    minutos_bloqueados: int
+    # (agendados + reagendados + realizados) / (capacidade - bloqueados)
+    taxa_ocupacao: Optional[float] = None
+    atualizado_em: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -41,3 +41,39 @@ class CronogramaOut(CronogramaBase):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
     model_config = ConfigDict(from_attributes=True)
+
+
+class CronogramaOcorrenciaOut(CronogramaOut):
+    """Uma ocorrência de um evento (recorrente ou não) dentro da janela pedida."""
+    ocorrencia_inicio: datetime
+    ocorrencia_fim: Optional[datetime] = None
+
+
+class CronogramaMesItem(BaseModel):
+    """Evento (ocorrência) ou bloqueio de agenda na visão mensal, ordenados por início."""
+    origem: str  # EVENTO | BLOQUEIO
+    id: int
+    inicio: datetime
+    fim: Optional[datetime] = None
+    titulo: str
+    tipo: Optional[str] = None
+    local: Optional[str] = None
+    dia_inteiro: bool = False
+    recorrencia: Optional[str] = None
+    profissional_id: Optional[int] = None
+    nome_profissional: Optional[str] = None
+    cargo_profissional: Optional[str] = None
+
+
+class CronogramaMesDia(BaseModel):
+    dia: date
+    agendamentos: int
+    cancelados: int = 0
+
+
+class CronogramaMesOut(BaseModel):
+    ubs_id: int
+    ano: int
+    mes: int
+    itens: List[CronogramaMesItem]
+    dias: List[CronogramaMesDia]
@@ -107,6 +107,13 @@ class GestorUBSItem(UBSOut):
     is_active: bool = False
 
 
+class GestorBulkExportRequest(BaseModel):
+    """Seleção das UBS para exportação em lote: ids explícitos ou filtro por status."""
+
+    ubs_ids: Optional[List[int]] = Field(default=None, max_length=200)
+    status: Optional[UBSStatus] = None
+
+
 class UBSProblemBase(BaseModel):
     titulo: str = Field(..., max_length=255)
     descricao: Optional[str] = None
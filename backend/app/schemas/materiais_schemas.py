@@ -41,3 +41,37 @@ class EducationalMaterialOut(EducationalMaterialBase):
     files: List[EducationalMaterialFileOut] = []
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class MaterialFileByHash(BaseModel):
+    sha256: str = Field(..., min_length=64, max_length=64)
+    filename: str = Field(..., max_length=255)
+    content_type: Optional[str] = Field(None, max_length=100)
+
+
+class MaterialUploadCreate(BaseModel):
+    filename: str = Field(..., max_length=255)
+    content_type: Optional[str] = Field(None, max_length=100)
+    tamanho_bytes: int = Field(..., ge=1)
+
+
+class MaterialUploadOut(BaseModel):
+    id: str
+    material_id: int
+    original_filename: str
+    tamanho_bytes: int
+    # Offset a partir do qual o próximo PUT deve enviar
+    recebido_bytes: int
+    expira_em: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class MaterialUploadFinalize(BaseModel):
+    # Opcional: SHA-256 (hex) calculado pelo cliente, conferido antes de concluir
+    sha256: Optional[str] = Field(None, min_length=64, max_length=64)
+
+
+class MaterialDownloadUrlOut(BaseModel):
+    url: str
+    expira_em: datetime
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+
+
+class ReportExportJobOut(BaseModel):
+    id: str
+    tipo: str
+    ubs_id: int
+    status: str
+    filename: Optional[str] = None
+    size_bytes: Optional[int] = None
+    render_ms: Optional[int] = None
+    erro: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    # Preenchido quando o relatório já pode ser baixado
+    download_url: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,98 @@
+"""Cálculo de horários livres das agendas.
+
+A grade de horários é a mesma oferecida pelo formulário de agendamento
+(das AGENDA_DAY_START às AGENDA_DAY_END, de AGENDA_SLOT_MINUTES em
+AGENDA_SLOT_MINUTES minutos, no fuso AGENDA_TIMEZONE). Um horário está
+ocupado se houver agendamento ativo exatamente nele ou se cair dentro de um
+bloqueio (limites inclusivos) — as mesmas regras de ``check_availability``.
+
+Tudo é calculado em memória, numa passada: os bloqueios de cada
+profissional são ordenados e mesclados em intervalos disjuntos e percorridos
+com um ponteiro junto da grade (também ordenada).
+"""
+
+from __future__ import annotations
+
+import os
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+AGENDA_SLOT_MINUTES = int(os.getenv("AGENDA_SLOT_MINUTES", "20"))
+AGENDA_DAY_START = os.getenv("AGENDA_DAY_START", "07:00")
+AGENDA_DAY_END = os.getenv("AGENDA_DAY_END", "17:00")
+AGENDA_TIMEZONE = ZoneInfo(os.getenv("AGENDA_TIMEZONE", "America/Sao_Paulo"))
+
+Intervalo = Tuple[datetime, datetime]
+
+
+def as_utc(dt: datetime) -> datetime:
+    """SQLite devolve datetimes naive (gravados em UTC); Postgres devolve aware."""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _parse_hora(valor: str) -> time:
+    horas, minutos = valor.split(":")
+    return time(int(horas), int(minutos))
+
+
+def slot_grid(inicio: date, fim: date) -> List[datetime]:
+    """Horários de início (UTC, ordenados) de ``inicio`` a ``fim``, inclusive."""
+    abertura = _parse_hora(AGENDA_DAY_START)
+    fechamento = _parse_hora(AGENDA_DAY_END)
+    passo = timedelta(minutes=AGENDA_SLOT_MINUTES)
+    slots = []
+    dia = inicio
+    while dia <= fim:
+        atual = datetime.combine(dia, abertura, tzinfo=AGENDA_TIMEZONE)
+        ultimo = datetime.combine(dia, fechamento, tzinfo=AGENDA_TIMEZONE)
+        while atual <= ultimo:
+            slots.append(atual.astimezone(timezone.utc))
+            atual += passo
+        dia += timedelta(days=1)
+    return slots
+
+
+def merge_intervals(intervalos: Iterable[Intervalo]) -> List[Intervalo]:
+    """Ordena e funde intervalos fechados que se sobrepõem ou se tocam."""
+    fundidos: List[Intervalo] = []
+    for inicio, fim in sorted(intervalos):
+        if fundidos and inicio <= fundidos[-1][1]:
+            if fim > fundidos[-1][1]:
+                fundidos[-1] = (fundidos[-1][0], fim)
+        else:
+            fundidos.append((inicio, fim))
+    return fundidos
+
+
+def free_slots(
+    grade: Sequence[datetime],
+    ocupados: Iterable[datetime],
+    bloqueios: Iterable[Intervalo],
+    depois_de: Optional[datetime] = None,
+) -> List[datetime]:
+    """Filtra a grade (ordenada) removendo horários ocupados, bloqueados ou passados."""
+    ocupados = set(ocupados)
+    intervalos = merge_intervals(bloqueios)
+    livres = []
+    i = 0
+    for slot in grade:
+        if depois_de is not None and slot < depois_de:
+            continue
+        while i < len(intervalos) and intervalos[i][1] < slot:
+            i += 1
+        if i < len(intervalos) and intervalos[i][0] <= slot:
+            continue
+        if slot in ocupados:
+            continue
+        livres.append(slot)
+    return livres
+
+
+def is_blocked(intervalos: Sequence[Intervalo], instante: datetime) -> bool:
+    """Busca binária em intervalos já mesclados (``merge_intervals``)."""
+    i = bisect_right(intervalos, (instante, datetime.max.replace(tzinfo=timezone.utc))) - 1
+    return i >= 0 and intervalos[i][0] <= instante <= intervalos[i][1]
@@ -0,0 +1,292 @@
+"""Estatísticas de ocupação das agendas (``ocupacao_agenda_diaria``).
+
+Uma linha por profissional e dia (no fuso AGENDA_TIMEZONE) com os minutos
+de capacidade (grade de horários do dia), agendados, reagendados,
+realizados, cancelados e bloqueados (bloqueios recortados ao horário de
+atendimento). Cada agendamento conta AGENDA_SLOT_MINUTES.
+
+Atualização incremental: ao dar flush em ``Agendamento``/``BloqueioAgenda``
+os dias afetados (inclusive o dia/profissional anteriores, numa remarcação)
+são recalculados na mesma transação, com as linhas travadas (FOR UPDATE)
+antes da leitura para que marcações simultâneas no mesmo dia não se
+sobrescrevam. UPDATE/DELETE em massa não passam pelo flush; por isso uma
+tarefa em background (iniciada no ``lifespan``) reconstrói a janela recente
+a cada AGENDA_OCUPACAO_REFRESH_HOURS. Para reconstruir o histórico inteiro
+use ``scripts/rebuild_ocupacao_agenda.py``.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import inspect, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.agendamento_models import (
+    Agendamento,
+    BloqueioAgenda,
+    OcupacaoAgendaDiaria,
+    StatusAgendamento,
+)
+from app.services.agenda_disponibilidade import (
+    AGENDA_SLOT_MINUTES,
+    AGENDA_TIMEZONE,
+    as_utc,
+    merge_intervals,
+    slot_grid,
+)
+from app.services.background import PeriodicTask
+from app.utils import session_invalidation
+
+logger = logging.getLogger(__name__)
+
+AGENDA_OCUPACAO_REFRESH_HOURS = float(os.getenv("AGENDA_OCUPACAO_REFRESH_HOURS", "24"))
+# Dias para trás reconstruídos pela tarefa periódica (para frente: a janela de agendamento)
+AGENDA_OCUPACAO_REFRESH_PAST_DAYS = int(os.getenv("AGENDA_OCUPACAO_REFRESH_PAST_DAYS", "7"))
+
+# Teto de dias afetados por um único bloqueio (evita recalcular anos por engano)
+_MAX_DIAS_BLOQUEIO = 366
+_UPSERT_LOTE = 500
+
+_COLUNA_STATUS = {
+    StatusAgendamento.AGENDADO.value: "minutos_agendados",
+    StatusAgendamento.REAGENDADO.value: "minutos_reagendados",
+    StatusAgendamento.REALIZADO.value: "minutos_realizados",
+    StatusAgendamento.CANCELADO.value: "minutos_cancelados",
+}
+_COLUNAS = (
+    "minutos_capacidade",
+    "minutos_agendados",
+    "minutos_reagendados",
+    "minutos_realizados",
+    "minutos_cancelados",
+    "minutos_bloqueados",
+    "atualizado_em",
+)
+
+Chave = Tuple[int, date]
+
+
+def local_day(dt: datetime) -> date:
+    return as_utc(dt).astimezone(AGENDA_TIMEZONE).date()
+
+
+def _day_bounds(dia: date) -> Tuple[datetime, datetime]:
+    inicio = datetime.combine(dia, datetime.min.time(), tzinfo=AGENDA_TIMEZONE)
+    fim = datetime.combine(dia + timedelta(days=1), datetime.min.time(), tzinfo=AGENDA_TIMEZONE)
+    return inicio.astimezone(timezone.utc), fim.astimezone(timezone.utc)
+
+
+def _days_between(inicio: datetime, fim: datetime) -> List[date]:
+    primeiro, ultimo = local_day(inicio), local_day(fim)
+    quantidade = min((ultimo - primeiro).days + 1, _MAX_DIAS_BLOQUEIO)
+    return [primeiro + timedelta(days=i) for i in range(max(quantidade, 0))]
+
+
+def compute_rows(
+    chaves: Iterable[Chave],
+    agendamentos: Iterable[tuple],
+    bloqueios: Iterable[tuple],
+    agora: Optional[datetime] = None,
+) -> List[dict]:
+    """Monta as linhas das chaves a partir de (prof, data_hora, status) e (prof, inicio, fim)."""
+    agora = agora or datetime.now(timezone.utc)
+    passo = timedelta(minutes=AGENDA_SLOT_MINUTES)
+    linhas = {}
+    for prof_id, dia in chaves:
+        grade = slot_grid(dia, dia)
+        linhas[(prof_id, dia)] = {
+            "profissional_id": prof_id,
+            "dia": dia,
+            "minutos_capacidade": len(grade) * AGENDA_SLOT_MINUTES,
+            "minutos_agendados": 0,
+            "minutos_reagendados": 0,
+            "minutos_realizados": 0,
+            "minutos_cancelados": 0,
+            "minutos_bloqueados": 0,
+            "atualizado_em": agora,
+            "_expediente": (grade[0], grade[-1] + passo) if grade else None,
+        }
+
+    for prof_id, data_hora, status in agendamentos:
+        linha = linhas.get((prof_id, local_day(data_hora)))
+        coluna = _COLUNA_STATUS.get(status)
+        if linha is not None and coluna:
+            linha[coluna] += AGENDA_SLOT_MINUTES
+
+    por_profissional = defaultdict(list)
+    for prof_id, inicio, fim in bloqueios:
+        por_profissional[prof_id].append((as_utc(inicio), as_utc(fim)))
+    for prof_id, intervalos in por_profissional.items():
+        fundidos = merge_intervals(intervalos)
+        for (linha_prof, _dia), linha in linhas.items():
+            if linha_prof != prof_id or linha["_expediente"] is None:
+                continue
+            abertura, fechamento = linha["_expediente"]
+            segundos = sum(
+                max((min(fim, fechamento) - max(inicio, abertura)).total_seconds(), 0)
+                for inicio, fim in fundidos
+            )
+            linha["minutos_bloqueados"] = int(segundos // 60)
+
+    for linha in linhas.values():
+        del linha["_expediente"]
+    return list(linhas.values())
+
+
+def _insert_fn(session: Session):
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def _lock_keys(session: Session, chaves: List[Chave]) -> None:
+    """Garante uma linha por chave e a trava até o fim da transação (chaves ordenadas: sem deadlock)."""
+    agora = datetime.now(timezone.utc)
+    insert_fn = _insert_fn(session)
+    for i in range(0, len(chaves), _UPSERT_LOTE):
+        lote = chaves[i:i + _UPSERT_LOTE]
+        session.execute(
+            insert_fn(OcupacaoAgendaDiaria)
+            .values([{"profissional_id": prof_id, "dia": dia, "atualizado_em": agora} for prof_id, dia in lote])
+            .on_conflict_do_nothing(index_elements=[OcupacaoAgendaDiaria.profissional_id, OcupacaoAgendaDiaria.dia])
+        )
+        session.execute(
+            select(OcupacaoAgendaDiaria.profissional_id, OcupacaoAgendaDiaria.dia)
+            .where(tuple_(OcupacaoAgendaDiaria.profissional_id, OcupacaoAgendaDiaria.dia).in_(lote))
+            .order_by(OcupacaoAgendaDiaria.profissional_id, OcupacaoAgendaDiaria.dia)
+            .with_for_update()
+        )
+
+
+def refresh_occupancy(session: Session, chaves: Set[Chave]) -> int:
+    """Recalcula e grava (UPSERT) as linhas das chaves, sem commit. Sessão síncrona."""
+    if not chaves:
+        return 0
+    profs = {prof_id for prof_id, _ in chaves}
+    dias = sorted({dia for _, dia in chaves})
+    inicio, fim = _day_bounds(dias[0])[0], _day_bounds(dias[-1])[1]
+
+    with session.no_autoflush:
+        # Trava antes de ler: a leitura seguinte já vê o que foi commitado enquanto esperava
+        _lock_keys(session, sorted(chaves))
+        agendamentos = session.execute(
+            select(Agendamento.profissional_id, Agendamento.data_hora, Agendamento.status).where(
+                Agendamento.profissional_id.in_(profs),
+                Agendamento.data_hora >= inicio,
+                Agendamento.data_hora < fim,
+            )
+        ).all()
+        bloqueios = session.execute(
+            select(BloqueioAgenda.profissional_id, BloqueioAgenda.data_inicio, BloqueioAgenda.data_fim).where(
+                BloqueioAgenda.profissional_id.in_(profs),
+                BloqueioAgenda.data_inicio < fim,
+                BloqueioAgenda.data_fim >= inicio,
+            )
+        ).all()
+        linhas = compute_rows(chaves, agendamentos, bloqueios)
+
+        insert_fn = _insert_fn(session)
+        for i in range(0, len(linhas), _UPSERT_LOTE):
+            stmt = insert_fn(OcupacaoAgendaDiaria).values(linhas[i:i + _UPSERT_LOTE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[OcupacaoAgendaDiaria.profissional_id, OcupacaoAgendaDiaria.dia],
+                set_={coluna: getattr(stmt.excluded, coluna) for coluna in _COLUNAS},
+            )
+            session.execute(stmt)
+    return len(linhas)
+
+
+def rebuild_occupancy(session: Session, inicio: date, fim: date) -> int:
+    """Reconstrói todos os dias entre ``inicio`` e ``fim`` (inclusive) que têm dados ou linha."""
+    janela_inicio, janela_fim = _day_bounds(inicio)[0], _day_bounds(fim)[1]
+    chaves: Set[Chave] = set()
+    with session.no_autoflush:
+        for prof_id, data_hora in session.execute(
+            select(Agendamento.profissional_id, Agendamento.data_hora).where(
+                Agendamento.data_hora >= janela_inicio, Agendamento.data_hora < janela_fim
+            )
+        ):
+            chaves.add((prof_id, local_day(data_hora)))
+        for prof_id, data_inicio, data_fim in session.execute(
+            select(BloqueioAgenda.profissional_id, BloqueioAgenda.data_inicio, BloqueioAgenda.data_fim).where(
+                BloqueioAgenda.data_inicio < janela_fim, BloqueioAgenda.data_fim >= janela_inicio
+            )
+        ):
+            recorte = (max(as_utc(data_inicio), janela_inicio), min(as_utc(data_fim), janela_fim))
+            chaves.update((prof_id, dia) for dia in _days_between(*recorte) if inicio <= dia <= fim)
+        # Linhas sem dados (ex.: agendamentos removidos em massa) voltam a zero
+        for prof_id, dia in session.execute(
+            select(OcupacaoAgendaDiaria.profissional_id, OcupacaoAgendaDiaria.dia).where(
+                OcupacaoAgendaDiaria.dia >= inicio, OcupacaoAgendaDiaria.dia <= fim
+            )
+        ):
+            chaves.add((prof_id, dia))
+
+    # Um profissional por vez mantém as consultas de refresh_occupancy restritas
+    por_profissional = defaultdict(set)
+    for chave in chaves:
+        por_profissional[chave[0]].add(chave)
+    return sum(refresh_occupancy(session, grupo) for grupo in por_profissional.values())
+
+
+# ─── Atualização incremental ─────────────────────────────────────────
+
+def _valores(estado, atributo: str) -> set:
+    historico = estado.attrs[atributo].history
+    return {v for v in (*historico.unchanged, *historico.added, *historico.deleted) if v is not None}
+
+
+def _collect_changed_days(session: Session) -> Set[Chave]:
+    chaves: Set[Chave] = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Agendamento):
+            estado = inspect(obj)
+            for prof_id in _valores(estado, "profissional_id"):
+                chaves.update((prof_id, local_day(dh)) for dh in _valores(estado, "data_hora"))
+        elif isinstance(obj, BloqueioAgenda):
+            estado = inspect(obj)
+            inicios, fins = _valores(estado, "data_inicio"), _valores(estado, "data_fim")
+            if not inicios or not fins:
+                continue
+            dias = _days_between(min(map(as_utc, inicios)), max(map(as_utc, fins)))
+            for prof_id in _valores(estado, "profissional_id"):
+                chaves.update((prof_id, dia) for dia in dias)
+    return chaves
+
+
+# Depois do flush as consultas já enxergam as mudanças; tudo na mesma transação.
+session_invalidation.register(_collect_changed_days, refresh_occupancy, in_transaction=True)
+
+
+# ─── Reconstrução periódica ──────────────────────────────────────────
+
+class OcupacaoRefreshTask(PeriodicTask):
+    mensagem_falha = "Falha ao recalcular a ocupação das agendas"
+    mensagem_desativada = "Recalculo periódico da ocupação das agendas desativado"
+
+    def interval_seconds(self) -> float:
+        return AGENDA_OCUPACAO_REFRESH_HOURS * 3600
+
+    async def refresh_window(self) -> int:
+        hoje = datetime.now(AGENDA_TIMEZONE).date()
+        async with self.session_factory() as db:
+            total = await db.run_sync(
+                rebuild_occupancy,
+                hoje - timedelta(days=AGENDA_OCUPACAO_REFRESH_PAST_DAYS),
+                hoje + timedelta(days=15),
+            )
+            await db.commit()
+        return total
+
+    async def run_once(self) -> None:
+        total = await self.refresh_window()
+        logger.info("Ocupação das agendas: %d dia(s)/profissional recalculado(s)", total)
+
+
+ocupacao_refresh_task = OcupacaoRefreshTask()
@@ -0,0 +1,79 @@
+"""Base das tarefas em background iniciadas no ``lifespan``.
+
+``BackgroundService`` resolve a fábrica de sessões (por padrão
+``database.AsyncSessionLocal``, importada só na hora do uso para que os
+testes possam trocá-la) e guarda as tasks asyncio que ``stop`` cancela.
+
+``PeriodicTask`` cobre o caso comum: chamar ``run_once`` a cada
+``interval_seconds()``, registrando a falha de uma rodada sem derrubar o
+laço. Intervalo ``<= 0`` desativa a tarefa.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundService:
+    def __init__(self, session_factory=None):
+        self._session_factory = session_factory
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def session_factory(self):
+        if self._session_factory is not None:
+            return self._session_factory
+        from app import database
+
+        return database.AsyncSessionLocal
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def _spawn(self, coro: Awaitable) -> None:
+        self._tasks.append(asyncio.create_task(coro))
+
+    async def _cancel_tasks(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stop(self) -> None:
+        await self._cancel_tasks()
+
+
+class PeriodicTask(BackgroundService):
+    # Mensagens de log da subclasse, ex.: "Falha na limpeza de ..." / "Limpeza de ... desativada"
+    mensagem_falha = "Falha na tarefa periódica"
+    mensagem_desativada = "Tarefa periódica desativada"
+
+    def interval_seconds(self) -> float:
+        raise NotImplementedError
+
+    def enabled(self) -> bool:
+        return self.interval_seconds() > 0
+
+    async def run_once(self) -> None:
+        raise NotImplementedError
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("%s: %s", self.mensagem_falha, exc)
+            await asyncio.sleep(self.interval_seconds())
+
+    async def start(self) -> None:
+        if self.session_factory is None or not self.enabled():
+            logger.info(self.mensagem_desativada)
+            return
+        self._spawn(self._run())
@@ -0,0 +1,263 @@
+"""Envio automático das confirmações de consulta.
+
+Uma tarefa em background (iniciada no ``lifespan``) acorda a cada
+CONFIRMACAO_INTERVAL_SECONDS e processa as consultas ativas que começam nas
+próximas CONFIRMACAO_ANTECEDENCIA_HORAS e ainda não têm
+``confirmacao_enviada``:
+
+1. reivindica até CONFIRMACAO_BATCH_SIZE linhas com um UPDATE condicional
+   (grava um id de lote e um lease em ``confirmacao_proxima_em``) — outro
+   processo que tente o mesmo UPDATE não casa as linhas já reivindicadas,
+   então nada é enviado duas vezes;
+2. agrupa por paciente (um e-mail com todas as consultas dele);
+3. envia com no máximo CONFIRMACAO_CONCURRENCY envios simultâneos, com
+   CONFIRMACAO_SEND_RETRIES novas tentativas e backoff exponencial;
+4. marca cada grupo assim que termina: as enviadas ganham
+   ``confirmacao_enviada``; as que falharam voltam a ficar elegíveis após
+   um backoff que cresce com ``confirmacao_tentativas``, até
+   CONFIRMACAO_MAX_TENTATIVAS.
+
+Antes de enviar cada grupo, o lease (CONFIRMACAO_LEASE_SECONDS) de todo o
+lote é renovado e o grupo fica só com as consultas que ainda são do lote.
+Assim um lote demorado (SMTP lento) não perde o lease no meio do caminho, e
+se perder — ou se a consulta for reagendada, o que limpa o lote — a consulta
+é pulada em vez de enviada duas vezes. Se o processo morrer no meio do lote,
+o lease expira e outro worker retoma as linhas pendentes. Sem transporte de
+e-mail configurado o despachante não inicia.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import aliased
+
+from app.models.agendamento_models import Agendamento, STATUS_ATIVOS
+from app.models.auth_models import ProfissionalUbs, Usuario
+from app.services.agenda_disponibilidade import AGENDA_TIMEZONE, as_utc
+from app.services.background import PeriodicTask
+from app.utils import email_sender
+
+logger = logging.getLogger(__name__)
+
+CONFIRMACAO_INTERVAL_SECONDS = float(os.getenv("CONFIRMACAO_INTERVAL_SECONDS", "60"))
+CONFIRMACAO_ANTECEDENCIA_HORAS = float(os.getenv("CONFIRMACAO_ANTECEDENCIA_HORAS", "48"))
+CONFIRMACAO_BATCH_SIZE = int(os.getenv("CONFIRMACAO_BATCH_SIZE", "200"))
+CONFIRMACAO_CONCURRENCY = int(os.getenv("CONFIRMACAO_CONCURRENCY", "5"))
+CONFIRMACAO_SEND_RETRIES = int(os.getenv("CONFIRMACAO_SEND_RETRIES", "2"))
+CONFIRMACAO_RETRY_BASE_SECONDS = float(os.getenv("CONFIRMACAO_RETRY_BASE_SECONDS", "2"))
+CONFIRMACAO_LEASE_SECONDS = int(os.getenv("CONFIRMACAO_LEASE_SECONDS", "600"))
+CONFIRMACAO_MAX_TENTATIVAS = int(os.getenv("CONFIRMACAO_MAX_TENTATIVAS", "5"))
+
+Sender = Callable[[str, str, list], Awaitable[bool]]
+
+
+def _elegivel(agora: datetime):
+    return (
+        Agendamento.confirmacao_enviada.is_(None),
+        Agendamento.status.in_(STATUS_ATIVOS),
+        Agendamento.data_hora > agora,
+        Agendamento.data_hora <= agora + timedelta(hours=CONFIRMACAO_ANTECEDENCIA_HORAS),
+        Agendamento.confirmacao_tentativas < CONFIRMACAO_MAX_TENTATIVAS,
+        or_(Agendamento.confirmacao_proxima_em.is_(None), Agendamento.confirmacao_proxima_em <= agora),
+    )
+
+
+def retry_delay(tentativas: int) -> timedelta:
+    """Espera até a próxima rodada após ``tentativas`` rodadas com falha (1 min, 2, 4, ...)."""
+    return timedelta(minutes=2 ** max(tentativas - 1, 0))
+
+
+async def claim_batch(db, lote: str, agora: Optional[datetime] = None) -> list[int]:
+    """Reivindica um lote de consultas elegíveis e devolve os ids que ficaram com ``lote``."""
+    agora = agora or datetime.now(timezone.utc)
+    candidatos = (await db.execute(
+        select(Agendamento.id)
+        .where(*_elegivel(agora))
+        .order_by(Agendamento.data_hora)
+        .limit(CONFIRMACAO_BATCH_SIZE)
+    )).scalars().all()
+    if not candidatos:
+        return []
+    # As condições se repetem no UPDATE: só casam as linhas que ninguém pegou nesse meio-tempo
+    await db.execute(
+        update(Agendamento)
+        .where(Agendamento.id.in_(candidatos), *_elegivel(agora))
+        .values(
+            confirmacao_lote=lote,
+            confirmacao_proxima_em=agora + timedelta(seconds=CONFIRMACAO_LEASE_SECONDS),
+            confirmacao_tentativas=Agendamento.confirmacao_tentativas + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return (await db.execute(
+        select(Agendamento.id).where(Agendamento.confirmacao_lote == lote)
+    )).scalars().all()
+
+
+async def _load_groups(db, ids: list[int]) -> dict:
+    """Agrupa as consultas reivindicadas por paciente: id -> (email, nome, [consultas])."""
+    profissional_usuario = aliased(Usuario)
+    linhas = (await db.execute(
+        select(
+            Agendamento.id,
+            Agendamento.data_hora,
+            Agendamento.paciente_id,
+            Usuario.email,
+            Usuario.nome,
+            profissional_usuario.nome.label("nome_profissional"),
+            ProfissionalUbs.cargo,
+        )
+        .join(Usuario, Usuario.id == Agendamento.paciente_id)
+        .join(ProfissionalUbs, ProfissionalUbs.id == Agendamento.profissional_id)
+        .join(profissional_usuario, profissional_usuario.id == ProfissionalUbs.usuario_id)
+        .where(Agendamento.id.in_(ids))
+        .order_by(Agendamento.data_hora)
+    )).all()
+    grupos: dict = defaultdict(lambda: {"email": None, "nome": None, "ids": [], "consultas": []})
+    for linha in linhas:
+        grupo = grupos[linha.paciente_id]
+        grupo["email"], grupo["nome"] = linha.email, linha.nome
+        grupo["ids"].append(linha.id)
+        grupo["consultas"].append({
+            "data_hora": as_utc(linha.data_hora).astimezone(AGENDA_TIMEZONE).strftime("%d/%m/%Y às %H:%M"),
+            "profissional": linha.nome_profissional,
+            "cargo": linha.cargo,
+        })
+    return grupos
+
+
+class ConfirmacaoDispatcher(PeriodicTask):
+    mensagem_falha = "Falha no despachante de confirmações"
+    mensagem_desativada = "Despachante de confirmações desativado"
+
+    def __init__(self, session_factory=None, sender: Optional[Sender] = None):
+        super().__init__(session_factory)
+        self._sender = sender
+        self.enviadas = 0
+        self.falhas = 0
+
+    @property
+    def sender(self) -> Sender:
+        return self._sender or email_sender.send_appointment_confirmation_email
+
+    async def _send_with_retry(self, grupo: dict) -> bool:
+        for tentativa in range(CONFIRMACAO_SEND_RETRIES + 1):
+            try:
+                if await self.sender(grupo["email"], grupo["nome"], grupo["consultas"]):
+                    return True
+            except Exception as exc:
+                logger.warning("Erro ao enviar confirmação para %s: %s", grupo["email"], exc)
+            if tentativa < CONFIRMACAO_SEND_RETRIES:
+                await asyncio.sleep(CONFIRMACAO_RETRY_BASE_SECONDS * 2 ** tentativa)
+        return False
+
+    async def _take_group(self, lote: str, grupo: dict) -> Optional[dict]:
+        """Renova o lease do lote e devolve o grupo só com as consultas que ainda são dele."""
+        agora = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Agendamento)
+                .where(Agendamento.confirmacao_lote == lote)
+                .values(confirmacao_proxima_em=agora + timedelta(seconds=CONFIRMACAO_LEASE_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+            ainda_no_lote = set((await db.execute(
+                select(Agendamento.id).where(Agendamento.id.in_(grupo["ids"]), Agendamento.confirmacao_lote == lote)
+            )).scalars().all())
+            await db.commit()
+        pares = [(i, c) for i, c in zip(grupo["ids"], grupo["consultas"]) if i in ainda_no_lote]
+        if not pares:
+            return None
+        return {**grupo, "ids": [i for i, _ in pares], "consultas": [c for _, c in pares]}
+
+    async def _finish_group(self, lote: str, ids: list[int], enviado: bool) -> int:
+        """Grava o resultado do grupo; devolve quantas consultas ainda eram do lote."""
+        agora = datetime.now(timezone.utc)
+        marcadas = 0
+        async with self.session_factory() as db:
+            if enviado:
+                resultado = await db.execute(
+                    update(Agendamento)
+                    .where(Agendamento.id.in_(ids), Agendamento.confirmacao_lote == lote)
+                    .values(confirmacao_enviada=agora, confirmacao_lote=None, confirmacao_proxima_em=None)
+                    .execution_options(synchronize_session=False)
+                )
+                marcadas = resultado.rowcount
+            else:
+                tentativas = (await db.execute(
+                    select(Agendamento.id, Agendamento.confirmacao_tentativas).where(Agendamento.id.in_(ids))
+                )).all()
+                por_tentativas = defaultdict(list)
+                for agendamento_id, n in tentativas:
+                    por_tentativas[n].append(agendamento_id)
+                for n, grupo_ids in por_tentativas.items():
+                    resultado = await db.execute(
+                        update(Agendamento)
+                        .where(Agendamento.id.in_(grupo_ids), Agendamento.confirmacao_lote == lote)
+                        .values(confirmacao_lote=None, confirmacao_proxima_em=agora + retry_delay(n))
+                        .execution_options(synchronize_session=False)
+                    )
+                    marcadas += resultado.rowcount
+            await db.commit()
+        return marcadas
+
+    async def _process_group(self, lote: str, semaforo: asyncio.Semaphore, grupo: dict) -> tuple[int, int]:
+        """Envia um grupo e grava o resultado. Retorna (consultas enviadas, consultas com falha)."""
+        async with semaforo:
+            grupo = await self._take_group(lote, grupo)
+            if grupo is None:
+                # Lease perdido ou consulta reagendada durante o lote: não é mais nossa
+                return 0, 0
+            enviado = await self._send_with_retry(grupo)
+            marcadas = await self._finish_group(lote, grupo["ids"], enviado)
+        return (marcadas, 0) if enviado else (0, marcadas)
+
+    async def dispatch_once(self) -> int:
+        """Processa um lote. Retorna quantas consultas foram confirmadas."""
+        lote = str(uuid.uuid4())
+        async with self.session_factory() as db:
+            ids = await claim_batch(db, lote)
+            if not ids:
+                return 0
+            grupos = list((await _load_groups(db, ids)).values())
+
+        semaforo = asyncio.Semaphore(max(1, CONFIRMACAO_CONCURRENCY))
+        resultados = await asyncio.gather(*(self._process_group(lote, semaforo, g) for g in grupos))
+        enviadas = sum(n for n, _ in resultados)
+        falhas = sum(n for _, n in resultados)
+        if falhas:
+            logger.warning("Confirmações: %d consulta(s) com falha de envio; nova tentativa depois", falhas)
+
+        self.enviadas += enviadas
+        self.falhas += falhas
+        return enviadas
+
+    def interval_seconds(self) -> float:
+        return CONFIRMACAO_INTERVAL_SECONDS
+
+    async def run_once(self) -> None:
+        # Esvazia a fila antes de dormir (vários lotes por rodada)
+        while await self.dispatch_once() >= CONFIRMACAO_BATCH_SIZE:
+            pass
+
+    async def start(self) -> None:
+        if self._sender is None and not email_sender.email_configured():
+            logger.info("Despachante de confirmações desativado (nenhum transporte de e-mail configurado)")
+            return
+        await super().start()
+
+    async def stop(self) -> None:
+        # Um lote interrompido fica com o lease e é retomado quando ele expirar
+        await super().stop()
+
+
+confirmacao_dispatcher = ConfirmacaoDispatcher()
@@ -0,0 +1,136 @@
+"""Visão mensal do cronograma de uma UBS.
+
+Junta, para um mês (no fuso AGENDA_TIMEZONE), as ocorrências dos eventos do
+cronograma, os bloqueios de agenda e a contagem diária de consultas dos
+profissionais da UBS — antes as telas de Cronograma e Agendamento buscavam
+cada fonte separadamente e mesclavam no navegador.
+
+O número de consultas é fixo, independentemente do tamanho do mês:
+
+* ocorrências via ``list_occurrences`` (cache por UBS/mês; no máximo uma);
+* bloqueios que tocam o mês, já ordenados pelo início (uma);
+* consultas dos profissionais no mês agrupadas por horário (uma), somadas
+  depois por dia local — contadas direto de ``agendamentos``, sem depender
+  da duração do horário nem da janela recalculada em ``ocupacao_agenda_diaria``.
+
+Eventos e bloqueios chegam ordenados e são intercalados por início com
+``heapq.merge`` (k-way merge preguiçoso, sem reordenar a lista inteira).
+Os profissionais de uma UBS são os usuários com ``active_ubs_id`` nela.
+"""
+
+from __future__ import annotations
+
+import heapq
+from datetime import timedelta
+from collections import defaultdict
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import case, func, select
+
+from app.models.agendamento_models import Agendamento, BloqueioAgenda, StatusAgendamento
+from app.models.auth_models import ProfissionalUbs, Usuario
+from app.services.agenda_disponibilidade import AGENDA_TIMEZONE, as_utc
+from app.services.cronograma_recorrencia import list_occurrences, month_bounds
+
+ORIGEM_EVENTO = "EVENTO"
+ORIGEM_BLOQUEIO = "BLOQUEIO"
+
+
+def _evento_item(ocorrencia: dict) -> dict:
+    return {
+        "origem": ORIGEM_EVENTO,
+        "id": ocorrencia["id"],
+        "inicio": ocorrencia["ocorrencia_inicio"],
+        "fim": ocorrencia["ocorrencia_fim"],
+        "titulo": ocorrencia["titulo"],
+        "tipo": ocorrencia["tipo"],
+        "local": ocorrencia["local"],
+        "dia_inteiro": ocorrencia["dia_inteiro"],
+        "recorrencia": ocorrencia["recorrencia"],
+    }
+
+
+def _bloqueio_item(linha) -> dict:
+    return {
+        "origem": ORIGEM_BLOQUEIO,
+        "id": linha.id,
+        "inicio": as_utc(linha.data_inicio),
+        "fim": as_utc(linha.data_fim),
+        "titulo": linha.motivo or "Agenda bloqueada",
+        "profissional_id": linha.profissional_id,
+        "nome_profissional": linha.nome,
+        "cargo_profissional": linha.cargo,
+    }
+
+
+def merge_by_start(*fontes: Iterable[dict]) -> Iterator[dict]:
+    """Intercala fontes já ordenadas por ``inicio`` (empate: eventos antes, depois por id)."""
+    return heapq.merge(*fontes, key=lambda item: (item["inicio"], item["origem"] != ORIGEM_EVENTO, item["id"]))
+
+
+async def build_month(db, ubs_id: int, ano: int, mes: int, incluir_agenda: bool = True) -> dict:
+    """Monta a visão do mês. ``incluir_agenda=False`` omite bloqueios e contagens."""
+    inicio, fim_exclusivo = month_bounds(ano, mes)
+    fim = fim_exclusivo - timedelta(microseconds=1)
+
+    ocorrencias = await list_occurrences(db, ubs_id, inicio, fim)
+    eventos = (_evento_item(o) for o in ocorrencias)
+
+    bloqueios: List[dict] = []
+    dias: List[dict] = []
+    if incluir_agenda:
+        resultado = await db.execute(
+            select(
+                BloqueioAgenda.id,
+                BloqueioAgenda.profissional_id,
+                BloqueioAgenda.data_inicio,
+                BloqueioAgenda.data_fim,
+                BloqueioAgenda.motivo,
+                Usuario.nome,
+                ProfissionalUbs.cargo,
+            )
+            .join(ProfissionalUbs, ProfissionalUbs.id == BloqueioAgenda.profissional_id)
+            .join(Usuario, Usuario.id == ProfissionalUbs.usuario_id)
+            .where(
+                Usuario.active_ubs_id == ubs_id,
+                BloqueioAgenda.data_inicio <= fim,
+                BloqueioAgenda.data_fim >= inicio,
+            )
+            .order_by(BloqueioAgenda.data_inicio, BloqueioAgenda.id)
+        )
+        bloqueios = [_bloqueio_item(linha) for linha in resultado.all()]
+
+        cancelado = Agendamento.status == StatusAgendamento.CANCELADO.value
+        resultado = await db.execute(
+            select(
+                Agendamento.data_hora,
+                func.sum(case((cancelado, 0), else_=1)),
+                func.sum(case((cancelado, 1), else_=0)),
+            )
+            .join(ProfissionalUbs, ProfissionalUbs.id == Agendamento.profissional_id)
+            .join(Usuario, Usuario.id == ProfissionalUbs.usuario_id)
+            .where(
+                Usuario.active_ubs_id == ubs_id,
+                Agendamento.data_hora >= inicio,
+                Agendamento.data_hora < fim_exclusivo,
+            )
+            .group_by(Agendamento.data_hora)
+        )
+        # Poucas linhas (uma por horário ocupado do mês); o dia local sai do horário em Python
+        por_dia = defaultdict(lambda: [0, 0])
+        for data_hora, ativos, cancelados in resultado.all():
+            contagem = por_dia[as_utc(data_hora).astimezone(AGENDA_TIMEZONE).date()]
+            contagem[0] += ativos or 0
+            contagem[1] += cancelados or 0
+        dias = [
+            {"dia": dia, "agendamentos": ativos, "cancelados": cancelados}
+            for dia, (ativos, cancelados) in sorted(por_dia.items())
+        ]
+
+    return {
+        "ubs_id": ubs_id,
+        "ano": ano,
+        "mes": mes,
+        "itens": list(merge_by_start(eventos, bloqueios)),
+        "dias": dias,
+    }
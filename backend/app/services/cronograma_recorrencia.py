@@ -0,0 +1,248 @@
+"""Expansão das regras de recorrência do cronograma.
+
+``CronogramaEvent`` guarda só a primeira ocorrência e a regra (DAILY, WEEKLY
+ou MONTHLY a cada ``recorrencia_intervalo``, até ``recorrencia_fim``
+inclusive). ``iter_occurrences`` gera sob demanda as ocorrências que tocam
+uma janela, saltando direto para perto do início dela — um evento semanal
+criado há anos não percorre as semanas anteriores.
+
+Os passos são dados no horário de parede de AGENDA_TIMEZONE (a reunião das
+9h continua às 9h). Na regra mensal, dias que não existem no mês (31, 30,
+29 de fevereiro) caem no último dia do mês.
+
+As ocorrências expandidas ficam em cache por (UBS, mês) durante
+CRONOGRAMA_CACHE_TTL segundos, com no máximo CRONOGRAMA_CACHE_MAX_MONTHS
+meses (LRU); CRONOGRAMA_CACHE_TTL=0 desativa. Commits que alteram eventos
+descartam os meses da UBS via eventos de sessão, como no cache de usuários.
+"""
+
+from __future__ import annotations
+
+import calendar
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, func, inspect, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.cronograma_models import CronogramaEvent, RecurrenceType
+from app.schemas.cronograma_schemas import CronogramaOut
+from app.services.agenda_disponibilidade import AGENDA_TIMEZONE, as_utc
+from app.utils import session_invalidation
+
+CRONOGRAMA_CACHE_TTL = float(os.getenv("CRONOGRAMA_CACHE_TTL", "300"))
+CRONOGRAMA_CACHE_MAX_MONTHS = int(os.getenv("CRONOGRAMA_CACHE_MAX_MONTHS", "256"))
+
+_REGRAS = {RecurrenceType.DAILY.value, RecurrenceType.WEEKLY.value, RecurrenceType.MONTHLY.value}
+
+Ocorrencia = Tuple[datetime, Optional[datetime]]
+
+
+def _add_months(dia: date, meses: int) -> date:
+    total = dia.year * 12 + (dia.month - 1) + meses
+    ano, mes = divmod(total, 12)
+    ultimo = calendar.monthrange(ano, mes + 1)[1]
+    return date(ano, mes + 1, min(dia.day, ultimo))
+
+
+def _nth(origem: datetime, regra: str, intervalo: int, n: int) -> datetime:
+    """n-ésima ocorrência (UTC) a partir da origem local, sem acumular arredondamentos."""
+    if regra == RecurrenceType.MONTHLY.value:
+        dia = _add_months(origem.date(), n * intervalo)
+    else:
+        passo = 7 if regra == RecurrenceType.WEEKLY.value else 1
+        dia = origem.date() + timedelta(days=n * intervalo * passo)
+    return datetime.combine(dia, origem.time(), tzinfo=AGENDA_TIMEZONE).astimezone(timezone.utc)
+
+
+def _first_index(origem: datetime, regra: str, intervalo: int, alvo: datetime) -> int:
+    """Índice seguro (nunca além) da primeira ocorrência que pode terminar após ``alvo``."""
+    alvo_local = alvo.astimezone(AGENDA_TIMEZONE)
+    if alvo_local <= origem:
+        return 0
+    if regra == RecurrenceType.MONTHLY.value:
+        decorrido = (alvo_local.year - origem.year) * 12 + alvo_local.month - origem.month
+    else:
+        passo = 7 if regra == RecurrenceType.WEEKLY.value else 1
+        decorrido = (alvo_local.date() - origem.date()).days // passo
+    # Um passo de folga cobre diferenças de horário de verão/fuso
+    return max(0, decorrido // intervalo - 1)
+
+
+def iter_occurrences(evento, inicio: datetime, fim: datetime) -> Iterator[Ocorrencia]:
+    """Gera (início, fim) de cada ocorrência que toca [inicio, fim], em ordem."""
+    primeira = as_utc(evento.inicio)
+    termino = as_utc(evento.fim) if evento.fim is not None else None
+    duracao = termino - primeira if termino is not None and termino > primeira else timedelta(0)
+    inicio, fim = as_utc(inicio), as_utc(fim)
+
+    regra = (evento.recorrencia or RecurrenceType.NONE.value).upper()
+    if regra not in _REGRAS:
+        if primeira + duracao >= inicio and primeira <= fim:
+            yield primeira, termino
+        return
+
+    intervalo = max(1, evento.recorrencia_intervalo or 1)
+    origem = primeira.astimezone(AGENDA_TIMEZONE)
+    n = _first_index(origem, regra, intervalo, inicio - duracao)
+    while True:
+        atual = _nth(origem, regra, intervalo, n)
+        if atual > fim:
+            return
+        if evento.recorrencia_fim and atual.astimezone(AGENDA_TIMEZONE).date() > evento.recorrencia_fim:
+            return
+        if atual + duracao >= inicio:
+            yield atual, (atual + duracao if termino is not None else None)
+        n += 1
+
+
+def reaches_window(inicio: datetime, fim: Optional[datetime] = None):
+    """Filtro SQL: eventos cuja série (ou ocorrência única) pode tocar a janela."""
+    condicoes = [
+        or_(
+            func.coalesce(CronogramaEvent.fim, CronogramaEvent.inicio) >= inicio,
+            and_(
+                CronogramaEvent.recorrencia.in_(_REGRAS),
+                or_(
+                    CronogramaEvent.recorrencia_fim.is_(None),
+                    CronogramaEvent.recorrencia_fim >= as_utc(inicio).astimezone(AGENDA_TIMEZONE).date(),
+                ),
+            ),
+        )
+    ]
+    if fim is not None:
+        condicoes.append(CronogramaEvent.inicio <= fim)
+    return and_(*condicoes)
+
+
+# ─── Cache por UBS e mês ─────────────────────────────────────────────
+
+_ALL = session_invalidation.ALL
+
+_lock = threading.Lock()
+# (ubs_id, ano, mes) -> {"expira": monotonic, "itens": list[dict]}
+_entries: "OrderedDict[tuple[int, int, int], dict]" = OrderedDict()
+
+
+def month_bounds(ano: int, mes: int) -> Tuple[datetime, datetime]:
+    primeiro = date(ano, mes, 1)
+    proximo = _add_months(primeiro, 1)
+    return (
+        datetime.combine(primeiro, datetime.min.time(), tzinfo=AGENDA_TIMEZONE).astimezone(timezone.utc),
+        datetime.combine(proximo, datetime.min.time(), tzinfo=AGENDA_TIMEZONE).astimezone(timezone.utc),
+    )
+
+
+def _months_between(inicio: datetime, fim: datetime) -> List[Tuple[int, int]]:
+    atual = as_utc(inicio).astimezone(AGENDA_TIMEZONE).date().replace(day=1)
+    ultimo = as_utc(fim).astimezone(AGENDA_TIMEZONE).date().replace(day=1)
+    meses = []
+    while atual <= ultimo:
+        meses.append((atual.year, atual.month))
+        atual = _add_months(atual, 1)
+    return meses
+
+
+def _get_month(chave: tuple) -> Optional[list]:
+    with _lock:
+        entry = _entries.get(chave)
+        if entry is None:
+            return None
+        if entry["expira"] <= time.monotonic():
+            _entries.pop(chave, None)
+            return None
+        _entries.move_to_end(chave)
+        return entry["itens"]
+
+
+def _remember_month(chave: tuple, itens: list) -> None:
+    if CRONOGRAMA_CACHE_TTL <= 0:
+        return
+    with _lock:
+        _entries[chave] = {"expira": time.monotonic() + CRONOGRAMA_CACHE_TTL, "itens": itens}
+        _entries.move_to_end(chave)
+        while len(_entries) > CRONOGRAMA_CACHE_MAX_MONTHS:
+            _entries.popitem(last=False)
+
+
+async def list_occurrences(db, ubs_id: int, inicio: datetime, fim: datetime) -> List[dict]:
+    """Ocorrências da UBS em [inicio, fim], ordenadas; meses em cache não vão ao banco."""
+    meses = _months_between(inicio, fim)
+    por_mes = {}
+    faltando = []
+    for ano, mes in meses:
+        itens = _get_month((ubs_id, ano, mes))
+        if itens is None:
+            faltando.append((ano, mes))
+        else:
+            por_mes[(ano, mes)] = itens
+
+    if faltando:
+        janela_inicio = month_bounds(*faltando[0])[0]
+        janela_fim = month_bounds(*faltando[-1])[1]
+        resultado = await db.execute(
+            select(CronogramaEvent)
+            .where(CronogramaEvent.ubs_id == ubs_id, reaches_window(janela_inicio, janela_fim))
+            .order_by(CronogramaEvent.inicio, CronogramaEvent.id)
+        )
+        eventos = [(ev, CronogramaOut.model_validate(ev).model_dump()) for ev in resultado.scalars().all()]
+        for ano, mes in faltando:
+            mes_inicio, mes_fim = month_bounds(ano, mes)
+            itens = []
+            for ev, dados in eventos:
+                # O fim do mês é exclusivo: a meia-noite seguinte já é do próximo mês
+                for oc_inicio, oc_fim in iter_occurrences(ev, mes_inicio, mes_fim - timedelta(microseconds=1)):
+                    itens.append({**dados, "ocorrencia_inicio": oc_inicio, "ocorrencia_fim": oc_fim})
+            itens.sort(key=lambda item: (item["ocorrencia_inicio"], item["id"]))
+            por_mes[(ano, mes)] = itens
+            _remember_month((ubs_id, ano, mes), itens)
+
+    inicio, fim = as_utc(inicio), as_utc(fim)
+    vistos = set()
+    ocorrencias = []
+    for ano, mes in meses:
+        for item in por_mes[(ano, mes)]:
+            chave = (item["id"], item["ocorrencia_inicio"])
+            if chave in vistos:
+                continue
+            vistos.add(chave)
+            termino = item["ocorrencia_fim"] or item["ocorrencia_inicio"]
+            if item["ocorrencia_inicio"] <= fim and termino >= inicio:
+                ocorrencias.append(item)
+    return ocorrencias
+
+
+def invalidate_ubs(ubs_ids) -> None:
+    """Descarta os meses das UBS informadas (``"*"`` limpa tudo)."""
+    with _lock:
+        if _ALL in ubs_ids:
+            _entries.clear()
+            return
+        for chave in [chave for chave in _entries if chave[0] in ubs_ids]:
+            del _entries[chave]
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+# ─── Invalidação automática ──────────────────────────────────────────
+
+def _collect_changed_events(session: Session) -> set:
+    ubs_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, CronogramaEvent):
+            continue
+        if obj.ubs_id is not None:
+            ubs_ids.add(obj.ubs_id)
+        # Evento movido de UBS: a antiga também muda
+        ubs_ids.update(v for v in inspect(obj).attrs.ubs_id.history.deleted if v is not None)
+    return ubs_ids
+
+
+session_invalidation.register(_collect_changed_events, invalidate_ubs, bulk_models=(CronogramaEvent,))
@@ -0,0 +1,111 @@
+"""Diretório de especialidades e profissionais ativos da tela de agendamento.
+
+Toda abertura da tela de agendamento chamava ``/agendamentos/especialidades``
+(DISTINCT em ``profissionais``) e ``/agendamentos/profissionais`` (join com
+``usuarios``). O diretório muda raramente, então fica num retrato em memória,
+montado com uma única consulta na primeira leitura e descartado quando um
+commit altera ``ProfissionalUbs`` ou o nome/exclusão de um ``Usuario`` — via
+eventos de sessão, como nos outros caches. Cada retrato tem um ETag derivado
+do conteúdo, para o navegador revalidar com If-None-Match.
+
+O cache é por processo; DIRETORIO_CACHE_TTL (segundos) limita quanto tempo
+outros workers levam para enxergar uma mudança. DIRETORIO_CACHE_TTL=0
+desativa o cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session
+
+from app.models.auth_models import ProfissionalUbs, Usuario
+from app.utils import session_invalidation
+
+DIRETORIO_CACHE_TTL = float(os.getenv("DIRETORIO_CACHE_TTL", "600"))
+
+_lock = threading.Lock()
+_snapshot: Optional[dict] = None
+# Incrementada a cada invalidação: um retrato montado durante uma mudança não é guardado
+_geracao = 0
+
+
+def _build(profissionais: List[dict]) -> dict:
+    especialidades = sorted({p["cargo"] for p in profissionais if p["cargo"]})
+    por_cargo: dict = {}
+    for p in profissionais:
+        por_cargo.setdefault(p["cargo"], []).append(p)
+    conteudo = json.dumps([especialidades, profissionais], sort_keys=True, ensure_ascii=False)
+    return {
+        "expira": time.monotonic() + DIRETORIO_CACHE_TTL,
+        "especialidades": especialidades,
+        "profissionais": profissionais,
+        "por_cargo": por_cargo,
+        "etag": hashlib.sha256(conteudo.encode("utf-8")).hexdigest()[:32],
+    }
+
+
+async def get_directory(db) -> dict:
+    """Retrato atual: ``especialidades``, ``profissionais``, ``por_cargo`` e ``etag``."""
+    global _snapshot
+    with _lock:
+        atual = _snapshot
+        geracao = _geracao
+    if atual is not None and atual["expira"] > time.monotonic():
+        return atual
+
+    resultado = await db.execute(
+        select(ProfissionalUbs.id, Usuario.nome, ProfissionalUbs.cargo)
+        .join(Usuario, ProfissionalUbs.usuario_id == Usuario.id)
+        .where(ProfissionalUbs.ativo == True)
+        .order_by(ProfissionalUbs.id)
+    )
+    novo = _build([{"id": r.id, "nome": r.nome, "cargo": r.cargo} for r in resultado.all()])
+    if DIRETORIO_CACHE_TTL > 0:
+        with _lock:
+            if geracao == _geracao:
+                _snapshot = novo
+    return novo
+
+
+def invalidate() -> None:
+    global _snapshot, _geracao
+    with _lock:
+        _snapshot = None
+        _geracao += 1
+
+
+def clear() -> None:
+    invalidate()
+
+
+# ─── Invalidação automática ──────────────────────────────────────────
+
+def _usuario_afeta_diretorio(obj: Usuario) -> bool:
+    # Tentativas de login, senha etc. mudam toda hora e não aparecem no diretório
+    return inspect(obj).attrs.nome.history.has_changes()
+
+
+def _collect_directory_changes(session: Session) -> set:
+    # O diretório é um retrato único: qualquer mudança relevante descarta tudo
+    alterado = any(isinstance(obj, ProfissionalUbs) for obj in (*session.new, *session.dirty, *session.deleted))
+    alterado = alterado or any(isinstance(obj, Usuario) for obj in session.deleted)
+    alterado = alterado or any(
+        isinstance(obj, Usuario) and _usuario_afeta_diretorio(obj) for obj in session.dirty
+    )
+    return {session_invalidation.ALL} if alterado else set()
+
+
+def _apply_directory_invalidation(_chaves) -> None:
+    invalidate()
+
+
+session_invalidation.register(
+    _collect_directory_changes, _apply_directory_invalidation, bulk_models=(Usuario, ProfissionalUbs)
+)
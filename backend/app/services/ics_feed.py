@@ -0,0 +1,169 @@
+"""Geração de feeds iCalendar (RFC 5545) do cronograma e das agendas.
+
+Os componentes são produzidos um a um (``iter_calendar``) para que a
+resposta seja transmitida em partes. Eventos recorrentes do cronograma saem
+com RRULE nativa — o cliente de calendário expande —, nunca como
+ocorrências expandidas.
+
+Horários vão em UTC; eventos de dia inteiro usam datas (VALUE=DATE) no fuso
+AGENDA_TIMEZONE. Na regra mensal, meses sem o dia de origem (31, 30, 29)
+são pulados pelo cliente, como manda a RFC, enquanto
+``/cronograma/ocorrencias`` os leva ao último dia do mês.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional
+
+from app.models.agendamento_models import StatusAgendamento
+from app.models.cronograma_models import RecurrenceType
+from app.services.agenda_disponibilidade import AGENDA_SLOT_MINUTES, AGENDA_TIMEZONE, as_utc
+from app.utils.http_cache import http_date, quote_etag
+
+ICS_PRODID = "-//UBS//Cronograma e Agenda//PT-BR"
+ICS_UID_DOMAIN = "ubs-agenda"
+# Eventos (não recorrentes) e consultas encerrados há mais que isso saem do feed
+CALENDAR_FEED_PAST_DAYS = int(os.getenv("CALENDAR_FEED_PAST_DAYS", "60"))
+_REGRAS = {RecurrenceType.DAILY.value, RecurrenceType.WEEKLY.value, RecurrenceType.MONTHLY.value}
+
+
+def escape_text(valor: Optional[str]) -> str:
+    if not valor:
+        return ""
+    return (
+        valor.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def fold_line(linha: str) -> str:
+    """Quebra linhas com mais de 75 octetos (continuação começa com espaço)."""
+    if len(linha.encode("utf-8")) <= 75:
+        return linha
+    partes = []
+    atual = ""
+    limite = 75
+    for caractere in linha:
+        if len((atual + caractere).encode("utf-8")) > limite:
+            partes.append(atual)
+            atual = ""
+            limite = 74
+        atual += caractere
+    partes.append(atual)
+    return "\r\n ".join(partes)
+
+
+def _utc(dt: datetime) -> str:
+    return as_utc(dt).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _data_local(dt: datetime):
+    return as_utc(dt).astimezone(AGENDA_TIMEZONE).date()
+
+
+def _rrule(evento) -> Optional[str]:
+    regra = (evento.recorrencia or RecurrenceType.NONE.value).upper()
+    if regra not in _REGRAS:
+        return None
+    partes = [f"FREQ={regra}", f"INTERVAL={max(1, evento.recorrencia_intervalo or 1)}"]
+    if evento.recorrencia_fim:
+        if evento.dia_inteiro:
+            partes.append(f"UNTIL={evento.recorrencia_fim.strftime('%Y%m%d')}")
+        else:
+            # recorrencia_fim é inclusiva: até o fim daquele dia no fuso local
+            fim_dia = datetime.combine(
+                evento.recorrencia_fim + timedelta(days=1), datetime.min.time(), tzinfo=AGENDA_TIMEZONE
+            ) - timedelta(seconds=1)
+            partes.append(f"UNTIL={_utc(fim_dia)}")
+    return ";".join(partes)
+
+
+def cronograma_component(evento) -> List[str]:
+    linhas = [
+        "BEGIN:VEVENT",
+        f"UID:cronograma-{evento.id}@{ICS_UID_DOMAIN}",
+        f"DTSTAMP:{_utc(evento.updated_at or evento.created_at or datetime.now(timezone.utc))}",
+    ]
+    if evento.dia_inteiro:
+        inicio = _data_local(evento.inicio)
+        fim = _data_local(evento.fim) if evento.fim else inicio
+        linhas.append(f"DTSTART;VALUE=DATE:{inicio.strftime('%Y%m%d')}")
+        # DTEND de dia inteiro é exclusivo
+        linhas.append(f"DTEND;VALUE=DATE:{(fim + timedelta(days=1)).strftime('%Y%m%d')}")
+    else:
+        linhas.append(f"DTSTART:{_utc(evento.inicio)}")
+        if evento.fim and as_utc(evento.fim) > as_utc(evento.inicio):
+            linhas.append(f"DTEND:{_utc(evento.fim)}")
+    rrule = _rrule(evento)
+    if rrule:
+        linhas.append(f"RRULE:{rrule}")
+    linhas.append(f"SUMMARY:{escape_text(evento.titulo)}")
+    if evento.local:
+        linhas.append(f"LOCATION:{escape_text(evento.local)}")
+    if evento.observacoes:
+        linhas.append(f"DESCRIPTION:{escape_text(evento.observacoes)}")
+    linhas.append(f"CATEGORIES:{escape_text(evento.tipo)}")
+    if evento.updated_at:
+        linhas.append(f"LAST-MODIFIED:{_utc(evento.updated_at)}")
+    linhas.append("END:VEVENT")
+    return linhas
+
+
+def agendamento_component(agendamento, nome_paciente: Optional[str] = None) -> List[str]:
+    inicio = as_utc(agendamento.data_hora)
+    cancelado = agendamento.status == StatusAgendamento.CANCELADO.value
+    linhas = [
+        "BEGIN:VEVENT",
+        f"UID:agendamento-{agendamento.id}@{ICS_UID_DOMAIN}",
+        f"DTSTAMP:{_utc(agendamento.updated_at or agendamento.created_at or datetime.now(timezone.utc))}",
+        f"DTSTART:{_utc(inicio)}",
+        f"DTEND:{_utc(inicio + timedelta(minutes=AGENDA_SLOT_MINUTES))}",
+        f"SUMMARY:{escape_text('Consulta' + (f' - {nome_paciente}' if nome_paciente else ''))}",
+        f"STATUS:{'CANCELLED' if cancelado else 'CONFIRMED'}",
+    ]
+    if agendamento.observacoes:
+        linhas.append(f"DESCRIPTION:{escape_text(agendamento.observacoes)}")
+    if agendamento.updated_at:
+        linhas.append(f"LAST-MODIFIED:{_utc(agendamento.updated_at)}")
+    linhas.append("END:VEVENT")
+    return linhas
+
+
+def iter_calendar(nome: str, componentes: Iterable[List[str]]) -> Iterator[str]:
+    """Gera o VCALENDAR em partes: cabeçalho, um VEVENT por vez e rodapé."""
+    yield "\r\n".join([
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{ICS_PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        fold_line(f"X-WR-CALNAME:{escape_text(nome)}"),
+        f"X-WR-TIMEZONE:{AGENDA_TIMEZONE.key}",
+    ]) + "\r\n"
+    for linhas in componentes:
+        yield "\r\n".join(fold_line(linha) for linha in linhas) + "\r\n"
+    yield "END:VCALENDAR\r\n"
+
+
+def feed_validators(escopo: str, total: int, maior_id, ultima_alteracao) -> tuple:
+    """ETag e Last-Modified de um feed a partir de um agregado barato da consulta.
+
+    A contagem e o maior id mudam com inclusões e exclusões; a maior data de
+    alteração, com edições.
+    """
+    marca = as_utc(ultima_alteracao) if ultima_alteracao is not None else None
+    base = f"{ICS_PRODID}|{escopo}|{total}|{maior_id}|{marca.isoformat() if marca else ''}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:32], marca
+
+
+def conditional_headers(etag_hex: str, ultima_alteracao: Optional[datetime]) -> dict:
+    headers = {"ETag": quote_etag(etag_hex), "Cache-Control": "private, no-cache"}
+    if ultima_alteracao is not None:
+        headers["Last-Modified"] = http_date(ultima_alteracao)
+    return headers
@@ -0,0 +1,203 @@
+"""Gravação em lote das tentativas de login (``login_attempts``).
+
+Tentativas que não mudam o estado do usuário — e-mail inexistente, conta
+bloqueada ou inativa — são o grosso de um ataque de credential stuffing e
+não precisam de um commit cada. Elas vão para um buffer em memória, gravado
+com um único INSERT em lote a cada LOGIN_AUDIT_FLUSH_SECONDS ou quando o
+buffer chega a LOGIN_AUDIT_BATCH_SIZE linhas; o ``lifespan`` esvazia o
+buffer no shutdown.
+
+Tentativas que mudam o estado (contador de falhas, bloqueio, sucesso) são
+gravadas na mesma transação da mudança — ver ``log_login_attempt`` em
+auth_routes.
+
+Toda gravação também atualiza ``login_attempt_counters`` (por e-mail e por
+IP) na mesma transação, para que checagens não dependam do histórico bruto.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.auth_models import LoginAttempt, LoginAttemptCounter
+from app.services.background import BackgroundService
+
+logger = logging.getLogger(__name__)
+
+LOGIN_AUDIT_FLUSH_SECONDS = float(os.getenv("LOGIN_AUDIT_FLUSH_SECONDS", "2"))
+LOGIN_AUDIT_BATCH_SIZE = int(os.getenv("LOGIN_AUDIT_BATCH_SIZE", "200"))
+# Limite de segurança: se o banco ficar fora, descarta as mais antigas
+LOGIN_AUDIT_MAX_BUFFER = int(os.getenv("LOGIN_AUDIT_MAX_BUFFER", "10000"))
+LOGIN_FAILURE_WINDOW_MINUTES = int(os.getenv("LOGIN_FAILURE_WINDOW_MINUTES", "15"))
+
+
+def _upsert(db: AsyncSession):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+async def bump_login_counters(db: AsyncSession, tentativas: Iterable[dict]) -> None:
+    """Acumula as tentativas nos contadores por e-mail/IP (sem commit).
+
+    Cada tentativa é um dict com ``email``, ``ip_address``, ``sucesso`` e,
+    opcionalmente, ``created_at``. Um UPSERT por chave.
+    """
+    agora = datetime.now(timezone.utc)
+    agregados: dict = defaultdict(lambda: {"falhas": 0, "sucessos": 0, "ultima_falha": None, "ultimo_sucesso": None})
+    for tentativa in tentativas:
+        quando = tentativa.get("created_at") or agora
+        for escopo, chave in (("email", tentativa.get("email")), ("ip", tentativa.get("ip_address"))):
+            if not chave:
+                continue
+            item = agregados[(escopo, chave[:200])]
+            if tentativa["sucesso"]:
+                item["sucessos"] += 1
+                item["ultimo_sucesso"] = max(filter(None, (item["ultimo_sucesso"], quando)))
+            else:
+                item["falhas"] += 1
+                item["ultima_falha"] = max(filter(None, (item["ultima_falha"], quando)))
+    if not agregados:
+        return
+
+    insert_fn = _upsert(db)
+    tabela = LoginAttemptCounter
+    janela_expirada = tabela.janela_inicio < agora - timedelta(minutes=LOGIN_FAILURE_WINDOW_MINUTES)
+    for (escopo, chave), item in agregados.items():
+        stmt = insert_fn(tabela).values(
+            escopo=escopo,
+            chave=chave,
+            falhas_janela=item["falhas"],
+            janela_inicio=agora,
+            total_falhas=item["falhas"],
+            total_sucessos=item["sucessos"],
+            ultima_falha_em=item["ultima_falha"],
+            ultimo_sucesso_em=item["ultimo_sucesso"],
+        )
+        novo = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabela.escopo, tabela.chave],
+            set_={
+                "falhas_janela": case(
+                    (janela_expirada, novo.falhas_janela),
+                    else_=tabela.falhas_janela + novo.falhas_janela,
+                ),
+                "janela_inicio": case((janela_expirada, novo.janela_inicio), else_=tabela.janela_inicio),
+                "total_falhas": tabela.total_falhas + novo.total_falhas,
+                "total_sucessos": tabela.total_sucessos + novo.total_sucessos,
+                "ultima_falha_em": func.coalesce(novo.ultima_falha_em, tabela.ultima_falha_em),
+                "ultimo_sucesso_em": func.coalesce(novo.ultimo_sucesso_em, tabela.ultimo_sucesso_em),
+            },
+        )
+        await db.execute(stmt)
+
+
+async def recent_failures(db: AsyncSession, escopo: str, chave: str) -> int:
+    """Falhas de login na janela atual para um e-mail ou IP (lê só o contador)."""
+    limite = datetime.now(timezone.utc) - timedelta(minutes=LOGIN_FAILURE_WINDOW_MINUTES)
+    resultado = await db.execute(
+        select(LoginAttemptCounter.falhas_janela).where(
+            LoginAttemptCounter.escopo == escopo,
+            LoginAttemptCounter.chave == chave,
+            LoginAttemptCounter.janela_inicio >= limite,
+        )
+    )
+    return int(resultado.scalar_one_or_none() or 0)
+
+
+async def has_successful_login(db: AsyncSession, email: str) -> bool:
+    resultado = await db.execute(
+        select(LoginAttemptCounter.total_sucessos).where(
+            LoginAttemptCounter.escopo == "email",
+            LoginAttemptCounter.chave == email,
+        )
+    )
+    return (resultado.scalar_one_or_none() or 0) > 0
+
+
+class LoginAuditWriter(BackgroundService):
+    def __init__(self, session_factory=None):
+        super().__init__(session_factory)
+        self._buffer: list[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.descartadas = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def record(self, email: str, ip_address: Optional[str], sucesso: bool, motivo: Optional[str] = None) -> None:
+        self._buffer.append({
+            "email": email,
+            "ip_address": ip_address,
+            "sucesso": sucesso,
+            "motivo": motivo,
+            "created_at": datetime.now(timezone.utc),
+        })
+        excesso = len(self._buffer) - LOGIN_AUDIT_MAX_BUFFER
+        if excesso > 0:
+            del self._buffer[:excesso]
+            self.descartadas += excesso
+            logger.warning("Buffer de auditoria de login cheio: %d tentativa(s) descartada(s)", excesso)
+        if len(self._buffer) >= LOGIN_AUDIT_BATCH_SIZE and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Grava o buffer atual num único INSERT em lote. Retorna quantas linhas gravou."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            lote, self._buffer = self._buffer, []
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(insert(LoginAttempt), lote)
+                    await bump_login_counters(db, lote)
+                    await db.commit()
+            except asyncio.CancelledError:
+                self._buffer[:0] = lote
+                raise
+            except Exception as exc:
+                # Devolve ao buffer para a próxima tentativa
+                self._buffer[:0] = lote
+                logger.warning("Falha ao gravar %d tentativa(s) de login: %s", len(lote), exc)
+                return 0
+            return len(lote)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=LOGIN_AUDIT_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self) -> None:
+        if self.session_factory is None:
+            logger.info("Auditoria de login em lote desativada (engine assíncrona não inicializada)")
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._spawn(self._run())
+
+    async def stop(self) -> None:
+        await self._cancel_tasks()
+        self._wakeup = None
+        gravadas = await self.flush()
+        if gravadas:
+            logger.info("Auditoria de login: %d tentativa(s) gravada(s) no shutdown", gravadas)
+
+
+login_audit_writer = LoginAuditWriter()
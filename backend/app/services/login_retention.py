@@ -0,0 +1,169 @@
+"""Retenção do histórico de ``login_attempts``.
+
+Uma tarefa em background (iniciada no ``lifespan``) remove, a cada
+LOGIN_ATTEMPTS_PURGE_INTERVAL_HOURS, as tentativas mais antigas que
+LOGIN_ATTEMPTS_RETENTION_DAYS. A remoção é feita em lotes curtos para não
+segurar locks na tabela durante picos de login.
+
+No Postgres a tabela pode ser particionada por mês
+(``scripts/partition_login_attempts.py``). Nesse caso a tarefa também cria
+as partições dos próximos meses e descarta as partições inteiramente fora
+da retenção com DROP TABLE, sem varrer linhas.
+
+Dos contadores agregados (``login_attempt_counters``), os de escopo ``ip``
+sem falha nem sucesso dentro da retenção também saem, em lotes — senão cada
+IP de origem de um ataque ficaria ali para sempre. Os de escopo ``email``
+ficam: ``has_successful_login`` depende de ``total_sucessos``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, or_, select, text
+
+from app.models.auth_models import LoginAttempt, LoginAttemptCounter
+from app.services.background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+LOGIN_ATTEMPTS_RETENTION_DAYS = int(os.getenv("LOGIN_ATTEMPTS_RETENTION_DAYS", "90"))
+LOGIN_ATTEMPTS_PURGE_INTERVAL_HOURS = float(os.getenv("LOGIN_ATTEMPTS_PURGE_INTERVAL_HOURS", "6"))
+LOGIN_ATTEMPTS_PURGE_BATCH = int(os.getenv("LOGIN_ATTEMPTS_PURGE_BATCH", "5000"))
+# Quantos meses à frente manter partições criadas (só Postgres particionado)
+LOGIN_ATTEMPTS_PARTITIONS_AHEAD = int(os.getenv("LOGIN_ATTEMPTS_PARTITIONS_AHEAD", "2"))
+
+_PARTITION_RE = re.compile(r"^login_attempts_(\d{4})(\d{2})$")
+
+
+def add_months(dia: date, meses: int) -> date:
+    total = dia.year * 12 + (dia.month - 1) + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def partition_name(mes: date) -> str:
+    return f"login_attempts_{mes.year:04d}{mes.month:02d}"
+
+
+async def is_partitioned(db) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    resultado = await db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'login_attempts'"
+    ))
+    return resultado.first() is not None
+
+
+async def ensure_monthly_partitions(db, inicio: date, fim: date) -> list[str]:
+    """Cria (se faltarem) as partições mensais de ``inicio`` até ``fim`` (inclusive)."""
+    criadas = []
+    mes = date(inicio.year, inicio.month, 1)
+    while mes <= fim:
+        proximo = add_months(mes, 1)
+        nome = partition_name(mes)
+        await db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {nome} PARTITION OF login_attempts "
+            f"FOR VALUES FROM ('{mes.isoformat()}') TO ('{proximo.isoformat()}')"
+        ))
+        criadas.append(nome)
+        mes = proximo
+    return criadas
+
+
+async def _drop_expired_partitions(db, limite: datetime) -> list[str]:
+    resultado = await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'login_attempts'"
+    ))
+    removidas = []
+    for (nome,) in resultado.all():
+        casamento = _PARTITION_RE.match(nome)
+        if not casamento:
+            continue
+        fim_particao = add_months(date(int(casamento.group(1)), int(casamento.group(2)), 1), 1)
+        if fim_particao <= limite.date():
+            await db.execute(text(f"DROP TABLE IF EXISTS {nome}"))
+            removidas.append(nome)
+    return removidas
+
+
+async def _delete_in_batches(session_factory, montar_delete) -> int:
+    """Repete o DELETE de um lote (até LOGIN_ATTEMPTS_PURGE_BATCH linhas), um commit por lote."""
+    total = 0
+    while True:
+        async with session_factory() as db:
+            resultado = await db.execute(montar_delete().execution_options(synchronize_session=False))
+            await db.commit()
+        removidas = resultado.rowcount or 0
+        total += removidas
+        if removidas < LOGIN_ATTEMPTS_PURGE_BATCH:
+            return total
+        # Cede o event loop (e o banco) entre lotes
+        await asyncio.sleep(0)
+
+
+async def purge_login_attempts(session_factory, agora: Optional[datetime] = None) -> int:
+    """Aplica a retenção. Retorna quantas tentativas foram removidas por DELETE."""
+    agora = agora or datetime.now(timezone.utc)
+    limite = agora - timedelta(days=LOGIN_ATTEMPTS_RETENTION_DAYS)
+
+    async with session_factory() as db:
+        if await is_partitioned(db):
+            hoje = agora.date()
+            await ensure_monthly_partitions(db, hoje, add_months(hoje, LOGIN_ATTEMPTS_PARTITIONS_AHEAD))
+            removidas = await _drop_expired_partitions(db, limite)
+            await db.commit()
+            if removidas:
+                logger.info("login_attempts: partições removidas pela retenção: %s", ", ".join(removidas))
+
+    def _lote_tentativas():
+        lote = select(LoginAttempt.id).where(LoginAttempt.created_at < limite).limit(LOGIN_ATTEMPTS_PURGE_BATCH)
+        return delete(LoginAttempt).where(LoginAttempt.id.in_(lote))
+
+    def _lote_contadores_ip():
+        lote = (
+            select(LoginAttemptCounter.chave)
+            .where(
+                LoginAttemptCounter.escopo == "ip",
+                or_(LoginAttemptCounter.ultima_falha_em.is_(None), LoginAttemptCounter.ultima_falha_em < limite),
+                or_(LoginAttemptCounter.ultimo_sucesso_em.is_(None), LoginAttemptCounter.ultimo_sucesso_em < limite),
+            )
+            .limit(LOGIN_ATTEMPTS_PURGE_BATCH)
+        )
+        return delete(LoginAttemptCounter).where(
+            LoginAttemptCounter.escopo == "ip", LoginAttemptCounter.chave.in_(lote)
+        )
+
+    removidas_linhas = await _delete_in_batches(session_factory, _lote_tentativas)
+    if removidas_linhas:
+        logger.info("login_attempts: %d tentativa(s) anteriores a %s removida(s)", removidas_linhas, limite.date())
+    contadores = await _delete_in_batches(session_factory, _lote_contadores_ip)
+    if contadores:
+        logger.info("login_attempt_counters: %d IP(s) sem atividade desde %s removido(s)", contadores, limite.date())
+    return removidas_linhas
+
+
+class LoginRetentionTask(PeriodicTask):
+    mensagem_falha = "Falha na retenção de login_attempts"
+    mensagem_desativada = "Retenção de login_attempts desativada"
+
+    def interval_seconds(self) -> float:
+        return LOGIN_ATTEMPTS_PURGE_INTERVAL_HOURS * 3600
+
+    def enabled(self) -> bool:
+        return LOGIN_ATTEMPTS_RETENTION_DAYS > 0 and super().enabled()
+
+    async def run_once(self) -> None:
+        await purge_login_attempts(self.session_factory)
+
+
+login_retention_task = LoginRetentionTask()
@@ -0,0 +1,230 @@
+"""Gravação em disco dos arquivos de materiais educativos.
+
+O upload é copiado em blocos de MATERIAIS_UPLOAD_CHUNK_BYTES para um arquivo
+temporário no mesmo diretório base (mesmo sistema de arquivos), calculando o
+SHA-256 no caminho. A escrita roda no threadpool, sem travar o event loop, e
+a cópia é abortada assim que o limite de tamanho é ultrapassado — o arquivo
+nunca fica inteiro em memória. No fim o temporário é movido para o destino
+com ``os.replace`` (atômico): ninguém enxerga um arquivo pela metade.
+
+O destino é um blob endereçado pelo conteúdo (``blobs/ab/cd/<sha256>``),
+compartilhado por todos os ``EducationalMaterialFile`` com o mesmo hash — o
+mesmo folheto enviado por várias UBS ocupa o disco uma vez. ``MaterialBlob``
+conta as referências. O incremento é um upsert e o decremento um UPDATE na
+mesma linha. Quem solta a última referência só zera o contador; depois do
+commit, ``purge_unreferenced_blob`` apaga a linha com ``DELETE ... WHERE
+ref_count <= 0`` (atômico também no SQLite, onde ``FOR UPDATE`` não existe),
+faz o commit e só então, se a linha saiu mesmo, remove o arquivo. Se o
+processo cair antes da limpeza, sobra uma linha com ``ref_count = 0`` que o
+próximo upload do mesmo conteúdo reaproveita.
+
+``acquire_blob`` põe o arquivo no lugar antes do commit de quem chama (uma
+linha commitada nunca aponta para um arquivo ausente) e informa se o blob é
+novo; se o commit falhar, ``abandon_blob`` tira o arquivo de volta.
+
+Um upload concorrente do mesmo conteúdo pode regravar o blob entre o commit
+da limpeza e a remoção do arquivo. Como o caminho é o hash, qualquer arquivo
+ali tem os mesmos bytes: a remoção move o arquivo para o lado e, se não for
+mais o mesmo inode que ela conhecia, devolve-o ao lugar.
+Arquivos anteriores aos blobs continuam nas pastas dos materiais.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from starlette.concurrency import run_in_threadpool
+
+from app.models.materiais_models import MaterialBlob
+
+MATERIAIS_UPLOAD_CHUNK_BYTES = int(os.getenv("MATERIAIS_UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+_TMP_DIRNAME = ".tmp"
+_BLOBS_DIRNAME = "blobs"
+
+
+@dataclass
+class AcquiredBlob:
+    """Blob referenciado por ``acquire_blob``; ``inode`` só quando esta chamada o criou."""
+
+    path: Path
+    inode: int | None = None
+
+
+@dataclass
+class StagedUpload:
+    """Upload já copiado para um temporário, aguardando ``commit_file``."""
+
+    path: Path
+    size_bytes: int
+    sha256: str
+
+
+def tmp_dir(base_dir: Path) -> Path:
+    destino = base_dir / _TMP_DIRNAME
+    destino.mkdir(parents=True, exist_ok=True)
+    return destino
+
+
+def discard(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+async def stage_upload(file: UploadFile, base_dir: Path, max_bytes: int, limite_legivel: str) -> StagedUpload:
+    """Copia ``file`` em blocos para um temporário; 413 ao passar de ``max_bytes``."""
+    fd, nome = await run_in_threadpool(tempfile.mkstemp, suffix=".part", dir=str(tmp_dir(base_dir)))
+    caminho = Path(nome)
+    digest = hashlib.sha256()
+    total = 0
+    try:
+        with os.fdopen(fd, "wb") as destino:
+            while True:
+                bloco = await file.read(MATERIAIS_UPLOAD_CHUNK_BYTES)
+                if not bloco:
+                    break
+                total += len(bloco)
+                if total > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Arquivo excede o limite de {limite_legivel}",
+                    )
+                digest.update(bloco)
+                await run_in_threadpool(destino.write, bloco)
+    except BaseException:
+        await run_in_threadpool(discard, caminho)
+        raise
+    return StagedUpload(path=caminho, size_bytes=total, sha256=digest.hexdigest())
+
+
+async def commit_file(staged: StagedUpload, destino: Path) -> Path:
+    """Move o temporário para ``destino`` (rename atômico)."""
+    await run_in_threadpool(destino.parent.mkdir, parents=True, exist_ok=True)
+    await run_in_threadpool(os.replace, staged.path, destino)
+    return destino
+
+
+# ─── Blobs endereçados pelo conteúdo ─────────────────────────────────
+
+def blob_path(base_dir: Path, sha256: str) -> Path:
+    return base_dir / _BLOBS_DIRNAME / sha256[:2] / sha256[2:4] / sha256
+
+
+def is_blob_path(base_dir: Path, sha256: str | None, storage_path: Path) -> bool:
+    return bool(sha256) and storage_path == blob_path(base_dir, sha256).resolve()
+
+
+def _insert_fn(db):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+async def _reference(db, base_dir: Path, sha256: str, size_bytes: int) -> tuple[Path, int]:
+    """Mais uma referência (upsert). Devolve o caminho e o ``ref_count`` resultante."""
+    caminho = blob_path(base_dir, sha256)
+    stmt = _insert_fn(db)(MaterialBlob).values(
+        sha256=sha256, size_bytes=size_bytes, storage_path=str(caminho), ref_count=1
+    )
+    ref_count = (await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[MaterialBlob.sha256],
+            set_={"ref_count": MaterialBlob.ref_count + 1},
+        ).returning(MaterialBlob.ref_count)
+    )).scalar_one()
+    return caminho, ref_count
+
+
+def _inode(path: Path) -> int | None:
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _discard_blob_file(path: Path, inode: int | None) -> None:
+    """Remove o arquivo do blob se ainda é o do ``inode`` informado (ver docstring do módulo)."""
+    if inode is None:
+        return
+    lixo = path.with_name(f"{path.name}.{uuid.uuid4().hex}.lixo")
+    try:
+        os.rename(path, lixo)
+    except FileNotFoundError:
+        return
+    if _inode(lixo) != inode:
+        # Regravado por um upload concorrente: mesmo conteúdo, volta para o lugar
+        os.replace(lixo, path)
+    else:
+        discard(lixo)
+
+
+async def acquire_blob(db, staged: StagedUpload, base_dir: Path) -> AcquiredBlob:
+    """Referencia o blob do conteúdo de ``staged`` (criando-o se preciso); o commit fica com quem chama."""
+    caminho, ref_count = await _reference(db, base_dir, staged.sha256, staged.size_bytes)
+    # Conteúdo idêntico: substituir um blob existente não muda nada
+    await commit_file(staged, caminho)
+    if ref_count > 1:
+        return AcquiredBlob(path=caminho)
+    return AcquiredBlob(path=caminho, inode=await run_in_threadpool(_inode, caminho))
+
+
+async def abandon_blob(blob: AcquiredBlob) -> None:
+    """Desfaz ``acquire_blob`` depois de um rollback: remove o arquivo que ela criou."""
+    await run_in_threadpool(_discard_blob_file, blob.path, blob.inode)
+
+
+async def reference_existing_blob(db, base_dir: Path, sha256: str) -> MaterialBlob | None:
+    """Mais uma referência a um blob que já existe (upload de duplicata sem enviar bytes)."""
+    # O lock impede que uma limpeza concorrente apague o arquivo entre a checagem e o upsert
+    blob = (await db.execute(
+        select(MaterialBlob).where(MaterialBlob.sha256 == sha256).with_for_update()
+    )).scalar_one_or_none()
+    if blob is None or not await run_in_threadpool(Path(blob.storage_path).exists):
+        return None
+    await _reference(db, base_dir, sha256, blob.size_bytes)
+    return blob
+
+
+async def release_blob(db, sha256: str) -> bool:
+    """Solta uma referência. True se era a última: chame ``purge_unreferenced_blob`` após o commit."""
+    await db.execute(
+        update(MaterialBlob)
+        .where(MaterialBlob.sha256 == sha256)
+        .values(ref_count=MaterialBlob.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    ref_count = (await db.execute(
+        select(MaterialBlob.ref_count).where(MaterialBlob.sha256 == sha256)
+    )).scalar_one_or_none()
+    return ref_count is not None and ref_count <= 0
+
+
+async def purge_unreferenced_blob(db, sha256: str) -> None:
+    """Apaga linha e arquivo do blob se continua sem referências. Abre e fecha a própria transação."""
+    storage_path = (await db.execute(
+        select(MaterialBlob.storage_path).where(MaterialBlob.sha256 == sha256)
+    )).scalar_one_or_none()
+    if storage_path is None:
+        await db.rollback()
+        return
+    caminho = Path(storage_path)
+    inode = await run_in_threadpool(_inode, caminho)
+    resultado = await db.execute(
+        delete(MaterialBlob)
+        .where(MaterialBlob.sha256 == sha256, MaterialBlob.ref_count <= 0)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    # Referenciado de novo no meio do caminho: a linha ficou, o arquivo também
+    if resultado.rowcount == 1:
+        await run_in_threadpool(_discard_blob_file, caminho, inode)
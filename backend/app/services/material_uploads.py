@@ -0,0 +1,181 @@
+"""Uploads retomáveis de materiais (vídeos de capacitação etc.).
+
+Protocolo por offset, no estilo tus:
+
+1. ``POST /materiais/{id}/uploads`` declara nome, tipo e tamanho e cria a
+   sessão (um arquivo parcial vazio em disco);
+2. ``PUT /materiais/uploads/{upload_id}?offset=N`` grava o corpo da
+   requisição a partir de N — N pode repetir um trecho já recebido, mas não
+   deixar buraco (409 com o offset atual);
+3. ``GET /materiais/uploads/{upload_id}`` informa o offset para retomar
+   depois de uma queda de conexão;
+4. ``POST /materiais/uploads/{upload_id}/finalizar`` confere o tamanho,
+   obtém o SHA-256 e move o arquivo para a pasta do material.
+
+Os blocos são escritos direto na posição final do arquivo parcial, então
+não há etapa de montagem que releia as partes. O SHA-256 é calculado à
+medida que os blocos chegam em ordem (um hash incremental por sessão, na
+memória do processo); só quando a sequência se quebra — um PUT que regrava
+um trecho, ou outro worker que recebeu uma parte — o arquivo é relido na
+finalização. Se a conexão cair no meio de um PUT, os bytes que chegaram
+contam. Cada PUT renova a validade da sessão (MATERIAIS_UPLOAD_SESSION_HOURS);
+uma tarefa em background (iniciada no ``lifespan``) apaga as sessões
+vencidas e seus arquivos a cada MATERIAIS_UPLOAD_GC_INTERVAL_MINUTES.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app.models.materiais_models import MaterialUploadSession
+from app.services.background import PeriodicTask
+from app.services.material_storage import MATERIAIS_UPLOAD_CHUNK_BYTES, discard
+
+logger = logging.getLogger(__name__)
+
+MATERIAIS_RESUMABLE_MAX_BYTES = int(os.getenv("MATERIAIS_RESUMABLE_MAX_BYTES", str(2 * 1024 ** 3)))
+MATERIAIS_UPLOAD_SESSION_HOURS = float(os.getenv("MATERIAIS_UPLOAD_SESSION_HOURS", "24"))
+MATERIAIS_UPLOAD_GC_INTERVAL_MINUTES = float(os.getenv("MATERIAIS_UPLOAD_GC_INTERVAL_MINUTES", "60"))
+
+# upload_id -> (bytes já incluídos no hash, hash incremental)
+_running_hashes: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+
+
+def session_expiry(agora: Optional[datetime] = None) -> datetime:
+    return (agora or datetime.now(timezone.utc)) + timedelta(hours=MATERIAIS_UPLOAD_SESSION_HOURS)
+
+
+def is_expired(sessao: MaterialUploadSession, agora: Optional[datetime] = None) -> bool:
+    expira_em = sessao.expira_em
+    if expira_em.tzinfo is None:
+        # SQLite devolve datetimes naive (gravados em UTC)
+        expira_em = expira_em.replace(tzinfo=timezone.utc)
+    return expira_em < (agora or datetime.now(timezone.utc))
+
+
+def _write_at(caminho: Path, offset: int, dados: bytes) -> None:
+    with open(caminho, "r+b") as destino:
+        destino.seek(offset)
+        destino.write(dados)
+
+
+async def write_chunk(
+    caminho: Path, offset: int, corpo: AsyncIterator[bytes], limite: int, digest=None
+) -> Tuple[int, bool]:
+    """Grava ``corpo`` a partir de ``offset`` (e o inclui em ``digest``, se houver).
+
+    Retorna (bytes gravados, conexão interrompida). Levanta ValueError se o
+    corpo passar de ``limite`` bytes — nada além do limite é gravado.
+    """
+    gravados = 0
+    buffer = bytearray()
+    interrompido = False
+
+    async def _flush() -> None:
+        nonlocal gravados
+        dados = bytes(buffer)
+        await run_in_threadpool(_write_at, caminho, offset + gravados, dados)
+        if digest is not None:
+            digest.update(dados)
+        gravados += len(dados)
+        buffer.clear()
+
+    try:
+        async for bloco in corpo:
+            if gravados + len(buffer) + len(bloco) > limite:
+                raise ValueError("corpo maior que o restante do arquivo")
+            buffer.extend(bloco)
+            if len(buffer) >= MATERIAIS_UPLOAD_CHUNK_BYTES:
+                await _flush()
+    except ClientDisconnect:
+        interrompido = True
+    if buffer:
+        await _flush()
+    return gravados, interrompido
+
+
+def take_running_hash(upload_id: str, offset: int):
+    """Retira o hash incremental da sessão; só serve se ele cobre exatamente os bytes antes de ``offset``.
+
+    Retirar (e não só ler) garante que dois PUTs simultâneos não alimentem o
+    mesmo hash; um PUT que regrava um trecho descarta o hash de vez.
+    """
+    atual = _running_hashes.pop(upload_id, None)
+    if atual is None:
+        return hashlib.sha256() if offset == 0 else None
+    incluidos, digest = atual
+    return digest if incluidos == offset else None
+
+
+def keep_running_hash(upload_id: str, incluidos: int, digest) -> None:
+    _running_hashes[upload_id] = (incluidos, digest)
+
+
+def forget_running_hash(upload_id: str) -> None:
+    _running_hashes.pop(upload_id, None)
+
+
+def _sha256_of(caminho: Path) -> str:
+    digest = hashlib.sha256()
+    with open(caminho, "rb") as origem:
+        while bloco := origem.read(MATERIAIS_UPLOAD_CHUNK_BYTES):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+async def hash_file(caminho: Path) -> str:
+    return await run_in_threadpool(_sha256_of, caminho)
+
+
+async def upload_sha256(upload_id: str, caminho: Path, tamanho: int) -> str:
+    """SHA-256 do upload completo: o incremental, se cobre o arquivo todo; senão relê o arquivo."""
+    digest = take_running_hash(upload_id, tamanho)
+    if digest is not None:
+        return digest.hexdigest()
+    return await hash_file(caminho)
+
+
+async def purge_expired_sessions(session_factory, agora: Optional[datetime] = None) -> int:
+    """Remove as sessões vencidas e seus arquivos parciais. Retorna quantas."""
+    agora = agora or datetime.now(timezone.utc)
+    async with session_factory() as db:
+        vencidas = (await db.execute(
+            select(MaterialUploadSession.id, MaterialUploadSession.arquivo_parcial)
+            .where(MaterialUploadSession.expira_em < agora)
+        )).all()
+        if not vencidas:
+            return 0
+        await db.execute(
+            delete(MaterialUploadSession)
+            .where(MaterialUploadSession.id.in_([v.id for v in vencidas]))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    for vencida in vencidas:
+        forget_running_hash(vencida.id)
+        await run_in_threadpool(discard, Path(vencida.arquivo_parcial))
+    logger.info("Uploads retomáveis: %d sessão(ões) vencida(s) removida(s)", len(vencidas))
+    return len(vencidas)
+
+
+class MaterialUploadCleanupTask(PeriodicTask):
+    mensagem_falha = "Falha na limpeza de uploads retomáveis"
+    mensagem_desativada = "Limpeza de uploads retomáveis desativada"
+
+    def interval_seconds(self) -> float:
+        return MATERIAIS_UPLOAD_GC_INTERVAL_MINUTES * 60
+
+    async def run_once(self) -> None:
+        await purge_expired_sessions(self.session_factory)
+
+
+material_upload_cleanup_task = MaterialUploadCleanupTask()
@@ -0,0 +1,90 @@
+"""Exportação em lote de relatórios como um ZIP transmitido em streaming.
+
+Os PDFs são renderizados em paralelo no pool de processos e cada um entra no
+ZIP assim que fica pronto; os bytes do arquivo saem para o cliente a cada
+entrada, então o ZIP inteiro nunca fica em memória — no máximo os PDFs que
+estão prontos aguardando a vez de serem escritos.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import zipfile
+from typing import AsyncIterator, Iterable
+
+from app.services.reporting.render_pool import REPORT_RENDER_WORKERS
+from app.services.reporting.report_jobs import render_cached
+
+logger = logging.getLogger(__name__)
+
+
+class _ZipStreamBuffer:
+    """Destino não-seekable do ZipFile: acumula o que foi escrito até ser drenado."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_reports_zip(items: Iterable[tuple[str, str, dict]]) -> AsyncIterator[bytes]:
+    """Gera o ZIP em pedaços a partir de ``(nome_no_zip, tipo, payload)``.
+
+    No máximo REPORT_RENDER_WORKERS relatórios ficam em andamento (ou prontos
+    esperando escrita); o próximo só começa depois que um deles vai para o
+    cliente. Falhas individuais não interrompem o lote: entram em ``ERROS.txt``.
+    """
+
+    async def _render_one(arcname: str, tipo: str, payload: dict):
+        try:
+            pdf_bytes, _filename, _render_ms = await render_cached(tipo, payload)
+            return arcname, pdf_bytes, None
+        except Exception as exc:
+            logger.exception("Falha ao gerar %s na exportação em lote", arcname)
+            return arcname, None, str(exc) or exc.__class__.__name__
+
+    limite = max(1, REPORT_RENDER_WORKERS)
+    pendentes_itens = iter(items)
+    em_andamento: set[asyncio.Task] = set()
+    buffer = _ZipStreamBuffer()
+    erros: list[str] = []
+
+    def _preencher() -> None:
+        while len(em_andamento) < limite:
+            item = next(pendentes_itens, None)
+            if item is None:
+                return
+            em_andamento.add(asyncio.create_task(_render_one(*item)))
+
+    try:
+        # ZIP_STORED: PDFs já são comprimidos e assim o event loop não gasta CPU com deflate.
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as zf:
+            _preencher()
+            while em_andamento:
+                prontos, _ = await asyncio.wait(em_andamento, return_when=asyncio.FIRST_COMPLETED)
+                for task in prontos:
+                    em_andamento.discard(task)
+                    arcname, pdf_bytes, erro = task.result()
+                    if erro is not None:
+                        erros.append(f"{arcname}: {erro}")
+                        continue
+                    zf.writestr(arcname, pdf_bytes)
+                    yield buffer.drain()
+                _preencher()
+            if erros:
+                zf.writestr("ERROS.txt", "\n".join(erros) + "\n")
+        yield buffer.drain()
+    finally:
+        for task in em_andamento:
+            task.cancel()
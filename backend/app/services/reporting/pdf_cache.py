@@ -0,0 +1,212 @@
+"""Cache em disco dos PDFs do relatório situacional.
+
+Os PDFs são endereçados pelo conteúdo: a chave é o SHA-256 do payload do
+diagnóstico somado ao payload de problemas/intervenções. Um índice por UBS
+(``index/{ubs_id}.json``) aponta para o último digest gerado, o que permite
+servir o PDF sem reconsultar o diagnóstico nem renderizar de novo.
+
+O índice é apagado sempre que uma linha que compõe o relatório muda (UBS,
+serviços, indicadores, grupos profissionais, território, necessidades,
+problemas, intervenções e ações), via eventos de sessão do SQLAlchemy. Por
+ficar em disco, a invalidação vale para todos os workers do mesmo host.
+
+O tamanho total dos PDFs é limitado por REPORT_CACHE_MAX_BYTES; os menos
+usados recentemente (mtime) são removidos primeiro.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models.diagnostico_models import (
+    UBS,
+    UBSService,
+    Indicator,
+    ProfessionalGroup,
+    TerritoryProfile,
+    UBSNeeds,
+    UBSProblem,
+    UBSIntervention,
+    UBSInterventionAction,
+)
+from app.utils import session_invalidation
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_DIR = Path(
+    os.getenv("REPORT_CACHE_DIR", str(Path(__file__).resolve().parents[2] / "cache" / "reports"))
+)
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+_ALL = session_invalidation.ALL
+
+
+def payload_digest(*payloads: dict) -> str:
+    """SHA-256 estável (chaves ordenadas) dos payloads que geram o relatório."""
+    hasher = hashlib.sha256()
+    for payload in payloads:
+        hasher.update(
+            json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        )
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+def _blob_path(digest: str) -> Path:
+    return REPORT_CACHE_DIR / "pdf" / digest[:2] / f"{digest}.pdf"
+
+
+def _index_path(ubs_id: int) -> Path:
+    return REPORT_CACHE_DIR / "index" / f"{int(ubs_id)}.json"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def get_blob(digest: str) -> Optional[Path]:
+    """Retorna o caminho do PDF em cache (e marca como usado) ou None."""
+    path = _blob_path(digest)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def put_blob(digest: str, pdf_bytes: bytes) -> Path:
+    path = _blob_path(digest)
+    _atomic_write(path, pdf_bytes)
+    _evict_if_needed()
+    return path
+
+
+def lookup_ubs(ubs_id: int) -> Optional[tuple[str, str, Path]]:
+    """Retorna ``(digest, filename_base, caminho)`` do último PDF válido da UBS."""
+    try:
+        entry = json.loads(_index_path(ubs_id).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+    digest = entry.get("digest")
+    if not digest:
+        return None
+    path = get_blob(digest)
+    if path is None:
+        return None
+    return digest, entry.get("filename") or "relatorio_situacional", path
+
+
+def remember_ubs(ubs_id: int, digest: str, filename_base: str) -> None:
+    data = json.dumps({"digest": digest, "filename": filename_base}).encode("utf-8")
+    _atomic_write(_index_path(ubs_id), data)
+
+
+def invalidate_ubs(ubs_ids) -> None:
+    """Remove do índice as UBS informadas (``"*"`` invalida todas)."""
+    if _ALL in ubs_ids:
+        index_dir = REPORT_CACHE_DIR / "index"
+        if index_dir.is_dir():
+            for entry in index_dir.glob("*.json"):
+                entry.unlink(missing_ok=True)
+        return
+    for ubs_id in ubs_ids:
+        _index_path(ubs_id).unlink(missing_ok=True)
+
+
+def _evict_if_needed() -> None:
+    pdf_dir = REPORT_CACHE_DIR / "pdf"
+    if not pdf_dir.is_dir():
+        return
+    entries = []
+    total = 0
+    for path in pdf_dir.glob("*/*.pdf"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    if total <= REPORT_CACHE_MAX_BYTES:
+        return
+    entries.sort(key=lambda item: item[0])
+    for _mtime, size, path in entries:
+        if total <= REPORT_CACHE_MAX_BYTES:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        logger.info("Cache de relatórios: removido %s (LRU)", path.name)
+
+
+# ─── Invalidação automática ──────────────────────────────────────────
+
+_DIRECT_UBS_MODELS = (UBSService, Indicator, ProfessionalGroup, TerritoryProfile, UBSNeeds, UBSProblem)
+
+
+def _affected_ubs_ids(session: Session, objects) -> set:
+    ubs_ids: set = set()
+    problem_ids: set[int] = set()
+    intervention_ids: set[int] = set()
+    for obj in objects:
+        if isinstance(obj, UBS):
+            if obj.id is not None:
+                ubs_ids.add(obj.id)
+        elif isinstance(obj, _DIRECT_UBS_MODELS):
+            if obj.ubs_id is not None:
+                ubs_ids.add(obj.ubs_id)
+        elif isinstance(obj, UBSIntervention):
+            problem_ids.add(obj.problem_id)
+        elif isinstance(obj, UBSInterventionAction):
+            intervention_ids.add(obj.intervention_id)
+
+    with session.no_autoflush:
+        if intervention_ids:
+            problem_ids.update(
+                session.execute(
+                    select(UBSIntervention.problem_id).where(UBSIntervention.id.in_(intervention_ids))
+                ).scalars().all()
+            )
+        if problem_ids:
+            ubs_ids.update(
+                session.execute(
+                    select(UBSProblem.ubs_id).where(UBSProblem.id.in_(problem_ids))
+                ).scalars().all()
+            )
+    return ubs_ids
+
+
+def _collect_changed_ubs(session: Session) -> set:
+    objects = [*session.new, *session.dirty, *session.deleted]
+    if not objects:
+        return set()
+    return _affected_ubs_ids(session, objects)
+
+
+def _apply_invalidation(ubs_ids: set) -> None:
+    try:
+        invalidate_ubs(ubs_ids)
+    except OSError as exc:
+        logger.warning("Falha ao invalidar cache de relatórios: %s", exc)
+
+
+session_invalidation.register(
+    _collect_changed_ubs,
+    _apply_invalidation,
+    bulk_models=(UBS, *_DIRECT_UBS_MODELS, UBSIntervention, UBSInterventionAction),
+)
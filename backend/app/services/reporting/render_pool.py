@@ -0,0 +1,226 @@
+"""Renderização de relatórios PDF fora do event loop.
+
+O ReportLab é CPU-bound: gerar o PDF dentro do handler async trava o único
+worker do uvicorn durante toda a renderização. Aqui os relatórios são
+renderizados num pool de processos limitado, a partir de payloads
+serializáveis (dicts), e o handler só aguarda o resultado.
+
+Back-pressure: no máximo REPORT_RENDER_WORKERS renderizações simultâneas e
+REPORT_RENDER_MAX_QUEUE aguardando; acima disso ``RenderQueueFull`` é
+levantada e a rota responde 503.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+REPORT_RENDER_WORKERS = int(os.getenv("REPORT_RENDER_WORKERS", "2"))
+REPORT_RENDER_MAX_QUEUE = int(os.getenv("REPORT_RENDER_MAX_QUEUE", "8"))
+REPORT_RENDER_RETRY_AFTER = int(os.getenv("REPORT_RENDER_RETRY_AFTER", "5"))
+
+
+class RenderQueueFull(Exception):
+    """Fila de renderização saturada; o chamador deve tentar novamente depois."""
+
+
+# ─── Funções executadas nos processos do pool ────────────────────────
+# Precisam ser de nível de módulo (picklable) e receber apenas dados simples.
+
+
+def _render_situational(payload: dict) -> tuple[bytes, str]:
+    from app.schemas.diagnostico_schemas import FullDiagnosisOut
+    from app.services.reporting.simple_situational_report_pdf import (
+        generate_situational_report_pdf_simple,
+    )
+
+    diagnosis = FullDiagnosisOut.model_validate(payload["diagnosis"])
+    return generate_situational_report_pdf_simple(
+        diagnosis,
+        municipality=payload.get("municipality") or "",
+        reference_period=payload.get("reference_period") or "",
+        problems=payload.get("problems") or [],
+    )
+
+
+def _render_microareas(payload: dict) -> tuple[bytes, str]:
+    from app.services.reporting.microareas_report_pdf import generate_microareas_report_pdf
+
+    agentes_por_microarea = {
+        int(microarea_id): nomes
+        for microarea_id, nomes in (payload.get("agentes_por_microarea") or {}).items()
+    }
+    return generate_microareas_report_pdf(
+        ubs=SimpleNamespace(**payload["ubs"]),
+        microareas=[SimpleNamespace(**m) for m in payload.get("microareas") or []],
+        agentes_por_microarea=agentes_por_microarea,
+        emitted_by=payload.get("emitted_by"),
+    )
+
+
+_RENDERERS: dict[str, Callable[[dict], tuple[bytes, str]]] = {
+    "situational": _render_situational,
+    "microareas": _render_microareas,
+}
+
+
+# ─── Payloads serializáveis ──────────────────────────────────────────
+
+
+def build_situational_payload(
+    diagnosis,
+    problems: list[dict],
+    municipality: str = "Município de Parnaíba",
+) -> dict:
+    """Converte o diagnóstico agregado (FullDiagnosisOut) num payload JSON-serializável."""
+    return {
+        "diagnosis": diagnosis.model_dump(mode="json"),
+        "municipality": municipality,
+        "reference_period": diagnosis.ubs.periodo_referencia or "",
+        "problems": problems,
+    }
+
+
+def build_microareas_payload(ubs, microareas, agentes_por_microarea: dict, emitted_by=None) -> dict:
+    """Extrai de UBS/Microarea (ORM) apenas os campos usados pelo relatório de microáreas."""
+    return {
+        "ubs": {"nome_ubs": getattr(ubs, "nome_ubs", "-")},
+        "microareas": [
+            {
+                "id": m.id,
+                "nome": m.nome,
+                "status": m.status,
+                "familias": m.familias,
+                "populacao": m.populacao,
+                "localidades": m.localidades,
+                "descricao": m.descricao,
+                "observacoes": m.observacoes,
+            }
+            for m in microareas
+        ],
+        "agentes_por_microarea": {str(k): list(v) for k, v in agentes_por_microarea.items()},
+        "emitted_by": emitted_by,
+    }
+
+
+# ─── Pool e métricas ─────────────────────────────────────────────────
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+_metrics: dict[str, dict[str, float]] = {}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # "spawn" evita herdar threads/conexões do processo do servidor via fork.
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, REPORT_RENDER_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _record(kind: str, outcome: str, wait_ms: float = 0.0, render_ms: float = 0.0) -> None:
+    stats = _metrics.setdefault(
+        kind,
+        {
+            "rendered": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_render_ms": 0.0,
+            "max_render_ms": 0.0,
+            "total_wait_ms": 0.0,
+        },
+    )
+    stats[outcome] += 1
+    if outcome != "rejected":
+        stats["total_render_ms"] += render_ms
+        stats["max_render_ms"] = max(stats["max_render_ms"], render_ms)
+        stats["total_wait_ms"] += wait_ms
+
+
+def render_metrics() -> dict[str, Any]:
+    """Snapshot das métricas de renderização por tipo de relatório."""
+    snapshot: dict[str, Any] = {
+        "workers": max(1, REPORT_RENDER_WORKERS),
+        "max_queue": REPORT_RENDER_MAX_QUEUE,
+        "in_flight": _in_flight,
+        "reports": {},
+    }
+    for kind, stats in _metrics.items():
+        finished = stats["rendered"] + stats["failed"]
+        snapshot["reports"][kind] = {
+            **stats,
+            "avg_render_ms": round(stats["total_render_ms"] / finished, 1) if finished else 0.0,
+            "avg_wait_ms": round(stats["total_wait_ms"] / finished, 1) if finished else 0.0,
+        }
+    return snapshot
+
+
+def _timed_render(kind: str, payload: dict, submitted_at: float) -> tuple[bytes, str, float, float]:
+    started_at = time.time()
+    pdf_bytes, filename_base = _RENDERERS[kind](payload)
+    finished_at = time.time()
+    return (
+        pdf_bytes,
+        filename_base,
+        (started_at - submitted_at) * 1000,
+        (finished_at - started_at) * 1000,
+    )
+
+
+async def render_report(kind: str, payload: dict) -> tuple[bytes, str, float]:
+    """Renderiza o relatório ``kind`` no pool sem bloquear o event loop.
+
+    Retorna ``(pdf_bytes, filename_base, render_ms)``. Levanta
+    ``RenderQueueFull`` quando a fila está saturada.
+    """
+    global _in_flight
+    if kind not in _RENDERERS:
+        raise ValueError(f"Tipo de relatório desconhecido: {kind}")
+
+    capacity = max(1, REPORT_RENDER_WORKERS) + max(0, REPORT_RENDER_MAX_QUEUE)
+    if _in_flight >= capacity:
+        _record(kind, "rejected")
+        logger.warning("Fila de renderização cheia (%d/%d), rejeitando relatório %s", _in_flight, capacity, kind)
+        raise RenderQueueFull(kind)
+
+    _in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        try:
+            pdf_bytes, filename_base, wait_ms, render_ms = await loop.run_in_executor(
+                _get_executor(), _timed_render, kind, payload, time.time()
+            )
+        except Exception:
+            _record(kind, "failed")
+            raise
+    finally:
+        _in_flight -= 1
+
+    _record(kind, "rendered", wait_ms=wait_ms, render_ms=render_ms)
+    logger.info(
+        "Relatório %s renderizado em %.0f ms (fila %.0f ms, %d bytes)",
+        kind, render_ms, wait_ms, len(pdf_bytes),
+    )
+    return pdf_bytes, filename_base, render_ms
+
+
+def shutdown_render_pool() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
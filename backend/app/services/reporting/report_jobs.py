@@ -0,0 +1,242 @@
+"""Fila local de exportações assíncronas de relatórios.
+
+O POST grava um ``ReportExportJob`` com o payload já montado e devolve o id;
+um worker em processo (tarefas asyncio iniciadas no ``lifespan``) consome a
+fila, renderiza no pool de processos (``render_pool``) e grava o PDF em disco.
+Não há broker externo: a fila em memória é só um atalho — a fonte da verdade
+é a tabela, e no startup os jobs pendentes (ou presos em PROCESSANDO) são
+recolocados na fila.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import delete, select, update, or_
+
+from app.models.relatorios_models import ReportExportJob, StatusReportJob
+from app.schemas.relatorios_schemas import ReportExportJobOut
+from app.services.background import BackgroundService
+from app.services.reporting import pdf_cache
+from app.services.reporting.render_pool import (
+    REPORT_RENDER_RETRY_AFTER,
+    REPORT_RENDER_WORKERS,
+    RenderQueueFull,
+    render_report,
+)
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOBS_DIR = Path(
+    os.getenv("REPORT_JOBS_DIR", str(Path(__file__).resolve().parents[2] / "cache" / "report_jobs"))
+)
+REPORT_JOB_TTL_HOURS = int(os.getenv("REPORT_JOB_TTL_HOURS", "24"))
+REPORT_JOB_STALE_SECONDS = int(os.getenv("REPORT_JOB_STALE_SECONDS", "600"))
+
+
+def new_job(tipo: str, ubs_id: int, requested_by: int, payload: dict, filename: Optional[str] = None) -> ReportExportJob:
+    return ReportExportJob(
+        id=str(uuid.uuid4()),
+        tipo=tipo,
+        ubs_id=ubs_id,
+        requested_by=requested_by,
+        status=StatusReportJob.PENDENTE.value,
+        payload=payload,
+        filename=filename,
+    )
+
+
+def job_out(job: ReportExportJob) -> ReportExportJobOut:
+    resp = ReportExportJobOut.model_validate(job)
+    if job.status == StatusReportJob.CONCLUIDO.value:
+        resp.download_url = f"/api/relatorios/jobs/{job.id}/download"
+    return resp
+
+
+def _artifact_path(job_id: str) -> Path:
+    return REPORT_JOBS_DIR / f"{job_id}.pdf"
+
+
+def _write_artifact(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+async def render_cached(tipo: str, payload: dict) -> tuple[bytes, Optional[str], Optional[float]]:
+    """Renderiza aguardando vaga no pool (em vez de falhar com 503); usa o cache de PDFs do situacional.
+
+    Retorna ``(pdf_bytes, filename_base, render_ms)``; nos acertos de cache os dois últimos são None.
+    """
+    digest = None
+    if tipo == "situational":
+        digest = pdf_cache.payload_digest(payload["diagnosis"], payload.get("problems") or [])
+        cached = pdf_cache.get_blob(digest)
+        if cached is not None:
+            return await asyncio.to_thread(cached.read_bytes), None, None
+
+    while True:
+        try:
+            pdf_bytes, filename_base, render_ms = await render_report(tipo, payload)
+            break
+        except RenderQueueFull:
+            await asyncio.sleep(REPORT_RENDER_RETRY_AFTER)
+
+    if digest is not None:
+        try:
+            await asyncio.to_thread(pdf_cache.put_blob, digest, pdf_bytes)
+        except OSError as exc:
+            logger.warning("Não foi possível gravar o PDF no cache: %s", exc)
+    return pdf_bytes, filename_base, render_ms
+
+
+async def run_job(job_id: str, session_factory) -> None:
+    """Processa um job. Seguro com vários workers: o job é reivindicado com UPDATE condicional."""
+    async with session_factory() as db:
+        agora = datetime.now(timezone.utc)
+        claim = await db.execute(
+            update(ReportExportJob)
+            .where(
+                ReportExportJob.id == job_id,
+                ReportExportJob.status == StatusReportJob.PENDENTE.value,
+            )
+            .values(status=StatusReportJob.PROCESSANDO.value, started_at=agora)
+        )
+        await db.commit()
+        if claim.rowcount != 1:
+            return
+
+        job = await db.get(ReportExportJob, job_id)
+        try:
+            pdf_bytes, filename_base, render_ms = await render_cached(job.tipo, job.payload)
+            path = _artifact_path(job.id)
+            await asyncio.to_thread(_write_artifact, path, pdf_bytes)
+        except Exception as exc:
+            logger.exception("Falha ao gerar relatório do job %s", job_id)
+            job.status = StatusReportJob.FALHOU.value
+            job.erro = str(exc)[:500] or exc.__class__.__name__
+        else:
+            job.status = StatusReportJob.CONCLUIDO.value
+            job.artifact_path = str(path)
+            job.size_bytes = len(pdf_bytes)
+            job.filename = filename_base or job.filename or "relatorio"
+            job.render_ms = int(render_ms) if render_ms is not None else 0
+        job.finished_at = datetime.now(timezone.utc)
+        await db.commit()
+
+
+async def purge_expired_jobs(session_factory) -> int:
+    """Remove jobs finalizados há mais de REPORT_JOB_TTL_HOURS e seus arquivos."""
+    limite = datetime.now(timezone.utc) - timedelta(hours=REPORT_JOB_TTL_HOURS)
+    async with session_factory() as db:
+        result = await db.execute(
+            select(ReportExportJob.id, ReportExportJob.artifact_path).where(
+                ReportExportJob.status.in_([StatusReportJob.CONCLUIDO.value, StatusReportJob.FALHOU.value]),
+                ReportExportJob.finished_at < limite,
+            )
+        )
+        expirados = result.all()
+        if not expirados:
+            return 0
+        for row in expirados:
+            if row.artifact_path:
+                Path(row.artifact_path).unlink(missing_ok=True)
+        await db.execute(
+            delete(ReportExportJob).where(ReportExportJob.id.in_([row.id for row in expirados]))
+        )
+        await db.commit()
+    return len(expirados)
+
+
+class ReportJobWorker(BackgroundService):
+    def __init__(self, concurrency: Optional[int] = None, session_factory=None):
+        super().__init__(session_factory)
+        self.concurrency = concurrency or max(1, REPORT_RENDER_WORKERS)
+        self._queue: Optional[asyncio.Queue] = None
+        self._running: set[str] = set()
+
+    def enqueue(self, job_id: str) -> None:
+        # Sem worker ativo o job continua persistido e é recuperado no próximo start().
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    async def _recover(self) -> None:
+        limite = datetime.now(timezone.utc) - timedelta(seconds=REPORT_JOB_STALE_SECONDS)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(ReportExportJob)
+                .where(
+                    ReportExportJob.status == StatusReportJob.PROCESSANDO.value,
+                    or_(ReportExportJob.started_at.is_(None), ReportExportJob.started_at < limite),
+                )
+                .values(status=StatusReportJob.PENDENTE.value)
+            )
+            await db.commit()
+            result = await db.execute(
+                select(ReportExportJob.id)
+                .where(ReportExportJob.status == StatusReportJob.PENDENTE.value)
+                .order_by(ReportExportJob.created_at)
+            )
+            pendentes = result.scalars().all()
+        for job_id in pendentes:
+            self.enqueue(job_id)
+        if pendentes:
+            logger.info("Exportação assíncrona: %d job(s) pendente(s) recolocado(s) na fila", len(pendentes))
+
+    async def _consume(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            self._running.add(job_id)
+            try:
+                await run_job(job_id, self.session_factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Erro inesperado no worker de relatórios (job %s)", job_id)
+            finally:
+                self._running.discard(job_id)
+                self._queue.task_done()
+
+    async def start(self) -> None:
+        if self.session_factory is None:
+            logger.info("Worker de relatórios desativado (engine assíncrona não inicializada)")
+            return
+        self._queue = asyncio.Queue()
+        try:
+            await purge_expired_jobs(self.session_factory)
+            await self._recover()
+        except Exception as exc:
+            logger.warning("Não foi possível recuperar jobs de relatório: %s", exc)
+        for _ in range(self.concurrency):
+            self._spawn(self._consume())
+
+    async def stop(self) -> None:
+        await self._cancel_tasks()
+        self._queue = None
+
+        # Jobs interrompidos pelo shutdown voltam para a fila do próximo start().
+        interrompidos, self._running = self._running, set()
+        if interrompidos:
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(ReportExportJob)
+                        .where(
+                            ReportExportJob.id.in_(interrompidos),
+                            ReportExportJob.status == StatusReportJob.PROCESSANDO.value,
+                        )
+                        .values(status=StatusReportJob.PENDENTE.value, started_at=None)
+                    )
+                    await db.commit()
+            except Exception as exc:
+                logger.warning("Não foi possível devolver jobs interrompidos à fila: %s", exc)
+
+
+report_job_worker = ReportJobWorker()
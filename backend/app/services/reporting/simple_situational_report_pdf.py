@@ -100,6 +100,12 @@ def _safe_filename(value: str, default: str = "relatorio_situacional") -> str:
     return name or default
 
 
+def report_filename_base(ubs) -> str:
+    """Nome do arquivo (sem extensão) do relatório situacional da UBS."""
+    filename_base = (ubs.nome_relatorio or ubs.nome_ubs or "relatorio_situacional").strip()
+    return _safe_filename(filename_base)
+
+
 def _chunk(items: list[str], size: int) -> list[list[str]]:
     return [items[i:i + size] for i in range(0, len(items), size)]
 
@@ -771,5 +777,4 @@ def generate_situational_report_pdf_simple(
     doc.build(story)
     pdf_bytes = buffer.getvalue()
 
-    filename_base = (ubs.nome_relatorio or ubs.nome_ubs or "relatorio_situacional").strip()
-    return pdf_bytes, _safe_filename(filename_base)
+    return pdf_bytes, report_filename_base(ubs)
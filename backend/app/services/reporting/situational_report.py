@@ -0,0 +1,167 @@
+"""Dados do relatório situacional de uma UBS.
+
+Reúne o diagnóstico agregado (o mesmo de ``GET /ubs/{id}/diagnosis``) e a
+matriz GUT num payload serializável, usado pela exportação em PDF, pelos
+jobs assíncronos e pela exportação em lote do gestor. A existência (e a
+permissão) da UBS é verificada pelas rotas antes de chamar estas funções.
+"""
+
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.models.diagnostico_models import UBS, Indicator, UBSIntervention, UBSProblem, UBSService
+from app.schemas.diagnostico_schemas import (
+    FullDiagnosisOut,
+    IndicatorOut,
+    ProfessionalGroupOut,
+    ServicesCatalogItem,
+    TerritoryProfileOut,
+    UBSNeedsOut,
+    UBSOut,
+    UBSServicesOut,
+    UBSStatus,
+    UBSSubmissionMetadata,
+)
+from app.services.reporting import pdf_cache
+from app.services.reporting.render_pool import build_situational_payload
+from app.services.reporting.simple_situational_report_pdf import report_filename_base
+
+
+async def load_full_diagnosis(db: AsyncSession, ubs_id: int) -> FullDiagnosisOut:
+    """Diagnóstico agregado de uma UBS existente."""
+    # Carrega relacionamentos de forma eficiente
+    resultado = await db.execute(
+        select(UBS)
+        .options(
+            selectinload(UBS.services).selectinload(UBSService.service),
+            selectinload(UBS.indicators),
+            selectinload(UBS.professional_groups),
+            selectinload(UBS.territory_profile),
+            selectinload(UBS.needs),
+        )
+        .where(UBS.id == ubs_id)
+    )
+    ubs_obj: UBS = resultado.scalar_one()
+
+    # Serviços
+    itens_servicos: List[ServicesCatalogItem] = [
+        ServicesCatalogItem(id=link.service.id, name=link.service.name)
+        for link in sorted(ubs_obj.services, key=lambda l: l.service.name)
+    ]
+    saida_servicos = UBSServicesOut(services=itens_servicos, outros_servicos=ubs_obj.outros_servicos)
+
+    # Indicadores (último valor por nome)
+
+    indicadores_ordenados = sorted(
+        ubs_obj.indicators,
+        key=lambda i: (i.nome_indicador, i.created_at or i.id),
+    )
+    ultimo_por_nome: dict[str, Indicator] = {}
+    for ind in indicadores_ordenados:
+        ultimo_por_nome[ind.nome_indicador] = ind
+
+    indicators_latest: List[IndicatorOut] = [
+        IndicatorOut(
+            id=ind.id,
+            ubs_id=ind.ubs_id,
+            nome_indicador=ind.nome_indicador,
+            valor=float(ind.valor),
+            meta=float(ind.meta) if ind.meta is not None else None,
+            tipo_valor=ind.tipo_valor,
+            periodo_referencia=ind.periodo_referencia,
+            observacoes=ind.observacoes,
+            created_at=ind.created_at,
+            updated_at=ind.updated_at,
+        )
+        for ind in ultimo_por_nome.values()
+    ]
+
+    # Grupos profissionais
+    saida_profissionais: List[ProfessionalGroupOut] = [
+        ProfessionalGroupOut.model_validate(pg) for pg in ubs_obj.professional_groups
+    ]
+
+    # Território e necessidades
+    saida_territorio = (
+        TerritoryProfileOut.model_validate(ubs_obj.territory_profile)
+        if ubs_obj.territory_profile
+        else None
+    )
+    saida_necessidades = UBSNeedsOut.model_validate(ubs_obj.needs) if ubs_obj.needs else None
+
+    metadados_envio = UBSSubmissionMetadata(
+        status=UBSStatus(ubs_obj.status),
+        submitted_at=ubs_obj.submitted_at,
+        submitted_by=ubs_obj.submitted_by,
+    )
+
+    saida_ubs = UBSOut.model_validate(ubs_obj)
+
+    return FullDiagnosisOut(
+        ubs=saida_ubs,
+        services=saida_servicos,
+        indicators_latest=indicators_latest,
+        professional_groups=saida_profissionais,
+        territory_profile=saida_territorio,
+        needs=saida_necessidades,
+        submission=metadados_envio,
+    )
+
+
+async def situational_problems_payload(db: AsyncSession, ubs_id: int) -> list[dict]:
+    """Matriz GUT (com intervenções e ações): única parte do relatório que não vem de "/diagnosis"."""
+    problems_stmt = (
+        select(UBSProblem)
+        .options(
+            selectinload(UBSProblem.interventions).selectinload(UBSIntervention.actions)
+        )
+        .where(UBSProblem.ubs_id == ubs_id)
+        .order_by(UBSProblem.gut_score.desc(), UBSProblem.titulo)
+    )
+    return [
+        {
+            "titulo": p.titulo,
+            "gut_gravidade": p.gut_gravidade,
+            "gut_urgencia": p.gut_urgencia,
+            "gut_tendencia": p.gut_tendencia,
+            "gut_score": p.gut_score,
+            "is_prioritario": p.is_prioritario,
+            "interventions": [
+                {
+                    "objetivo": iv.objetivo,
+                    "responsavel": iv.responsavel,
+                    "status": iv.status,
+                    "actions": [
+                        {
+                            "acao": a.acao,
+                            "prazo": a.prazo.isoformat() if a.prazo else None,
+                            "status": a.status,
+                        }
+                        for a in (iv.actions or [])
+                    ],
+                }
+                for iv in (p.interventions or [])
+            ],
+        }
+        for p in (await db.execute(problems_stmt)).scalars().all()
+    ]
+
+
+async def build_situational_report_payload(
+    db: AsyncSession,
+    ubs_id: int,
+) -> tuple[dict, str, str]:
+    """Monta o payload serializável do relatório situacional.
+
+    Retorna ``(payload, digest, filename_base)``; o digest é a chave do cache de PDFs.
+    """
+    diagnosis = await load_full_diagnosis(db, ubs_id)
+    problems_data = await situational_problems_payload(db, ubs_id)
+    payload = build_situational_payload(diagnosis, problems_data)
+    digest = pdf_cache.payload_digest(payload["diagnosis"], problems_data)
+    return payload, digest, report_filename_base(diagnosis.ubs)
@@ -1,14 +1,19 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
 
 from app.database import get_db
 from app.models.auth_models import Usuario, ProfissionalUbs
-from app.utils.jwt_handler import verify_token
+from app.utils import user_cache
+from app.utils.jwt_handler import verify_calendar_feed_token, verify_token
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
 async def get_current_user(
@@ -29,10 +34,21 @@ async def get_current_user(
     if id_usuario is None:
         raise excecao_credenciais
 
-    resultado = await db.execute(select(Usuario).where(Usuario.id == int(id_usuario)))
-    usuario = resultado.scalar_one_or_none()
-    if not usuario:
-        raise excecao_credenciais
+    id_usuario = int(id_usuario)
+    impressao = user_cache.token_fingerprint(token)
+    colunas = user_cache.get_user_columns(id_usuario, impressao)
+    if colunas is not None:
+        # Reanexa o retrato em cache à sessão sem SELECT, para que as rotas
+        # possam alterar current_user e commitar normalmente.
+        usuario = Usuario(**colunas)
+        make_transient_to_detached(usuario)
+        usuario = await db.merge(usuario, load=False)
+    else:
+        resultado = await db.execute(select(Usuario).where(Usuario.id == id_usuario))
+        usuario = resultado.scalar_one_or_none()
+        if not usuario:
+            raise excecao_credenciais
+        user_cache.remember_user(usuario, impressao, carga_util.get("exp"))
     
     if not usuario.ativo:
         raise excecao_credenciais
@@ -48,6 +64,7 @@ async def get_current_active_user(current_user: Usuario = Depends(get_current_us
 
 async def get_current_professional_user(
     current_user: Usuario = Depends(get_current_active_user),
+    token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db),
 ) -> Usuario:
     role = (current_user.role or "USER").upper()
@@ -55,13 +72,18 @@ async def get_current_professional_user(
         return current_user
 
     # Compatibilidade: se existir registro ativo em profissionais, também permite
-    resultado = await db.execute(
-        select(ProfissionalUbs).where(
-            ProfissionalUbs.usuario_id == current_user.id,
-            ProfissionalUbs.ativo.is_(True),
+    impressao = user_cache.token_fingerprint(token)
+    is_profissional = user_cache.get_professional_flag(current_user.id, impressao)
+    if is_profissional is None:
+        resultado = await db.execute(
+            select(ProfissionalUbs.id).where(
+                ProfissionalUbs.usuario_id == current_user.id,
+                ProfissionalUbs.ativo.is_(True),
+            ).limit(1)
         )
-    )
-    if resultado.scalar_one_or_none() is None:
+        is_profissional = resultado.first() is not None
+        user_cache.remember_professional_flag(current_user.id, impressao, is_profissional)
+    if not is_profissional:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito a profissionais")
     return current_user
 
@@ -82,3 +104,23 @@ async def get_current_admin_user(
     if role != "ADMIN":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito ao administrador")
     return current_user
+
+
+async def get_calendar_feed_user(
+    token: Optional[str] = Query(None),
+    bearer: Optional[str] = Depends(oauth2_scheme_optional),
+    db: AsyncSession = Depends(get_db),
+) -> Usuario:
+    """Usuário de um feed ICS: token de sessão (Authorization) ou token de feed na URL."""
+    if bearer:
+        return await get_current_active_user(await get_current_user(bearer, db))
+
+    excecao_credenciais = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Não autenticado")
+    id_usuario = verify_calendar_feed_token(token) if token else None
+    if id_usuario is None:
+        raise excecao_credenciais
+    resultado = await db.execute(select(Usuario).where(Usuario.id == id_usuario))
+    usuario = resultado.scalar_one_or_none()
+    if not usuario or not usuario.ativo:
+        raise excecao_credenciais
+    return usuario
@@ -34,6 +34,7 @@ import os
 import smtplib
 import socket
 from email.message import EmailMessage
+from html import escape as html_escape
 from email.utils import parseaddr
 
 import httpx
@@ -110,6 +111,11 @@ async def _send_via_brevo(to: str, subject: str, html: str) -> bool:
         return False
 
 
+def email_configured() -> bool:
+    """True se algum transporte real de e-mail estiver configurado."""
+    return bool(BREVO_API_KEY or (SMTP_HOST and SMTP_USER and SMTP_PASSWORD) or EMAIL_API_KEY)
+
+
 async def _send_email(to: str, subject: str, html: str) -> bool:
     """Envia um e-mail pelo transporte configurado. True se enviado, False caso contrário."""
     # 1. Brevo (API HTTP) — preferido em produção (não usa portas SMTP)
@@ -261,3 +267,83 @@ async def send_password_reset_email(to: str, reset_link: str) -> bool:
 </body>
 </html>"""
     return await _send_email(to, subject, html)
+
+
+async def send_appointment_confirmation_email(to: str, nome: str, consultas: list[dict]) -> bool:
+    """Envia a confirmação de uma ou mais consultas do mesmo paciente.
+
+    ``consultas``: dicts com ``data_hora`` (texto já formatado no fuso local),
+    ``profissional`` e ``cargo``.
+    """
+    subject = (
+        "Confirmação de consulta — MeuTerritório"
+        if len(consultas) == 1
+        else f"Confirmação de {len(consultas)} consultas — MeuTerritório"
+    )
+    linhas = "".join(
+        f"""
+              <tr>
+                <td style="padding:10px 0; border-bottom:1px solid #e2e8f0; font-size:15px; color:#0f172a;">
+                  <strong>{html_escape(c["data_hora"])}</strong><br>
+                  <span style="color:#475569;">{html_escape(c.get("profissional") or "")}
+                  {(" · " + html_escape(c["cargo"])) if c.get("cargo") else ""}</span>
+                </td>
+              </tr>"""
+        for c in consultas
+    )
+    html = f"""\
+<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <meta name="color-scheme" content="light only">
+  <title>Confirmação de consulta</title>
+</head>
+<body style="margin:0; padding:0; background-color:#f1f5f9;">
+  <table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0"
+         style="background-color:#f1f5f9; padding:32px 12px;">
+    <tr>
+      <td align="center">
+        <table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0"
+               style="max-width:520px; width:100%; background-color:#ffffff; border-radius:16px;
+                      overflow:hidden; box-shadow:0 4px 24px rgba(15,23,42,0.08);
+                      font-family:'Segoe UI', Roboto, Arial, sans-serif;">
+          <tr>
+            <td style="background:linear-gradient(135deg,#0891b2 0%,#0e7490 100%);
+                       padding:32px 40px; text-align:center;">
+              <div style="color:#ffffff; font-size:22px; font-weight:700; letter-spacing:0.3px;">
+                MeuTerritório
+              </div>
+              <div style="color:#cffafe; font-size:13px; margin-top:4px;">
+                Confirmação de consulta
+              </div>
+            </td>
+          </tr>
+          <tr>
+            <td style="padding:40px 40px 32px 40px; color:#1f2937;">
+              <h1 style="margin:0 0 16px 0; font-size:20px; color:#0f172a;">Olá, {html_escape(nome or "")}</h1>
+              <p style="margin:0 0 20px 0; font-size:15px; line-height:1.6; color:#475569;">
+                Lembramos que você tem consulta agendada na UBS:
+              </p>
+              <table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0">{linhas}
+              </table>
+              <p style="margin:24px 0 0 0; font-size:13px; line-height:1.6; color:#94a3b8;">
+                Se não puder comparecer, cancele pelo aplicativo para liberar o horário.
+              </p>
+            </td>
+          </tr>
+          <tr>
+            <td style="background-color:#f8fafc; padding:20px 40px; text-align:center;">
+              <p style="margin:0; font-size:12px; color:#cbd5e1;">
+                © MeuTerritório · Este é um e-mail automático, não responda.
+              </p>
+            </td>
+          </tr>
+        </table>
+      </td>
+    </tr>
+  </table>
+</body>
+</html>"""
+    return await _send_email(to, subject, html)
@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from starlette.responses import FileResponse
+
+
+def quote_etag(value: str) -> str:
+    """Formata um valor como ETag forte (entre aspas)."""
+    return f'"{value}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Verifica se o cabeçalho If-None-Match casa com o ETag informado.
+
+    Aceita lista separada por vírgulas, "*" e validadores fracos (W/"...").
+    """
+    if not if_none_match:
+        return False
+    alvo = etag.strip()
+    if alvo.startswith("W/"):
+        alvo = alvo[2:]
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*":
+            return True
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == alvo:
+            return True
+    return False
+
+
+def http_date(dt: datetime) -> str:
+    """Formata um datetime como data HTTP (RFC 7231), ex.: para Last-Modified."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    etag: str,
+    last_modified: Optional[datetime],
+) -> bool:
+    """Avalia um GET condicional. If-None-Match, quando presente, tem precedência."""
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        desde = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if desde.tzinfo is None:
+        desde = desde.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Datas HTTP têm resolução de segundos
+    return last_modified.replace(microsecond=0) <= desde
+
+
+class ValidatedFileResponse(FileResponse):
+    """FileResponse (com Range/206) cujo If-Range aceita o ETag/Last-Modified informados.
+
+    O FileResponse do Starlette só reconhece no If-Range o próprio ETag
+    (derivado de mtime e tamanho); com um ETag nosso, um If-Range válido
+    cairia sempre na resposta completa.
+    """
+
+    def _should_use_range(self, http_if_range: str, stat_result: os.stat_result) -> bool:
+        validador = http_if_range.strip()
+        if validador.startswith("W/"):
+            # If-Range exige comparação forte
+            return False
+        return validador in (self.headers.get("etag"), self.headers.get("last-modified")) or super()._should_use_range(
+            validador, stat_result
+        )
@@ -1,7 +1,11 @@
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
+from urllib.parse import quote
+import hashlib
+import hmac
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,11 +25,14 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt_codificado
 
 def verify_token(token: str):
+    """Valida um token de sessão. Tokens de uso específico (com ``purpose``) são recusados."""
     try:
         carga_util = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return carga_util
     except JWTError:
         return None
+    if "purpose" in carga_util:
+        return None
+    return carga_util
 
 
 # ─── Token de recuperação de senha ───────────────────────────────────
@@ -55,3 +62,58 @@ def verify_password_reset_token(token: str) -> Optional[int]:
         return int(sub)
     except (TypeError, ValueError):
         return None
+
+
+# ─── Token de assinatura de calendário (ICS) ─────────────────────────
+# Clientes de calendário não enviam cabeçalho Authorization: o feed recebe
+# este token na URL. Só serve para os feeds (purpose="calendar_feed").
+CALENDAR_FEED_TOKEN_DAYS = int(os.getenv("CALENDAR_FEED_TOKEN_DAYS", "180"))
+
+
+def create_calendar_feed_token(user_id: int) -> str:
+    expiracao = datetime.utcnow() + timedelta(days=CALENDAR_FEED_TOKEN_DAYS)
+    dados = {"sub": str(user_id), "purpose": "calendar_feed", "exp": expiracao}
+    return jwt.encode(dados, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def verify_calendar_feed_token(token: str) -> Optional[int]:
+    """Valida o token do feed e retorna o user_id, ou None se inválido/expirado."""
+    try:
+        carga_util = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if carga_util.get("purpose") != "calendar_feed":
+        return None
+    try:
+        return int(carga_util.get("sub"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ─── URL assinada de download de material ────────────────────────────
+# Emitida depois da checagem de permissão e validada só com CPU, sem ir ao
+# banco. A assinatura é um HMAC (segredo do JWT) sobre "fid:sha256:exp" mais
+# nome e content-type, que seguem em claro na query string; o caminho do
+# arquivo não sai do servidor (é derivado do hash).
+MATERIAL_DOWNLOAD_URL_SECONDS = int(os.getenv("MATERIAL_DOWNLOAD_URL_SECONDS", "300"))
+
+
+def _material_download_mac(file_id: int, sha256: str, expira_em: int, nome: str, content_type: str) -> str:
+    # quote() tira os ":" de nome e content-type: a mensagem não tem ambiguidade
+    mensagem = f"{file_id}:{sha256}:{expira_em}:{quote(content_type, safe='')}:{quote(nome, safe='')}"
+    return hmac.new(SECRET_KEY.encode(), mensagem.encode(), hashlib.sha256).hexdigest()
+
+
+def sign_material_download(file_id: int, sha256: str, nome: str, content_type: str) -> tuple[str, int]:
+    """Devolve (assinatura, expiração em epoch) para baixar ``file_id``."""
+    expira_em = int(time.time()) + MATERIAL_DOWNLOAD_URL_SECONDS
+    return _material_download_mac(file_id, sha256, expira_em, nome, content_type), expira_em
+
+
+def verify_material_download(
+    assinatura: str, file_id: int, sha256: str, expira_em: int, nome: str, content_type: str
+) -> bool:
+    if expira_em < time.time():
+        return False
+    esperada = _material_download_mac(file_id, sha256, expira_em, nome, content_type)
+    return hmac.compare_digest(esperada, assinatura)
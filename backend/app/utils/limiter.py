@@ -1,4 +1,93 @@
-from slowapi import Limiter
+import asyncio
+import functools
+import logging
+import os
+import threading
+from collections import Counter
+
+from fastapi import Request
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from starlette.concurrency import run_in_threadpool
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
+# Registra o esquema sqlite:// no limits (contadores compartilhados entre workers)
+from app.utils import rate_limit_storage  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# memory:// conta por processo; com mais de um worker use sqlite:// (arquivo
+# local compartilhado) ou um backend suportado pelo limits (redis://...).
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "").strip() or "memory://"
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "").strip() or "sliding-window-counter"
+
+
+
+class ThreadpoolLimiter(Limiter):
+    """Limiter que consulta o backend no threadpool.
+
+    A API de storage do ``limits`` é síncrona e o slowapi a chama dentro da
+    rota async, no event loop. Com backends que fazem I/O (sqlite://, que
+    espera o lock do arquivo em ``BEGIN IMMEDIATE``; redis://...), a espera
+    travaria todas as requisições; aqui ela roda no threadpool. Com memory://
+    não há I/O e a checagem continua inline.
+    """
+
+    def limit(self, *args, **kwargs):
+        decorator = super().limit(*args, **kwargs)
+        if RATE_LIMIT_STORAGE_URI.startswith("memory://"):
+            return decorator
+
+        def _wrap(func):
+            wrapped = decorator(func)
+            if not asyncio.iscoroutinefunction(func):
+                return wrapped
+
+            @functools.wraps(wrapped)
+            async def _check_in_threadpool(*f_args, **f_kwargs):
+                request = f_kwargs.get("request")
+                if (
+                    self.enabled
+                    and self._auto_check
+                    and isinstance(request, Request)
+                    and not getattr(request.state, "_rate_limiting_complete", False)
+                ):
+                    await run_in_threadpool(self._check_request_limit, request, func, False)
+                    # O wrapper do slowapi vê a marca e não checa de novo no event loop
+                    request.state._rate_limiting_complete = True
+                return await wrapped(*f_args, **f_kwargs)
+
+            return _check_in_threadpool
+
+        return _wrap
+
+
+limiter = ThreadpoolLimiter(
+    key_func=get_remote_address,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+)
+
+_rejeicoes_lock = threading.Lock()
+_rejeicoes: Counter = Counter()
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    """Conta e registra a rejeição antes de delegar a resposta 429 ao slowapi."""
+    rota = request.scope.get("route")
+    chave = f"{getattr(rota, 'path', request.url.path)} {exc.detail}"
+    with _rejeicoes_lock:
+        _rejeicoes[chave] += 1
+    logger.warning("Rate limit excedido: %s (cliente %s)", chave, get_remote_address(request))
+    return _rate_limit_exceeded_handler(request, exc)
+
+
+def rate_limit_metrics() -> dict:
+    with _rejeicoes_lock:
+        por_limite = dict(_rejeicoes)
+    return {
+        "storage": RATE_LIMIT_STORAGE_URI.split("://", 1)[0],
+        "strategy": RATE_LIMIT_STRATEGY,
+        "rejected": sum(por_limite.values()),
+        "rejected_by_limit": por_limite,
+    }
@@ -0,0 +1,54 @@
+"""Paginação por cursor (keyset) em listas ordenadas por (data, id).
+
+O cursor é opaco para o cliente: ``data|id`` da última linha da página em
+base64 url-safe. A próxima página parte da posição do cursor com um filtro
+``(data, id) > (c_data, c_id)`` (ou ``<`` em ordem decrescente), que usa o
+índice em vez de pular linhas com OFFSET.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+from app.services.agenda_disponibilidade import as_utc
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(instante: datetime, item_id: int) -> str:
+    bruto = f"{as_utc(instante).isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(bruto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        instante, item_id = bruto.rsplit("|", 1)
+        return as_utc(datetime.fromisoformat(instante)), int(item_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido.")
+
+
+def keyset_filter(coluna_data, coluna_id, cursor: Optional[str], descendente: bool = False):
+    """Condição das linhas depois do cursor na ordem (coluna_data, coluna_id)."""
+    if not cursor:
+        return None
+    instante, item_id = decode_cursor(cursor)
+    if descendente:
+        return or_(coluna_data < instante, and_(coluna_data == instante, coluna_id < item_id))
+    return or_(coluna_data > instante, and_(coluna_data == instante, coluna_id > item_id))
+
+
+def page_with_cursor(linhas: list, limite: int, chave) -> Tuple[list, Optional[str]]:
+    """Recebe até ``limite + 1`` linhas; devolve a página e o cursor da próxima (ou None)."""
+    if len(linhas) <= limite:
+        return linhas, None
+    pagina = linhas[:limite]
+    instante, item_id = chave(pagina[-1])
+    return pagina, encode_cursor(instante, item_id)
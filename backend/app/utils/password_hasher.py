@@ -0,0 +1,67 @@
+"""Hash de senhas fora do event loop.
+
+O pbkdf2_sha256 é propositalmente lento (dezenas de ms por senha); rodá-lo
+direto numa rota async trava todas as outras requisições do worker durante
+o cálculo. Aqui o hash/verificação roda num ThreadPoolExecutor dedicado e
+limitado — o ``hashlib.pbkdf2_hmac`` usado pelo passlib libera o GIL, então
+as threads calculam em paralelo de verdade.
+
+O custo (rounds) é configurável; hashes gravados com menos rounds que
+PASSWORD_HASH_MIN_ROUNDS são refeitos no próximo login bem-sucedido
+(``verify_and_update``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+PASSWORD_HASH_MIN_ROUNDS = int(os.getenv("PASSWORD_HASH_MIN_ROUNDS", str(PASSWORD_HASH_ROUNDS)))
+PASSWORD_HASH_WORKERS = max(1, int(os.getenv("PASSWORD_HASH_WORKERS", "4")))
+
+# Usa pbkdf2_sha256 para evitar dependência direta do backend bcrypt
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    deprecated="auto",
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=min(PASSWORD_HASH_MIN_ROUNDS, PASSWORD_HASH_ROUNDS),
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwd-hash")
+    return _executor
+
+
+async def _run(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), fn, *args)
+
+
+async def hash_password(raw: str) -> str:
+    return await _run(pwd_context.hash, raw)
+
+
+async def verify_password(raw: str, hashed: str) -> bool:
+    return await _run(pwd_context.verify, raw, hashed)
+
+
+async def verify_and_update(raw: str, hashed: str) -> tuple[bool, Optional[str]]:
+    """Verifica a senha e, se o hash estiver desatualizado, devolve o novo hash."""
+    return await _run(pwd_context.verify_and_update, raw, hashed)
+
+
+def shutdown_password_hasher() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,220 @@
+"""Backend de contadores do rate limit compartilhado entre processos.
+
+O ``MemoryStorage`` padrão do slowapi/limits conta por processo: com N
+workers do gunicorn, um limite de 10/minuto vira, na prática, 10·N/minuto.
+Este backend guarda os contadores num arquivo SQLite local (modo WAL), que
+todos os workers do mesmo host enxergam. Cada operação roda numa transação
+``BEGIN IMMEDIATE`` curta, então a janela deslizante é verificada e
+incrementada de forma atômica, sem a corrida do backend em memória.
+
+Registrado no ``limits`` pelo esquema ``sqlite``:
+``sqlite:///caminho/absoluto/ratelimit.db`` (ou ``sqlite://`` para o
+caminho padrão em ``app/cache``).
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from math import floor
+from pathlib import Path
+from typing import Optional
+
+from limits.storage import MovingWindowSupport, SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+DEFAULT_RATE_LIMIT_DB = Path(__file__).resolve().parents[1] / "cache" / "ratelimit.sqlite3"
+
+# Remove contadores expirados a cada N escritas (evita crescer indefinidamente)
+_PURGE_EVERY = 500
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS rate_limit_counters ("
+    " key TEXT PRIMARY KEY,"
+    " value INTEGER NOT NULL,"
+    " expires_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS rate_limit_events ("
+    " key TEXT NOT NULL,"
+    " at REAL NOT NULL,"
+    " expires_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_rate_limit_events_key_at ON rate_limit_events (key, at)",
+)
+
+
+class SQLiteStorage(Storage, MovingWindowSupport, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options) -> None:
+        path = ""
+        if uri:
+            path = uri.split("://", 1)[1] if "://" in uri else uri
+            path = path.split("?", 1)[0]
+        self.path = Path(path) if path else DEFAULT_RATE_LIMIT_DB
+        self.timeout = float(options.get("timeout", 5))
+        self._local = threading.local()
+        self._writes = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._connection()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for ddl in _SCHEMA:
+                conn.execute(ddl)
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, time.time())
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            self._purge_expired()
+        return result
+
+    def _purge_expired(self) -> None:
+        conn = self._connection()
+        agora = time.time()
+        conn.execute("DELETE FROM rate_limit_counters WHERE expires_at <= ?", (agora,))
+        conn.execute("DELETE FROM rate_limit_events WHERE expires_at <= ?", (agora,))
+
+    # ─── Contadores (fixed window / sliding window counter) ──────────
+
+    @staticmethod
+    def _incr(conn: sqlite3.Connection, now: float, key: str, expiry: float, amount: int) -> int:
+        conn.execute(
+            "DELETE FROM rate_limit_counters WHERE key = ? AND expires_at <= ?", (key, now)
+        )
+        conn.execute(
+            "INSERT INTO rate_limit_counters (key, value, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+            (key, amount, now + expiry),
+        )
+        row = conn.execute("SELECT value FROM rate_limit_counters WHERE key = ?", (key,)).fetchone()
+        return int(row[0])
+
+    @staticmethod
+    def _get(conn: sqlite3.Connection, now: float, key: str) -> int:
+        row = conn.execute(
+            "SELECT value FROM rate_limit_counters WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        return self._write(lambda conn, now: self._incr(conn, now, key, expiry, amount))
+
+    def get(self, key: str) -> int:
+        return self._get(self._connection(), time.time(), key)
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limit_counters WHERE key = ?", (key,)
+        ).fetchone()
+        return float(row[0]) if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self) -> Optional[int]:
+        def _reset(conn, now):
+            total = conn.execute("SELECT COUNT(*) FROM rate_limit_counters").fetchone()[0]
+            total += conn.execute("SELECT COUNT(DISTINCT key) FROM rate_limit_events").fetchone()[0]
+            conn.execute("DELETE FROM rate_limit_counters")
+            conn.execute("DELETE FROM rate_limit_events")
+            return int(total)
+
+        return self._write(_reset)
+
+    def clear(self, key: str) -> None:
+        def _clear(conn, now):
+            conn.execute("DELETE FROM rate_limit_counters WHERE key = ?", (key,))
+            conn.execute("DELETE FROM rate_limit_events WHERE key = ?", (key,))
+
+        self._write(_clear)
+
+    # ─── Sliding window counter ──────────────────────────────────────
+
+    def _sliding_window_info(self, conn, now: float, key: str, expiry: int) -> tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(conn, now, previous_key)
+        current_count = self._get(conn, now, current_key)
+        if previous_count == 0:
+            previous_ttl = 0.0
+        else:
+            previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+
+        def _acquire(conn, now):
+            previous_count, previous_ttl, current_count, _ = self._sliding_window_info(conn, now, key, expiry)
+            weighted = previous_count * previous_ttl / expiry + current_count
+            if floor(weighted) + amount > limit:
+                return False
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            # Como em limits: o contador da janela atual vive duas janelas
+            self._incr(conn, now, current_key, 2 * expiry, amount)
+            return True
+
+        return self._write(_acquire)
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        return self._sliding_window_info(self._connection(), time.time(), key, expiry)
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
+
+    # ─── Moving window (registro por evento) ─────────────────────────
+
+    def acquire_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+
+        def _acquire(conn, now):
+            usados = conn.execute(
+                "SELECT COUNT(*) FROM rate_limit_events WHERE key = ? AND at > ?", (key, now - expiry)
+            ).fetchone()[0]
+            if usados + amount > limit:
+                return False
+            conn.executemany(
+                "INSERT INTO rate_limit_events (key, at, expires_at) VALUES (?, ?, ?)",
+                [(key, now, now + expiry)] * amount,
+            )
+            return True
+
+        return self._write(_acquire)
+
+    def get_moving_window(self, key: str, limit: int, expiry: int) -> tuple[float, int]:
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT MIN(at), COUNT(*) FROM rate_limit_events WHERE key = ? AND at > ?",
+            (key, now - expiry),
+        ).fetchone()
+        if not row or not row[1]:
+            return now, 0
+        return float(row[0]), int(row[1])
+
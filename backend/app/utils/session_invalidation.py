@@ -0,0 +1,75 @@
+"""Invalidação de caches guiada por eventos de sessão do SQLAlchemy.
+
+Os caches em memória/disco (PDFs de relatório, usuários autenticados,
+ocorrências do cronograma, diretório de profissionais...) precisam saber
+quando uma linha que os compõe muda. ``register`` liga a coleta e a
+aplicação aos eventos de ``Session``:
+
+* ``before_flush``: ``collect(session)`` devolve as chaves afetadas pelos
+  objetos novos/alterados/removidos, acumuladas em ``session.info``;
+* ``do_orm_execute``: UPDATE/DELETE em massa num dos ``bulk_models`` não
+  passa pelo flush, então marca ``ALL`` (invalida tudo por segurança);
+* ``after_commit``: ``apply(chaves)`` — nada é descartado por uma transação
+  que acabou não sendo gravada;
+* ``after_rollback``: as chaves pendentes são esquecidas.
+
+Com ``in_transaction=True`` a aplicação acontece em ``after_flush_postexec``,
+dentro da mesma transação, e recebe também a sessão: ``apply(session,
+chaves)`` — para dados derivados que precisam ser gravados junto.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+ALL = "*"
+
+
+def register(
+    collect: Callable[[Session], Iterable],
+    apply: Callable,
+    bulk_models: Iterable[type] = (),
+    in_transaction: bool = False,
+) -> None:
+    pending_key = object()
+    bulk_models = tuple(bulk_models)
+
+    def _pending(session: Session) -> set:
+        return session.info.setdefault(pending_key, set())
+
+    @event.listens_for(Session, "before_flush")
+    def _collect(session: Session, flush_context, instances) -> None:
+        if ALL in session.info.get(pending_key, ()):
+            return
+        chaves = set(collect(session))
+        if chaves:
+            _pending(session).update(chaves)
+
+    if bulk_models:
+        @event.listens_for(Session, "do_orm_execute")
+        def _collect_bulk(orm_execute_state) -> None:
+            if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+                return
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None and mapper.class_ in bulk_models:
+                _pending(orm_execute_state.session).add(ALL)
+
+    if in_transaction:
+        @event.listens_for(Session, "after_flush_postexec")
+        def _apply_in_transaction(session: Session, flush_context) -> None:
+            chaves = session.info.pop(pending_key, None)
+            if chaves:
+                apply(session, chaves)
+    else:
+        @event.listens_for(Session, "after_commit")
+        def _apply(session: Session) -> None:
+            chaves = session.info.pop(pending_key, None)
+            if chaves:
+                apply(chaves)
+
+    @event.listens_for(Session, "after_rollback")
+    def _discard(session: Session) -> None:
+        session.info.pop(pending_key, None)
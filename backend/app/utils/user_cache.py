@@ -0,0 +1,129 @@
+"""Cache em memória do usuário autenticado.
+
+Cada requisição autenticada buscava o usuário por id (e, para alguns roles,
+o vínculo em ``profissionais``). Aqui guardamos um retrato das colunas de
+``Usuario`` por ``(usuario_id, impressão digital do token)`` durante
+AUTH_USER_CACHE_TTL segundos, com no máximo AUTH_USER_CACHE_MAX_ENTRIES
+entradas (LRU). AUTH_USER_CACHE_TTL=0 desativa o cache.
+
+A entrada é descartada explicitamente sempre que um commit altera a linha
+do usuário (role, cargo, ativo, senha, UBS ativa...) ou seus registros em
+``profissionais`` — via eventos de sessão, como no cache de relatórios. O
+cache é por processo: outros workers só enxergam a mudança quando o TTL
+expira, por isso ele é curto.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from app.models.auth_models import Usuario, ProfissionalUbs
+from app.utils import session_invalidation
+
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "2048"))
+
+_ALL = session_invalidation.ALL
+
+_COLUMNS = tuple(attr.key for attr in inspect(Usuario).column_attrs)
+
+_lock = threading.Lock()
+# (usuario_id, fingerprint) -> {"expira": monotonic, "colunas": dict, "profissional": Optional[bool]}
+_entries: "OrderedDict[tuple[int, str], dict]" = OrderedDict()
+
+
+def token_fingerprint(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+
+def _get_entry(user_id: int, fingerprint: str) -> Optional[dict]:
+    chave = (user_id, fingerprint)
+    entry = _entries.get(chave)
+    if entry is None:
+        return None
+    if entry["expira"] <= time.monotonic():
+        _entries.pop(chave, None)
+        return None
+    _entries.move_to_end(chave)
+    return entry
+
+
+def get_user_columns(user_id: int, fingerprint: str) -> Optional[dict]:
+    with _lock:
+        entry = _get_entry(user_id, fingerprint)
+        return dict(entry["colunas"]) if entry else None
+
+
+def remember_user(usuario: Usuario, fingerprint: str, token_exp: Optional[float] = None) -> None:
+    if AUTH_USER_CACHE_TTL <= 0:
+        return
+    ttl = AUTH_USER_CACHE_TTL
+    if token_exp is not None:
+        # Nunca sobrevive ao próprio token
+        ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+    colunas = {nome: getattr(usuario, nome) for nome in _COLUMNS}
+    with _lock:
+        _entries[(usuario.id, fingerprint)] = {
+            "expira": time.monotonic() + ttl,
+            "colunas": colunas,
+            "profissional": None,
+        }
+        _entries.move_to_end((usuario.id, fingerprint))
+        while len(_entries) > AUTH_USER_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def get_professional_flag(user_id: int, fingerprint: str) -> Optional[bool]:
+    with _lock:
+        entry = _get_entry(user_id, fingerprint)
+        return entry["profissional"] if entry else None
+
+
+def remember_professional_flag(user_id: int, fingerprint: str, is_profissional: bool) -> None:
+    with _lock:
+        entry = _entries.get((user_id, fingerprint))
+        if entry is not None:
+            entry["profissional"] = is_profissional
+
+
+def invalidate_user(user_ids) -> None:
+    """Descarta as entradas dos usuários informados (``"*"`` limpa tudo)."""
+    with _lock:
+        if _ALL in user_ids:
+            _entries.clear()
+            return
+        for chave in [chave for chave in _entries if chave[0] in user_ids]:
+            del _entries[chave]
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+# ─── Invalidação automática ──────────────────────────────────────────
+
+def _collect_changed_users(session: Session) -> set:
+    user_ids = set()
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, Usuario) and obj.id is not None:
+            user_ids.add(obj.id)
+        elif isinstance(obj, ProfissionalUbs) and obj.usuario_id is not None:
+            user_ids.add(obj.usuario_id)
+    for obj in session.new:
+        if isinstance(obj, ProfissionalUbs) and obj.usuario_id is not None:
+            user_ids.add(obj.usuario_id)
+    return user_ids
+
+
+session_invalidation.register(_collect_changed_users, invalidate_user, bulk_models=(Usuario, ProfissionalUbs))
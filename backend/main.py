@@ -9,13 +9,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
 from app.database import get_db, engine, Base
-from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 import logging
 import os
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse
-from app.utils.limiter import limiter
+from app.utils.limiter import limiter, rate_limit_exceeded_handler, rate_limit_metrics
+from app.utils.password_hasher import shutdown_password_hasher
+from app.services.reporting.render_pool import render_metrics, shutdown_render_pool
+from app.services.reporting.report_jobs import report_job_worker
+from app.services.login_audit import login_audit_writer
+from app.services.login_retention import login_retention_task
+from app.services.agenda_ocupacao import ocupacao_refresh_task
+from app.services.confirmacao_dispatcher import confirmacao_dispatcher
+from app.services.material_uploads import material_upload_cleanup_task
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -52,11 +59,25 @@ async def lifespan(app: FastAPI):
     logger.info("DATABASE_URL driver: %s", os.getenv("DATABASE_URL", "NOT SET")[:30] + "...")
     logger.info("Python %s | Platform %s", sys.version, sys.platform)
     keep_alive_task = asyncio.create_task(_keep_alive_loop())
+    await report_job_worker.start()
+    await login_audit_writer.start()
+    await login_retention_task.start()
+    await ocupacao_refresh_task.start()
+    await confirmacao_dispatcher.start()
+    await material_upload_cleanup_task.start()
     logger.info("Startup completo — pronto para receber requisições")
     yield
 
     #Shutdown
     keep_alive_task.cancel()
+    await report_job_worker.stop()
+    await login_retention_task.stop()
+    await ocupacao_refresh_task.stop()
+    await confirmacao_dispatcher.stop()
+    await material_upload_cleanup_task.stop()
+    await login_audit_writer.stop()
+    shutdown_render_pool()
+    shutdown_password_hasher()
     try:
         logger.info("Encerrando engine do banco de dados...")
         await engine.dispose()
@@ -66,7 +87,7 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan) #Inicializa a aplicação do FastAPI
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -115,6 +136,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "DELETE", "PUT", "PATCH", "OPTIONS"],
     allow_headers=["*"],
+    # Cursor das listas paginadas de agendamentos e validador das respostas em cache
+    expose_headers=["X-Next-Cursor", "ETag"],
     max_age=600,
 )
 
@@ -129,6 +152,7 @@ _routers_to_load = [
     ("app.api.routes.suporte_feedback_routes", ["suporte_feedback_router"]),
     ("app.api.routes.gestao_equipes_routes", ["gestao_equipes_router"]),
     ("app.api.routes.gestor_ubs_routes", ["gestor_ubs_router"]),
+    ("app.api.routes.relatorios_routes", ["relatorios_router"]),
 ]
 
 for module_path, router_names in _routers_to_load:
@@ -164,9 +188,9 @@ async def health_check(request: Request, db: AsyncSession = Depends(get_db)):
     try:
         from sqlalchemy import text
         await db.execute(text("SELECT 1")) #Ping no banco
-        return {"status": "ok", "database": "connected"}
+        return {"status": "ok", "database": "connected", "report_render": render_metrics(), "rate_limit": rate_limit_metrics()}
     except Exception as e:
-        return {"status": "error", "database": str(e)}
+        return {"status": "error", "database": str(e), "report_render": render_metrics(), "rate_limit": rate_limit_metrics()}
 
 # Rota catch-all para servir o index.html do React para qualquer outra rota.
 # IMPORTANTE: rotas /api/ nunca devem retornar HTML — retorna 404 JSON.
@@ -0,0 +1,138 @@
+"""Benchmark de latência do login sob carga concorrente.
+
+Sobe a aplicação em processo (banco SQLite temporário, rate limit desligado),
+dispara logins concorrentes e, ao mesmo tempo, requisições leves (/ping) para
+medir quanto o hash de senha trava o event loop.
+
+Compara o hash rodando direto no event loop (comportamento antigo) com o
+executor dedicado de app.utils.password_hasher.
+
+Uso: python scripts/bench_login.py [--logins 200] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from app.database import Base, get_db
+from app.models.auth_models import Usuario
+from app.utils import password_hasher
+from app.utils.limiter import limiter
+
+EMAIL = "bench@example.com"
+SENHA = "Bench12345"
+
+
+async def _inline(fn, *args):
+    return fn(*args)
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+async def _medir(client, logins: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    login_ms: list[float] = []
+    ping_ms: list[float] = []
+    terminou = asyncio.Event()
+
+    async def _login():
+        async with sem:
+            inicio = time.perf_counter()
+            resp = await client.post("/api/auth/login", json={"email": EMAIL, "senha": SENHA})
+            login_ms.append((time.perf_counter() - inicio) * 1000)
+            assert resp.status_code == 200, resp.text
+
+    async def _pinger():
+        # Mede o ciclo inteiro (espera de 5 ms + /ping) descontando a espera
+        # nominal: inclui o atraso do event loop em acordar a tarefa.
+        while not terminou.is_set():
+            inicio = time.perf_counter()
+            await asyncio.sleep(0.005)
+            await client.get("/ping")
+            ping_ms.append((time.perf_counter() - inicio - 0.005) * 1000)
+
+    pinger = asyncio.create_task(_pinger())
+    inicio = time.perf_counter()
+    try:
+        await asyncio.gather(*(_login() for _ in range(logins)))
+    finally:
+        total = time.perf_counter() - inicio
+        terminou.set()
+        await pinger
+
+    return {
+        "logins/s": logins / total,
+        "login p50": statistics.median(login_ms),
+        "login p99": _percentil(login_ms, 99),
+        "ping p50": statistics.median(ping_ms),
+        "ping p99": _percentil(ping_ms, 99),
+    }
+
+
+async def main(logins: int, concurrency: int, db_path: str) -> None:
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}", future=True, connect_args={"timeout": 60}
+    )
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        await conn.run_sync(Base.metadata.create_all)
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with async_session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    limiter.enabled = False
+
+    async with async_session() as session:
+        session.add(Usuario(
+            nome="Bench", email=EMAIL, senha=password_hasher.pwd_context.hash(SENHA),
+            cpf="52998224725", role="USER", ativo=True,
+        ))
+        await session.commit()
+
+    print(f"{logins} logins, concorrência {concurrency}, "
+          f"{password_hasher.PASSWORD_HASH_ROUNDS} rounds, {password_hasher.PASSWORD_HASH_WORKERS} threads de hash")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        original = password_hasher._run
+        password_hasher._run = _inline
+        try:
+            antes = await _medir(client, logins, concurrency)
+        finally:
+            password_hasher._run = original
+        depois = await _medir(client, logins, concurrency)
+
+    print(f"{'':12}{'no event loop':>16}{'executor':>12}")
+    for chave in antes:
+        unidade = "" if chave == "logins/s" else " ms"
+        print(f"{chave:12}{antes[chave]:13.1f}{unidade:3}{depois[chave]:9.1f}{unidade}")
+
+    password_hasher.shutdown_password_hasher()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(main(args.logins, args.concurrency, os.path.join(tmp, "bench.db")))
@@ -22,6 +22,7 @@ import app.models.gestao_equipes_models  # noqa: F401
 import app.models.cronograma_models  # noqa: F401
 import app.models.materiais_models  # noqa: F401
 import app.models.suporte_feedback_models  # noqa: F401
+import app.models.relatorios_models  # noqa: F401
 from app.models.diagnostico_models import Service
 
 
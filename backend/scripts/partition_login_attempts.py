@@ -0,0 +1,101 @@
+"""Converte ``login_attempts`` em tabela particionada por mês (somente Postgres).
+
+Opcional. Com a tabela particionada, a retenção (app/services/login_retention.py)
+descarta meses inteiros com DROP TABLE em vez de DELETE em lotes, e passa a
+criar sozinha as partições dos próximos meses.
+
+O que o script faz, numa única transação:
+  1. renomeia a tabela atual para login_attempts_legacy;
+  2. cria login_attempts PARTITION BY RANGE (created_at), com PK (id, created_at)
+     e reaproveitando a sequence de id;
+  3. cria as partições do mês mais antigo dentro da retenção até N meses à frente;
+  4. copia as linhas dentro da retenção e remove a tabela antiga.
+
+Uso (com a aplicação parada):  python scripts/partition_login_attempts.py
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# FIX obrigatório para Windows + psycopg3 async
+if sys.platform.startswith("win"):
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+from sqlalchemy import text
+
+from app.database import AsyncSessionLocal
+from app.services.login_retention import (
+    LOGIN_ATTEMPTS_PARTITIONS_AHEAD,
+    LOGIN_ATTEMPTS_RETENTION_DAYS,
+    add_months,
+    is_partitioned,
+    ensure_monthly_partitions,
+)
+
+
+async def main() -> None:
+    if AsyncSessionLocal is None:
+        print("ERROR: Engine não inicializada. Verifique DATABASE_URL.", flush=True)
+        sys.exit(1)
+
+    async with AsyncSessionLocal() as db:
+        if db.get_bind().dialect.name != "postgresql":
+            print("Particionamento só é suportado no Postgres; nada a fazer.", flush=True)
+            return
+        if await is_partitioned(db):
+            print("login_attempts já é particionada.", flush=True)
+            return
+
+        agora = datetime.now(timezone.utc)
+        limite = agora - timedelta(days=LOGIN_ATTEMPTS_RETENTION_DAYS)
+
+        await db.execute(text("ALTER TABLE login_attempts RENAME TO login_attempts_legacy"))
+        for indice in (
+            "ix_login_attempts_created_at",
+            "ix_login_attempts_email_created_at",
+            "ix_login_attempts_ip_address_created_at",
+        ):
+            await db.execute(text(f"DROP INDEX IF EXISTS {indice}"))
+        await db.execute(text(
+            "CREATE TABLE login_attempts ("
+            " LIKE login_attempts_legacy INCLUDING DEFAULTS"
+            ") PARTITION BY RANGE (created_at)"
+        ))
+        await db.execute(text("UPDATE login_attempts_legacy SET created_at = now() WHERE created_at IS NULL"))
+        await db.execute(text("ALTER TABLE login_attempts ALTER COLUMN created_at SET NOT NULL"))
+        await db.execute(text("ALTER TABLE login_attempts ADD PRIMARY KEY (id, created_at)"))
+        await db.execute(text("CREATE INDEX ix_login_attempts_created_at ON login_attempts (created_at)"))
+        await db.execute(text(
+            "CREATE INDEX ix_login_attempts_email_created_at ON login_attempts (email, created_at)"
+        ))
+        await db.execute(text(
+            "CREATE INDEX ix_login_attempts_ip_address_created_at ON login_attempts (ip_address, created_at)"
+        ))
+
+        hoje = agora.date()
+        criadas = await ensure_monthly_partitions(
+            db, limite.date(), add_months(hoje, LOGIN_ATTEMPTS_PARTITIONS_AHEAD)
+        )
+        copiadas = await db.execute(
+            text("INSERT INTO login_attempts SELECT * FROM login_attempts_legacy WHERE created_at >= :limite"),
+            {"limite": limite},
+        )
+        # A sequence do id passa a pertencer à nova tabela antes de a antiga ser removida
+        await db.execute(text(
+            "ALTER SEQUENCE IF EXISTS login_attempts_id_seq OWNED BY login_attempts.id"
+        ))
+        await db.execute(text("DROP TABLE login_attempts_legacy"))
+        await db.commit()
+
+    print(
+        f"✔ login_attempts particionada: {len(criadas)} partições, {copiadas.rowcount} linhas copiadas.",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""Reconstrói ``ocupacao_agenda_diaria`` para um período.
+
+A aplicação mantém a tabela sozinha (incrementalmente e recalculando a
+janela recente periodicamente); este script serve para o preenchimento
+inicial do histórico ou para corrigir um período após cargas em massa.
+
+Uso:  python scripts/rebuild_ocupacao_agenda.py 2025-01-01 [2026-12-31]
+      (fim padrão: hoje + 15 dias)
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+# FIX obrigatório para Windows + psycopg3 async
+if sys.platform.startswith("win"):
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+from app.database import AsyncSessionLocal
+from app.services.agenda_disponibilidade import AGENDA_TIMEZONE
+from app.services.agenda_ocupacao import rebuild_occupancy
+
+
+async def main(inicio: date, fim: date) -> None:
+    if AsyncSessionLocal is None:
+        print("ERROR: Engine não inicializada. Verifique DATABASE_URL.", flush=True)
+        sys.exit(1)
+
+    total = 0
+    # Um mês por transação para não segurar locks por muito tempo
+    atual = inicio
+    while atual <= fim:
+        bloco_fim = min(atual + timedelta(days=30), fim)
+        async with AsyncSessionLocal() as db:
+            total += await db.run_sync(rebuild_occupancy, atual, bloco_fim)
+            await db.commit()
+        print(f"  {atual} a {bloco_fim}", flush=True)
+        atual = bloco_fim + timedelta(days=1)
+
+    print(f"✔ {total} linha(s) de ocupação recalculada(s).", flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    inicio = date.fromisoformat(sys.argv[1])
+    hoje = datetime.now(AGENDA_TIMEZONE).date()
+    fim = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else hoje + timedelta(days=15)
+    asyncio.run(main(inicio, fim))
@@ -4,3 +4,20 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+from app.services import cronograma_recorrencia, diretorio_profissionais
+from app.utils import user_cache
+
+
+@pytest.fixture(autouse=True)
+def _clear_in_memory_caches():
+    # Cada teste usa um banco novo em memória: ids de usuário e de UBS se repetem entre testes.
+    user_cache.clear()
+    cronograma_recorrencia.clear()
+    diretorio_profissionais.clear()
+    yield
+    user_cache.clear()
+    cronograma_recorrencia.clear()
+    diretorio_profissionais.clear()
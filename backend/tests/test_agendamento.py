@@ -2,6 +2,7 @@ import pytest
 from datetime import datetime, timedelta, timezone
 
 from httpx import AsyncClient
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
@@ -226,6 +227,44 @@ async def test_create_agendamento_conflict_same_slot(test_client):
     assert response.status_code == 409
 
 
+@pytest.mark.asyncio
+async def test_create_agendamento_race_rejected_by_unique_index(test_client, monkeypatch):
+    from app.api.routes import agendamento_routes
+
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_race@example.com", cargo="Medico")
+        user = await _create_user(session, "user_race@example.com")
+        slot = datetime.now(timezone.utc) + timedelta(days=2)
+        session.add(Agendamento(
+            paciente_id=user.id,
+            profissional_id=prof.id,
+            data_hora=slot,
+            status=StatusAgendamento.AGENDADO,
+        ))
+        await session.commit()
+        headers = _auth_headers(user)
+
+    # Simula outra requisição que passou pela checagem antes do commit concorrente
+    async def _sempre_livre(*args, **kwargs):
+        return True
+
+    monkeypatch.setattr(agendamento_routes, "check_availability", _sempre_livre)
+    payload = {"profissional_id": prof.id, "data_hora": slot.isoformat()}
+    response = await client.post("/api/agendamentos", json=payload, headers=headers)
+    assert response.status_code == 409
+
+    # Horário cancelado não ocupa o índice único
+    async with async_session() as session:
+        session.add(Agendamento(
+            paciente_id=user.id,
+            profissional_id=prof.id,
+            data_hora=slot,
+            status=StatusAgendamento.CANCELADO,
+        ))
+        await session.commit()
+
+
 @pytest.mark.asyncio
 async def test_create_agendamento_conflict_blocked(test_client):
     client, async_session = test_client
@@ -973,6 +1012,39 @@ async def test_list_especialidades_distinct(test_client):
     assert data.count("Medico") == 1
 
 
+@pytest.mark.asyncio
+async def test_directory_cached_with_etag_and_invalidated_on_change(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        await _create_profissional(session, "prof_dir1@example.com", cargo="Medico")
+        user = await _create_user(session, "user_dir@example.com")
+        headers = _auth_headers(user)
+
+    response = await client.get("/api/agendamentos/especialidades", headers=headers)
+    assert response.json() == ["Medico"]
+    etag = response.headers["ETag"]
+
+    response = await client.get(
+        "/api/agendamentos/profissionais", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    async with async_session() as session:
+        await _create_profissional(session, "prof_dir2@example.com", cargo="Enfermeiro")
+
+    response = await client.get(
+        "/api/agendamentos/especialidades", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json() == ["Enfermeiro", "Medico"]
+    assert response.headers["ETag"] != etag
+
+    response = await client.get(
+        "/api/agendamentos/profissionais", headers=headers, params={"cargo": "Enfermeiro"}
+    )
+    assert [p["cargo"] for p in response.json()] == ["Enfermeiro"]
+
+
 @pytest.mark.asyncio
 async def test_meus_agendamentos_order_desc(test_client):
     client, async_session = test_client
@@ -1036,6 +1108,143 @@ async def test_meus_agendamentos_empty(test_client):
     assert response.json() == []
 
 
+@pytest.mark.asyncio
+async def test_meus_agendamentos_keyset_pagination(test_client):
+    from app.api.routes.agendamento_routes import AGENDA_PAGE_MAX_SIZE
+
+    client, async_session = test_client
+    base = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_hist_page@example.com", cargo="Medico")
+        owner = await _create_user(session, "owner_hist_page@example.com")
+        session.add_all([
+            Agendamento(
+                paciente_id=owner.id,
+                profissional_id=prof.id,
+                data_hora=base + timedelta(hours=i),
+                status=StatusAgendamento.AGENDADO,
+            )
+            for i in range(5)
+        ])
+        await session.commit()
+        headers = _auth_headers(owner)
+
+    vistos = []
+    cursor = None
+    paginas = 0
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = await client.get("/api/agendamentos/meus", headers=headers, params=params)
+        assert response.status_code == 200
+        vistos.extend(item["id"] for item in response.json())
+        paginas += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert paginas == 3
+    assert len(vistos) == len(set(vistos)) == 5
+
+    # Sem limit/cursor: primeira página de AGENDA_PAGE_SIZE, sem cabeçalho quando cabe tudo
+    response = await client.get("/api/agendamentos/meus", headers=headers)
+    assert [item["id"] for item in response.json()] == vistos
+    assert "X-Next-Cursor" not in response.headers
+
+    response = await client.get(
+        "/api/agendamentos/meus", headers=headers, params={"limit": AGENDA_PAGE_MAX_SIZE + 1}
+    )
+    assert response.status_code == 422
+
+    response = await client.get(
+        "/api/agendamentos/meus",
+        headers=headers,
+        params={"start_date": (base + timedelta(hours=3)).isoformat()},
+    )
+    assert len(response.json()) == 2
+
+    response = await client.get("/api/agendamentos/meus", headers=headers, params={"cursor": "%%%"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_meus_agendamentos_paginates_by_default(test_client):
+    from app.api.routes.agendamento_routes import AGENDA_PAGE_SIZE
+
+    client, async_session = test_client
+    base = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=400)
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_hist_default@example.com", cargo="Medico")
+        owner = await _create_user(session, "owner_hist_default@example.com")
+        session.add_all([
+            Agendamento(
+                paciente_id=owner.id,
+                profissional_id=prof.id,
+                data_hora=base + timedelta(days=i),
+                status=StatusAgendamento.REALIZADO,
+            )
+            for i in range(AGENDA_PAGE_SIZE + 1)
+        ])
+        await session.commit()
+        headers = _auth_headers(owner)
+
+    response = await client.get("/api/agendamentos/meus", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == AGENDA_PAGE_SIZE
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = await client.get("/api/agendamentos/meus", headers=headers, params={"cursor": cursor})
+    assert len(response.json()) == 1
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_agenda_profissional_paginated_and_range_limited(test_client):
+    client, async_session = test_client
+    base = datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_agenda_page@example.com", cargo="Medico")
+        paciente = await _create_user(session, "pac_agenda_page@example.com")
+        session.add_all([
+            Agendamento(
+                paciente_id=paciente.id,
+                profissional_id=prof.id,
+                data_hora=base + timedelta(minutes=20 * i),
+                status=StatusAgendamento.AGENDADO,
+            )
+            for i in range(3)
+        ])
+        await session.commit()
+        gestor = await _create_user(session, "gestor_agenda_page@example.com", role="GESTOR")
+        headers = _auth_headers(gestor)
+
+    params = {
+        "start_date": base.isoformat(),
+        "end_date": (base + timedelta(days=1)).isoformat(),
+        "limit": 2,
+    }
+    response = await client.get(f"/api/agenda/profissional/{prof.id}", headers=headers, params=params)
+    assert response.status_code == 200
+    primeira = response.json()
+    assert len(primeira) == 2
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = await client.get(
+        f"/api/agenda/profissional/{prof.id}", headers=headers, params={**params, "cursor": cursor}
+    )
+    segunda = response.json()
+    assert len(segunda) == 1
+    assert "X-Next-Cursor" not in response.headers
+    assert primeira[1]["data_hora"] < segunda[0]["data_hora"]
+
+    response = await client.get(
+        f"/api/agenda/profissional/{prof.id}",
+        headers=headers,
+        params={"start_date": base.isoformat(), "end_date": (base + timedelta(days=400)).isoformat()},
+    )
+    assert response.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_profissionais_requires_auth(test_client):
     client, _ = test_client
@@ -1101,3 +1310,609 @@ async def test_confirmacao_registers_timestamp(test_client):
     response = await client.post(f"/api/agendamentos/{agendamento.id}/confirmar", headers=headers)
     assert response.status_code == 200
     assert response.json()["confirmacao_enviada"] is not None
+
+
+@pytest.mark.asyncio
+async def test_agenda_enrichment_runs_fixed_number_of_queries(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_bulk_names@example.com", cargo="Medico")
+        base = datetime.now(timezone.utc) + timedelta(days=1)
+        for i in range(6):
+            paciente = await _create_user(session, f"paciente_bulk_{i}@example.com")
+            session.add(Agendamento(
+                paciente_id=paciente.id,
+                profissional_id=prof.id,
+                data_hora=base + timedelta(hours=i),
+                status=StatusAgendamento.AGENDADO,
+            ))
+        await session.commit()
+        gestor = await _create_user(session, "gestor_bulk_names@example.com", role="GESTOR")
+        headers = _auth_headers(gestor)
+
+    from sqlalchemy import event
+
+    sync_engine = async_session.kw["bind"].sync_engine
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(sync_engine, "before_cursor_execute", _count)
+    try:
+        response = await client.get(
+            f"/api/agenda/profissional/{prof.id}",
+            params={
+                "start_date": datetime.now(timezone.utc).isoformat(),
+                "end_date": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
+            },
+            headers=headers,
+        )
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", _count)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 6
+    assert all(item["nome_paciente"] == "Usuario Teste" for item in data)
+    assert all(item["nome_profissional"] and item["cargo_profissional"] == "Medico" for item in data)
+    # usuário autenticado + agendamentos + profissionais + pacientes
+    assert len(statements) == 4
+
+
+@pytest.mark.asyncio
+async def test_authenticated_user_lookup_is_cached_and_invalidated_on_role_change(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        admin = await _create_user(session, "admin_cache@example.com", role="ADMIN")
+        user = await _create_user(session, "user_cache@example.com", role="PROFISSIONAL")
+        admin_headers = _auth_headers(admin)
+        headers = _auth_headers(user)
+
+    from sqlalchemy import event
+
+    sync_engine = async_session.kw["bind"].sync_engine
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if "FROM usuarios" in statement:
+            statements.append(statement)
+
+    event.listen(sync_engine, "before_cursor_execute", _count)
+    try:
+        response = await client.get("/api/auth/me", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["role"] == "PROFISSIONAL"
+        primeiro = len(statements)
+        response = await client.get("/api/auth/me", headers=headers)
+        assert response.status_code == 200
+        assert len(statements) == primeiro
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", _count)
+
+    response = await client.post(
+        f"/api/auth/admin/users/{user.id}/set-role",
+        json={"role": "USER"},
+        headers=admin_headers,
+    )
+    assert response.status_code == 200
+
+    response = await client.get("/api/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["role"] == "USER"
+    response = await client.get("/api/gestor/ubs", headers=headers)
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_disponibilidade_returns_free_slots_for_specialty_in_fixed_queries(test_client):
+    from app.services.agenda_disponibilidade import AGENDA_TIMEZONE, slot_grid
+
+    client, async_session = test_client
+    amanha = datetime.now(timezone.utc).astimezone(AGENDA_TIMEZONE).date() + timedelta(days=1)
+    grade_amanha = slot_grid(amanha, amanha)
+    async with async_session() as session:
+        profs = [
+            await _create_profissional(session, f"prof_disp_{i}@example.com", cargo="Pediatra")
+            for i in range(3)
+        ]
+        await _create_profissional(session, "prof_disp_outro@example.com", cargo="Dentista")
+        paciente = await _create_user(session, "paciente_disp@example.com")
+        session.add(Agendamento(
+            paciente_id=paciente.id,
+            profissional_id=profs[0].id,
+            data_hora=grade_amanha[3],
+            status=StatusAgendamento.AGENDADO,
+        ))
+        session.add(Agendamento(
+            paciente_id=paciente.id,
+            profissional_id=profs[0].id,
+            data_hora=grade_amanha[4],
+            status=StatusAgendamento.CANCELADO,
+        ))
+        session.add(BloqueioAgenda(
+            profissional_id=profs[1].id,
+            data_inicio=grade_amanha[0],
+            data_fim=grade_amanha[-1],
+            motivo="Férias",
+        ))
+        await session.commit()
+        headers = _auth_headers(paciente)
+
+    from sqlalchemy import event
+
+    sync_engine = async_session.kw["bind"].sync_engine
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(sync_engine, "before_cursor_execute", _count)
+    try:
+        response = await client.get(
+            "/api/agendamentos/disponibilidade",
+            params={
+                "cargo": "Pediatra",
+                "start_date": amanha.isoformat(),
+                "end_date": (amanha + timedelta(days=12)).isoformat(),
+            },
+            headers=headers,
+        )
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", _count)
+
+    assert response.status_code == 200
+    # usuário autenticado + profissionais + agendamentos + bloqueios
+    assert len(statements) == 4
+    data = {item["profissional_id"]: item for item in response.json()}
+    assert set(data) == {p.id for p in profs}
+
+    def _slots_amanha(prof_id):
+        return [
+            datetime.fromisoformat(s) for s in data[prof_id]["slots"]
+            if datetime.fromisoformat(s).astimezone(AGENDA_TIMEZONE).date() == amanha
+        ]
+
+    assert len(_slots_amanha(profs[2].id)) == len(grade_amanha)
+    livres_0 = _slots_amanha(profs[0].id)
+    assert grade_amanha[3] not in livres_0
+    assert grade_amanha[4] in livres_0
+    assert len(livres_0) == len(grade_amanha) - 1
+    assert _slots_amanha(profs[1].id) == []
+    assert len(data[profs[1].id]["slots"]) == len(data[profs[2].id]["slots"]) - len(grade_amanha)
+
+
+@pytest.mark.asyncio
+async def test_disponibilidade_stops_at_two_weeks_from_now(test_client):
+    from app.services.agenda_disponibilidade import AGENDA_TIMEZONE, slot_grid
+
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_disp_fim@example.com")
+        user = await _create_user(session, "user_disp_fim@example.com")
+        headers = _auth_headers(user)
+
+    antes = datetime.now(timezone.utc)
+    ultimo_dia = antes.astimezone(AGENDA_TIMEZONE).date() + timedelta(days=14)
+    response = await client.get(
+        "/api/agendamentos/disponibilidade",
+        params={
+            "profissional_id": prof.id,
+            "start_date": (ultimo_dia - timedelta(days=1)).isoformat(),
+            "end_date": ultimo_dia.isoformat(),
+        },
+        headers=headers,
+    )
+    depois = datetime.now(timezone.utc)
+    assert response.status_code == 200
+    slots = [datetime.fromisoformat(s) for s in response.json()[0]["slots"]]
+    assert slots and max(slots) <= depois + timedelta(days=14)
+    # O último dia só aparece até o horário de agora
+    esperados = [slot for slot in slot_grid(ultimo_dia, ultimo_dia) if slot <= antes + timedelta(days=14)]
+    assert set(esperados) <= set(slots)
+
+    payload = {"profissional_id": prof.id, "data_hora": slots[-1].isoformat()}
+    response = await client.post("/api/agendamentos", json=payload, headers=headers)
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_disponibilidade_rejects_range_beyond_two_weeks(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_disp_limite@example.com")
+        user = await _create_user(session, "user_disp_limite@example.com")
+        headers = _auth_headers(user)
+
+    hoje = datetime.now(timezone.utc).date()
+    response = await client.get(
+        "/api/agendamentos/disponibilidade",
+        params={
+            "profissional_id": prof.id,
+            "start_date": hoje.isoformat(),
+            "end_date": (hoje + timedelta(days=20)).isoformat(),
+        },
+        headers=headers,
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_agendamentos_lote_reports_per_item(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_lote@example.com")
+        gestor = await _create_user(session, "gestor_lote@example.com", role="GESTOR")
+        paciente = await _create_user(session, "paciente_lote@example.com")
+        base = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=3)
+        session.add(BloqueioAgenda(
+            profissional_id=prof.id, data_inicio=base + timedelta(hours=2), data_fim=base + timedelta(hours=3)
+        ))
+        await session.commit()
+        headers = _auth_headers(gestor)
+
+    itens = [
+        {"profissional_id": prof.id, "data_hora": base.isoformat(), "paciente_id": paciente.id},
+        {"profissional_id": prof.id, "data_hora": base.isoformat(), "paciente_id": paciente.id},
+        {"profissional_id": prof.id, "data_hora": (base + timedelta(hours=2, minutes=20)).isoformat()},
+        {"profissional_id": 9999, "data_hora": (base + timedelta(hours=1)).isoformat()},
+        {"profissional_id": prof.id, "data_hora": (base + timedelta(days=20)).isoformat()},
+        {"profissional_id": prof.id, "data_hora": (base + timedelta(minutes=20)).isoformat()},
+    ]
+    response = await client.post("/api/agendamentos/lote", json={"itens": itens}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["criados"] == 2
+    assert [item["sucesso"] for item in data["itens"]] == [True, False, False, False, False, True]
+    assert data["itens"][1]["erro"] == "Horário indisponível."
+    assert data["itens"][2]["erro"] == "Horário indisponível."
+    assert data["itens"][3]["erro"] == "Profissional não encontrado."
+
+    async with async_session() as session:
+        criado = await session.get(Agendamento, data["itens"][0]["id"])
+        assert criado.paciente_id == paciente.id
+        assert (await session.get(Agendamento, data["itens"][5]["id"])).paciente_id == gestor.id
+
+    # Lote atômico com item inválido não grava nada
+    response = await client.post(
+        "/api/agendamentos/lote",
+        json={"itens": [
+            {"profissional_id": prof.id, "data_hora": (base + timedelta(minutes=40)).isoformat()},
+            {"profissional_id": prof.id, "data_hora": base.isoformat()},
+        ], "atomico": True},
+        headers=headers,
+    )
+    data = response.json()
+    assert data["criados"] == 0
+    assert data["itens"][0]["sucesso"] is False
+
+
+@pytest.mark.asyncio
+async def test_agendamentos_lote_user_cannot_book_for_other_patient(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_lote_user@example.com")
+        user = await _create_user(session, "user_lote@example.com")
+        outro = await _create_user(session, "outro_lote@example.com")
+        headers = _auth_headers(user)
+
+    slot = datetime.now(timezone.utc) + timedelta(days=2)
+    response = await client.post(
+        "/api/agendamentos/lote",
+        json={"itens": [{"profissional_id": prof.id, "data_hora": slot.isoformat(), "paciente_id": outro.id}]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["itens"][0]["erro"] == "Sem permissão para agendar para outro paciente."
+
+
+@pytest.mark.asyncio
+async def test_bloqueios_lote_single_transaction(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        gestor_prof = await _create_profissional(session, "gestor_bloq_lote@example.com")
+        outros = [await _create_profissional(session, f"prof_bloq_lote{i}@example.com") for i in range(3)]
+        gestor = await session.get(Usuario, gestor_prof.usuario_id)
+        gestor.role = "GESTOR"
+        await session.commit()
+        headers = _auth_headers(gestor)
+
+    inicio = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=30)
+    fim = inicio + timedelta(days=10)
+    itens = [
+        {"profissional_id": p.id, "data_inicio": inicio.isoformat(), "data_fim": fim.isoformat(), "motivo": "Férias"}
+        for p in outros
+    ]
+    itens.append({"data_inicio": inicio.isoformat(), "data_fim": fim.isoformat()})
+    itens.append({"profissional_id": outros[0].id, "data_inicio": inicio.isoformat(), "data_fim": fim.isoformat()})
+    itens.append({"profissional_id": outros[1].id, "data_inicio": fim.isoformat(), "data_fim": inicio.isoformat()})
+
+    response = await client.post("/api/agenda/bloqueios/lote", json={"itens": itens}, headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["criados"] == 4
+    assert data["itens"][4]["erro"] == "Bloqueio já existe."
+    assert data["itens"][5]["sucesso"] is False
+
+    async with async_session() as session:
+        result = await session.execute(select(BloqueioAgenda.profissional_id))
+        assert sorted(result.scalars().all()) == sorted([p.id for p in outros] + [gestor_prof.id])
+
+    response = await client.post("/api/agenda/bloqueios/lote", json={"itens": itens[:1]}, headers=headers)
+    assert response.json()["itens"][0]["erro"] == "Bloqueio já existe."
+
+
+@pytest.mark.asyncio
+async def test_bloqueios_lote_profissional_limited_to_own_agenda(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_bloq_proprio@example.com")
+        outro = await _create_profissional(session, "prof_bloq_outro@example.com")
+        user = await session.get(Usuario, prof.usuario_id)
+        headers = _auth_headers(user)
+
+    inicio = datetime.now(timezone.utc) + timedelta(days=5)
+    itens = [
+        {"data_inicio": inicio.isoformat(), "data_fim": (inicio + timedelta(hours=4)).isoformat()},
+        {"profissional_id": outro.id, "data_inicio": inicio.isoformat(), "data_fim": (inicio + timedelta(hours=4)).isoformat()},
+    ]
+    response = await client.post("/api/agenda/bloqueios/lote", json={"itens": itens}, headers=headers)
+    data = response.json()
+    assert [item["sucesso"] for item in data["itens"]] == [True, False]
+    assert data["itens"][1]["erro"] == "Sem permissão para bloquear a agenda de outro profissional."
+
+
+@pytest.mark.asyncio
+async def test_agenda_ics_feed_for_own_professional(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_ics@example.com")
+        outro = await _create_profissional(session, "prof_ics_outro@example.com")
+        paciente = await _create_user(session, "paciente_ics@example.com")
+        slot = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+        session.add_all([
+            Agendamento(paciente_id=paciente.id, profissional_id=prof.id, data_hora=slot,
+                        status=StatusAgendamento.AGENDADO),
+            Agendamento(paciente_id=paciente.id, profissional_id=prof.id, data_hora=slot + timedelta(hours=1),
+                        status=StatusAgendamento.CANCELADO),
+        ])
+        await session.commit()
+        headers = _auth_headers(await session.get(Usuario, prof.usuario_id))
+
+    response = await client.get(f"/api/agenda/profissional/{outro.id}/feed.ics", headers=headers)
+    assert response.status_code == 403
+
+    response = await client.get(f"/api/agenda/profissional/{prof.id}/feed.ics", headers=headers)
+    assert response.status_code == 200
+    corpo = response.text
+    assert corpo.count("BEGIN:VEVENT") == 2
+    assert f"DTSTART:{slot.strftime('%Y%m%dT%H%M%SZ')}" in corpo
+    assert "STATUS:CANCELLED" in corpo
+    assert "SUMMARY:Consulta - Usuario Teste" in corpo
+
+    etag = response.headers["etag"]
+    response = await client.get(
+        f"/api/agenda/profissional/{prof.id}/feed.ics", headers={**headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_ocupacao_agenda_updated_incrementally(test_client):
+    from app.models.agendamento_models import OcupacaoAgendaDiaria
+    from app.services.agenda_disponibilidade import AGENDA_SLOT_MINUTES, AGENDA_TIMEZONE
+    from app.services.agenda_ocupacao import rebuild_occupancy
+
+    client, async_session = test_client
+    amanha = datetime.now(AGENDA_TIMEZONE).date() + timedelta(days=1)
+    dez_horas = datetime.combine(amanha, datetime.min.time(), tzinfo=AGENDA_TIMEZONE) + timedelta(hours=10)
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_ocupacao@example.com")
+        gestor = await _create_user(session, "gestor_ocupacao@example.com", role="GESTOR")
+        paciente = await _create_user(session, "paciente_ocupacao@example.com")
+        headers = _auth_headers(paciente)
+        gestor_headers = _auth_headers(gestor)
+
+    for i in range(3):
+        response = await client.post(
+            "/api/agendamentos",
+            json={"profissional_id": prof.id, "data_hora": (dez_horas + timedelta(minutes=20 * i)).isoformat()},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        ultimo_id = response.json()["id"]
+    response = await client.patch(f"/api/agendamentos/{ultimo_id}", json={"status": "CANCELADO"}, headers=headers)
+    assert response.status_code == 200
+
+    # Bloqueio de 2h à tarde e remarcação de uma consulta para o dia seguinte
+    async with async_session() as session:
+        session.add(BloqueioAgenda(
+            profissional_id=prof.id,
+            data_inicio=dez_horas + timedelta(hours=4),
+            data_fim=dez_horas + timedelta(hours=6),
+        ))
+        await session.commit()
+    response = await client.patch(
+        f"/api/agendamentos/{ultimo_id - 1}",
+        json={"data_hora": (dez_horas + timedelta(days=1)).isoformat()},
+        headers=headers,
+    )
+    assert response.status_code == 200
+
+    params = {"start_date": amanha.isoformat(), "end_date": (amanha + timedelta(days=1)).isoformat()}
+    response = await client.get("/api/agenda/ocupacao", params=params, headers=gestor_headers)
+    assert response.status_code == 200
+    linhas = {item["dia"]: item for item in response.json()}
+    dia = linhas[amanha.isoformat()]
+    assert dia["minutos_agendados"] == AGENDA_SLOT_MINUTES
+    assert dia["minutos_cancelados"] == AGENDA_SLOT_MINUTES
+    assert dia["minutos_bloqueados"] == 120
+    capacidade = dia["minutos_capacidade"]
+    assert dia["taxa_ocupacao"] == round(AGENDA_SLOT_MINUTES / (capacidade - 120), 4)
+    assert linhas[(amanha + timedelta(days=1)).isoformat()]["minutos_reagendados"] == AGENDA_SLOT_MINUTES
+
+    response = await client.get("/api/agenda/ocupacao", params=params, headers=headers)
+    assert response.status_code == 403
+
+    # A reconstrução completa chega ao mesmo resultado
+    async with async_session() as session:
+        await session.execute(OcupacaoAgendaDiaria.__table__.delete())
+        await session.run_sync(rebuild_occupancy, amanha, amanha + timedelta(days=1))
+        await session.commit()
+        reconstruida = await session.get(OcupacaoAgendaDiaria, (prof.id, amanha))
+        assert reconstruida.minutos_agendados == dia["minutos_agendados"]
+        assert reconstruida.minutos_bloqueados == 120
+
+
+@pytest.mark.asyncio
+async def test_confirmacao_dispatcher_groups_retries_and_never_resends(test_client, monkeypatch):
+    from app.services import confirmacao_dispatcher as dispatcher_mod
+
+    monkeypatch.setattr(dispatcher_mod, "CONFIRMACAO_RETRY_BASE_SECONDS", 0)
+    client, async_session = test_client
+    agora = datetime.now(timezone.utc)
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_confirma@example.com")
+        ana = await _create_user(session, "ana_confirma@example.com")
+        bia = await _create_user(session, "bia_confirma@example.com")
+        session.add_all([
+            Agendamento(paciente_id=ana.id, profissional_id=prof.id, data_hora=agora + timedelta(hours=20),
+                        status=StatusAgendamento.AGENDADO),
+            Agendamento(paciente_id=ana.id, profissional_id=prof.id, data_hora=agora + timedelta(hours=21),
+                        status=StatusAgendamento.REAGENDADO),
+            Agendamento(paciente_id=bia.id, profissional_id=prof.id, data_hora=agora + timedelta(hours=22),
+                        status=StatusAgendamento.AGENDADO),
+            # Fora da antecedência, cancelada ou já confirmada: não entram
+            Agendamento(paciente_id=bia.id, profissional_id=prof.id, data_hora=agora + timedelta(days=7),
+                        status=StatusAgendamento.AGENDADO),
+            Agendamento(paciente_id=bia.id, profissional_id=prof.id, data_hora=agora + timedelta(hours=5),
+                        status=StatusAgendamento.CANCELADO),
+            Agendamento(paciente_id=bia.id, profissional_id=prof.id, data_hora=agora + timedelta(hours=6),
+                        status=StatusAgendamento.AGENDADO, confirmacao_enviada=agora),
+        ])
+        await session.commit()
+
+    envios = []
+    falhou_bia = []
+
+    async def fake_sender(email, nome, consultas):
+        # O primeiro envio para a Bia falha; o retry imediato passa
+        if email == "bia_confirma@example.com" and not falhou_bia:
+            falhou_bia.append(email)
+            return False
+        envios.append((email, len(consultas)))
+        return True
+
+    dispatcher = dispatcher_mod.ConfirmacaoDispatcher(session_factory=async_session, sender=fake_sender)
+
+    # Um segundo worker que reivindicou antes leva as linhas: o primeiro não as vê
+    async with async_session() as session:
+        outro_lote = await dispatcher_mod.claim_batch(session, "outro-worker")
+    assert len(outro_lote) == 3
+    assert await dispatcher.dispatch_once() == 0
+    assert envios == []
+
+    # Lease do outro worker expirado (ex.: processo morreu): as linhas voltam a ser elegíveis
+    async with async_session() as session:
+        for agendamento_id in outro_lote:
+            agendamento = await session.get(Agendamento, agendamento_id)
+            agendamento.confirmacao_proxima_em = agora - timedelta(seconds=1)
+        await session.commit()
+
+    assert await dispatcher.dispatch_once() == 3
+    assert sorted(envios) == [("ana_confirma@example.com", 2), ("bia_confirma@example.com", 1)]
+    assert await dispatcher.dispatch_once() == 0
+    assert len(envios) == 2
+
+    async with async_session() as session:
+        result = await session.execute(
+            select(Agendamento).where(Agendamento.id.in_(outro_lote))
+        )
+        for agendamento in result.scalars().all():
+            assert agendamento.confirmacao_enviada is not None
+            assert agendamento.confirmacao_lote is None
+
+
+@pytest.mark.asyncio
+async def test_confirmacao_dispatcher_backs_off_after_failed_round(test_client, monkeypatch):
+    from app.services import confirmacao_dispatcher as dispatcher_mod
+
+    monkeypatch.setattr(dispatcher_mod, "CONFIRMACAO_RETRY_BASE_SECONDS", 0)
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_backoff@example.com")
+        user = await _create_user(session, "user_backoff@example.com")
+        agendamento = Agendamento(
+            paciente_id=user.id, profissional_id=prof.id,
+            data_hora=datetime.now(timezone.utc) + timedelta(hours=3), status=StatusAgendamento.AGENDADO,
+        )
+        session.add(agendamento)
+        await session.commit()
+
+    chamadas = []
+
+    async def sender_fora_do_ar(email, nome, consultas):
+        chamadas.append(email)
+        raise RuntimeError("SMTP indisponível")
+
+    dispatcher = dispatcher_mod.ConfirmacaoDispatcher(session_factory=async_session, sender=sender_fora_do_ar)
+    assert await dispatcher.dispatch_once() == 0
+    assert len(chamadas) == dispatcher_mod.CONFIRMACAO_SEND_RETRIES + 1
+    # Em backoff: a rodada seguinte nem reivindica
+    assert await dispatcher.dispatch_once() == 0
+    assert len(chamadas) == dispatcher_mod.CONFIRMACAO_SEND_RETRIES + 1
+
+    async with async_session() as session:
+        salvo = await session.get(Agendamento, agendamento.id)
+        assert salvo.confirmacao_enviada is None
+        assert salvo.confirmacao_tentativas == 1
+        assert salvo.confirmacao_lote is None
+
+
+@pytest.mark.asyncio
+async def test_confirmacao_dispatcher_skips_rescheduled_and_lost_lease(test_client, monkeypatch):
+    from app.services import confirmacao_dispatcher as dispatcher_mod
+
+    monkeypatch.setattr(dispatcher_mod, "CONFIRMACAO_CONCURRENCY", 1)
+    client, async_session = test_client
+    agora = datetime.now(timezone.utc)
+    async with async_session() as session:
+        prof = await _create_profissional(session, "prof_lease@example.com")
+        ana = await _create_user(session, "ana_lease@example.com")
+        bia = await _create_user(session, "bia_lease@example.com")
+        consulta_ana = Agendamento(paciente_id=ana.id, profissional_id=prof.id,
+                                   data_hora=agora + timedelta(hours=10), status=StatusAgendamento.AGENDADO)
+        consulta_bia = Agendamento(paciente_id=bia.id, profissional_id=prof.id,
+                                   data_hora=agora + timedelta(hours=11), status=StatusAgendamento.AGENDADO)
+        session.add_all([consulta_ana, consulta_bia])
+        await session.commit()
+
+    envios = []
+
+    async def sender_lento(email, nome, consultas):
+        envios.append(email)
+        # Durante o envio da Ana ela reagenda e a consulta da Bia é tomada por outro worker
+        novo_horario = {"data_hora": (agora + timedelta(days=3)).isoformat()}
+        response = await client.patch(f"/api/agendamentos/{consulta_ana.id}", json=novo_horario,
+                                      headers=_auth_headers(ana))
+        assert response.status_code == 200
+        async with async_session() as session:
+            salvo = await session.get(Agendamento, consulta_bia.id)
+            salvo.confirmacao_lote = "outro-worker"
+            await session.commit()
+        return True
+
+    dispatcher = dispatcher_mod.ConfirmacaoDispatcher(session_factory=async_session, sender=sender_lento)
+    assert await dispatcher.dispatch_once() == 0
+    assert envios == ["ana_lease@example.com"]
+
+    async with async_session() as session:
+        ana_salva = await session.get(Agendamento, consulta_ana.id)
+        # O e-mail saiu com o horário antigo: não vale como confirmação do novo
+        assert ana_salva.confirmacao_enviada is None
+        assert ana_salva.confirmacao_lote is None
+        bia_salva = await session.get(Agendamento, consulta_bia.id)
+        assert bia_salva.confirmacao_enviada is None
+        assert bia_salva.confirmacao_lote == "outro-worker"
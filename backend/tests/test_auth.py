@@ -0,0 +1,232 @@
+import pytest
+from httpx import AsyncClient
+from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from main import app
+from app.database import Base, get_db
+from app.models.auth_models import Usuario, LoginAttempt
+from app.utils import password_hasher
+from app.utils.limiter import limiter
+
+
+@pytest.fixture
+async def test_client():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with async_session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    limiter.reset()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client, async_session
+
+    limiter.reset()
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_legacy_password_hash(test_client):
+    client, async_session = test_client
+    legado = CryptContext(schemes=["pbkdf2_sha256"], pbkdf2_sha256__default_rounds=1000)
+    async with async_session() as session:
+        session.add(Usuario(
+            nome="Usuario Legado",
+            email="legado@example.com",
+            senha=legado.hash("Senha12345"),
+            cpf="52998224725",
+            role="USER",
+            ativo=True,
+        ))
+        await session.commit()
+
+    response = await client.post("/api/auth/login", json={"email": "legado@example.com", "senha": "Senha12345"})
+    assert response.status_code == 200
+
+    async with async_session() as session:
+        usuario = (await session.execute(
+            select(Usuario).where(Usuario.email == "legado@example.com")
+        )).scalar_one()
+    assert f"${password_hasher.PASSWORD_HASH_ROUNDS}$" in usuario.senha
+    assert not password_hasher.pwd_context.needs_update(usuario.senha)
+    assert await password_hasher.verify_password("Senha12345", usuario.senha)
+
+    response = await client.post("/api/auth/login", json={"email": "legado@example.com", "senha": "Errada12345"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_failed_login_commits_lockout_state_and_audit_once(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        session.add(Usuario(
+            nome="Usuario Falha",
+            email="falha@example.com",
+            senha=password_hasher.pwd_context.hash("Senha12345"),
+            cpf="11144477735",
+            role="USER",
+            ativo=True,
+        ))
+        await session.commit()
+
+    from sqlalchemy import event
+
+    sync_engine = async_session.kw["bind"].sync_engine
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(sync_engine, "commit", listener)
+    try:
+        response = await client.post("/api/auth/login", json={"email": "falha@example.com", "senha": "Errada12345"})
+    finally:
+        event.remove(sync_engine, "commit", listener)
+
+    assert response.status_code == 401
+    assert len(commits) == 1
+    async with async_session() as session:
+        usuario = (await session.execute(select(Usuario).where(Usuario.email == "falha@example.com"))).scalar_one()
+        tentativas = (await session.execute(select(LoginAttempt))).scalars().all()
+    assert usuario.tentativas_login == 1
+    assert [t.sucesso for t in tentativas] == [False]
+
+
+@pytest.mark.asyncio
+async def test_unknown_email_attempts_are_buffered_and_flushed_in_batch(test_client, monkeypatch):
+    from app.api.routes import auth_routes
+    from app.services.login_audit import LoginAuditWriter
+
+    client, async_session = test_client
+    writer = LoginAuditWriter(session_factory=async_session)
+    monkeypatch.setattr(auth_routes, "login_audit_writer", writer)
+    await writer.start()
+    try:
+        for i in range(3):
+            response = await client.post("/api/auth/login", json={"email": f"naoexiste{i}@example.com", "senha": "x"})
+            assert response.status_code == 401
+        assert writer.pending == 3
+        async with async_session() as session:
+            assert (await session.execute(select(LoginAttempt))).scalars().all() == []
+    finally:
+        await writer.stop()
+
+    assert writer.pending == 0
+    async with async_session() as session:
+        tentativas = (await session.execute(select(LoginAttempt).order_by(LoginAttempt.id))).scalars().all()
+    assert [t.email for t in tentativas] == [f"naoexiste{i}@example.com" for i in range(3)]
+    assert all(t.motivo == "Usuario nao encontrado" for t in tentativas)
+
+
+@pytest.mark.asyncio
+async def test_login_counters_track_email_and_ip(test_client):
+    from app.models.auth_models import LoginAttemptCounter
+    from app.services.login_audit import has_successful_login, recent_failures
+
+    client, async_session = test_client
+    async with async_session() as session:
+        session.add(Usuario(
+            nome="Usuario Contador",
+            email="contador@example.com",
+            senha=password_hasher.pwd_context.hash("Senha12345"),
+            cpf="39053344705",
+            role="USER",
+            ativo=True,
+        ))
+        await session.commit()
+
+    for senha in ("Errada12345", "Errada12345", "Senha12345"):
+        await client.post("/api/auth/login", json={"email": "contador@example.com", "senha": senha})
+
+    async with async_session() as session:
+        contadores = {
+            (c.escopo, c.chave): c
+            for c in (await session.execute(select(LoginAttemptCounter))).scalars().all()
+        }
+        email = contadores[("email", "contador@example.com")]
+        assert (email.total_falhas, email.total_sucessos, email.falhas_janela) == (2, 1, 2)
+        assert ("ip", "127.0.0.1") in contadores
+        assert await recent_failures(session, "email", "contador@example.com") == 2
+        assert await has_successful_login(session, "contador@example.com")
+        assert not await has_successful_login(session, "outro@example.com")
+
+
+@pytest.mark.asyncio
+async def test_purge_login_attempts_removes_only_expired_rows(test_client, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.services import login_retention
+
+    _, async_session = test_client
+    monkeypatch.setattr(login_retention, "LOGIN_ATTEMPTS_PURGE_BATCH", 2)
+    agora = datetime.now(timezone.utc)
+    async with async_session() as session:
+        for dias in (200, 120, 95, 10, 0):
+            session.add(LoginAttempt(
+                email=f"d{dias}@example.com",
+                ip_address="10.0.0.1",
+                sucesso=False,
+                created_at=agora - timedelta(days=dias),
+            ))
+        await session.commit()
+
+    removidas = await login_retention.purge_login_attempts(async_session, agora=agora)
+    assert removidas == 3
+    async with async_session() as session:
+        restantes = (await session.execute(select(LoginAttempt.email).order_by(LoginAttempt.email))).scalars().all()
+    assert restantes == ["d0@example.com", "d10@example.com"]
+
+
+@pytest.mark.asyncio
+async def test_purge_login_attempts_trims_stale_ip_counters(test_client, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+    from app.models.auth_models import LoginAttemptCounter
+    from app.services import login_retention
+
+    _, async_session = test_client
+    monkeypatch.setattr(login_retention, "LOGIN_ATTEMPTS_PURGE_BATCH", 2)
+    agora = datetime.now(timezone.utc)
+    antigo = agora - timedelta(days=200)
+    async with async_session() as session:
+        for i in range(3):
+            session.add(LoginAttemptCounter(
+                escopo="ip", chave=f"10.0.0.{i}", janela_inicio=antigo, total_falhas=1, ultima_falha_em=antigo,
+            ))
+        session.add(LoginAttemptCounter(
+            escopo="ip", chave="10.0.0.9", janela_inicio=antigo, total_falhas=1,
+            ultima_falha_em=antigo, ultimo_sucesso_em=agora - timedelta(days=1),
+        ))
+        session.add(LoginAttemptCounter(
+            escopo="email", chave="antigo@example.com", janela_inicio=antigo, total_sucessos=1,
+            ultimo_sucesso_em=antigo,
+        ))
+        await session.commit()
+
+    await login_retention.purge_login_attempts(async_session, agora=agora)
+    async with async_session() as session:
+        restantes = (await session.execute(
+            select(LoginAttemptCounter.escopo, LoginAttemptCounter.chave).order_by(LoginAttemptCounter.chave)
+        )).all()
+    # Conta com login antigo continua reconhecida (has_successful_login)
+    assert [tuple(r) for r in restantes] == [("ip", "10.0.0.9"), ("email", "antigo@example.com")]
+
+
+@pytest.mark.asyncio
+async def test_login_refused_when_ip_counter_exceeds_limit(test_client, monkeypatch):
+    from app.api.routes import auth_routes
+
+    monkeypatch.setattr(auth_routes, "LOGIN_IP_MAX_FAILURES", 3)
+    client, async_session = test_client
+
+    # Contas diferentes a partir do mesmo IP: o bloqueio por conta não pega, o contador por IP sim
+    for i in range(3):
+        response = await client.post("/api/auth/login", json={"email": f"alvo{i}@example.com", "senha": "Errada12345"})
+        assert response.status_code == 401
+    response = await client.post("/api/auth/login", json={"email": "alvo9@example.com", "senha": "Errada12345"})
+    assert response.status_code == 429
@@ -184,3 +184,190 @@ async def test_intervention_action_flow(test_client):
     )
     assert list_response.status_code == 200
     assert len(list_response.json()) == 1
+
+
+@pytest.mark.asyncio
+async def test_export_pdf_renders_in_pool(test_client, monkeypatch, tmp_path):
+    from app.services.reporting import pdf_cache
+
+    monkeypatch.setattr(pdf_cache, "REPORT_CACHE_DIR", tmp_path)
+    client, async_session = test_client
+    async with async_session() as session:
+        user = await _create_user(session, "prof_export@example.com")
+        headers = _auth_headers(user)
+
+    ubs_id = await _create_ubs(client, headers)
+    await client.post(
+        f"/api/ubs/{ubs_id}/problems",
+        json={
+            "titulo": "Baixa cobertura vacinal",
+            "gut_gravidade": 4,
+            "gut_urgencia": 4,
+            "gut_tendencia": 3,
+            "is_prioritario": True,
+        },
+        headers=headers,
+    )
+
+    response = await client.get(f"/api/ubs/{ubs_id}/export/pdf", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    assert "x-report-render-ms" in response.headers
+
+
+@pytest.mark.asyncio
+async def test_export_pdf_returns_503_when_render_queue_is_full(test_client, monkeypatch, tmp_path):
+    from app.services.reporting import pdf_cache, render_pool
+
+    monkeypatch.setattr(pdf_cache, "REPORT_CACHE_DIR", tmp_path)
+
+    client, async_session = test_client
+    async with async_session() as session:
+        user = await _create_user(session, "prof_export_full@example.com")
+        headers = _auth_headers(user)
+
+    ubs_id = await _create_ubs(client, headers)
+    monkeypatch.setattr(render_pool, "REPORT_RENDER_WORKERS", 1)
+    monkeypatch.setattr(render_pool, "REPORT_RENDER_MAX_QUEUE", 0)
+    monkeypatch.setattr(render_pool, "_in_flight", 1)
+
+    response = await client.get(f"/api/ubs/{ubs_id}/export/pdf", headers=headers)
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+    assert render_pool.render_metrics()["reports"]["situational"]["rejected"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_export_pdf_cache_etag_and_invalidation(test_client, monkeypatch, tmp_path):
+    from app.services.reporting import pdf_cache
+
+    monkeypatch.setattr(pdf_cache, "REPORT_CACHE_DIR", tmp_path)
+    client, async_session = test_client
+    async with async_session() as session:
+        user = await _create_user(session, "prof_export_cache@example.com")
+        headers = _auth_headers(user)
+
+    ubs_id = await _create_ubs(client, headers)
+
+    first = await client.get(f"/api/ubs/{ubs_id}/export/pdf", headers=headers)
+    assert first.status_code == 200
+    assert first.headers["x-report-cache"] == "MISS"
+    etag = first.headers["etag"]
+
+    second = await client.get(f"/api/ubs/{ubs_id}/export/pdf", headers=headers)
+    assert second.status_code == 200
+    assert second.headers["x-report-cache"] == "HIT"
+    assert second.headers["etag"] == etag
+    assert second.content == first.content
+
+    not_modified = await client.get(
+        f"/api/ubs/{ubs_id}/export/pdf",
+        headers={**headers, "If-None-Match": etag},
+    )
+    assert not_modified.status_code == 304
+
+    # Qualquer alteração na matriz GUT invalida o relatório da UBS.
+    await client.post(
+        f"/api/ubs/{ubs_id}/problems",
+        json={"titulo": "Novo problema", "gut_gravidade": 2, "gut_urgencia": 2, "gut_tendencia": 2},
+        headers=headers,
+    )
+    third = await client.get(
+        f"/api/ubs/{ubs_id}/export/pdf",
+        headers={**headers, "If-None-Match": etag},
+    )
+    assert third.status_code == 200
+    assert third.headers["x-report-cache"] == "MISS"
+    assert third.headers["etag"] != etag
+
+
+def test_pdf_cache_evicts_least_recently_used(monkeypatch, tmp_path):
+    import os
+    from app.services.reporting import pdf_cache
+
+    monkeypatch.setattr(pdf_cache, "REPORT_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(pdf_cache, "REPORT_CACHE_MAX_BYTES", 25)
+
+    antigo = pdf_cache.put_blob("a" * 64, b"x" * 10)
+    os.utime(antigo, (1, 1))
+    recente = pdf_cache.put_blob("b" * 64, b"y" * 10)
+    pdf_cache.put_blob("c" * 64, b"z" * 10)
+
+    assert not antigo.exists()
+    assert recente.exists()
+
+
+@pytest.mark.asyncio
+async def test_export_job_flow(test_client, monkeypatch, tmp_path):
+    from app.services.reporting import pdf_cache, report_jobs
+
+    monkeypatch.setattr(pdf_cache, "REPORT_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(report_jobs, "REPORT_JOBS_DIR", tmp_path / "jobs")
+    client, async_session = test_client
+    async with async_session() as session:
+        user = await _create_user(session, "prof_export_job@example.com")
+        outro = await _create_user(session, "prof_export_job_outro@example.com")
+        headers = _auth_headers(user)
+
+    ubs_id = await _create_ubs(client, headers)
+
+    created = await client.post(f"/api/ubs/{ubs_id}/export/jobs", headers=headers)
+    assert created.status_code == 202
+    job = created.json()
+    assert job["status"] == "PENDENTE"
+    assert job["download_url"] is None
+
+    early = await client.get(f"/api/relatorios/jobs/{job['id']}/download", headers=headers)
+    assert early.status_code == 409
+
+    await report_jobs.run_job(job["id"], async_session)
+
+    status_response = await client.get(f"/api/relatorios/jobs/{job['id']}", headers=headers)
+    assert status_response.status_code == 200
+    finished = status_response.json()
+    assert finished["status"] == "CONCLUIDO"
+    assert finished["size_bytes"] > 0
+
+    download = await client.get(finished["download_url"], headers=headers)
+    assert download.status_code == 200
+    assert download.content.startswith(b"%PDF")
+
+    forbidden = await client.get(f"/api/relatorios/jobs/{job['id']}", headers=_auth_headers(outro))
+    assert forbidden.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_gestor_bulk_export_streams_zip(test_client, monkeypatch, tmp_path):
+    import io
+    import zipfile
+    from app.services.reporting import pdf_cache
+
+    monkeypatch.setattr(pdf_cache, "REPORT_CACHE_DIR", tmp_path)
+    client, async_session = test_client
+    async with async_session() as session:
+        gestor = await _create_user(session, "gestor_bulk_zip@example.com", role="GESTOR")
+        headers = _auth_headers(gestor)
+
+    primeira = await _create_ubs(client, headers)
+    segunda = await _create_ubs(client, headers)
+
+    response = await client.post(
+        "/api/gestor/ubs/export/zip",
+        json={"ubs_ids": [primeira, segunda]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        nomes = sorted(zf.namelist())
+        assert nomes == sorted([f"{primeira}_UBS_Centro.pdf", f"{segunda}_UBS_Centro.pdf"])
+        assert all(zf.read(nome).startswith(b"%PDF") for nome in nomes)
+
+    vazio = await client.post(
+        "/api/gestor/ubs/export/zip",
+        json={"status": "SUBMITTED"},
+        headers=headers,
+    )
+    assert vazio.status_code == 404
@@ -1,5 +1,5 @@
 import pytest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
@@ -186,3 +186,639 @@ async def test_cronograma_blocked_for_user(test_client):
 
     blocked_response = await client.get(f"/api/cronograma?ubs_id={ubs_id}", headers=user_headers)
     assert blocked_response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_cronograma_weekly_event_expanded_in_later_window(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        gestor = await _create_user(session, "gestor_recorrencia@example.com", role="GESTOR")
+        gestor_headers = _auth_headers(gestor)
+
+    ubs_id = await _create_ubs(client, gestor_headers)
+
+    # Reunião semanal (a cada 2 semanas) criada meses antes da janela consultada
+    inicio = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)
+    payload = {
+        "ubs_id": ubs_id,
+        "titulo": "Reunião de equipe",
+        "tipo": "REUNIAO_EQUIPE",
+        "inicio": inicio.isoformat(),
+        "fim": (inicio + timedelta(hours=1)).isoformat(),
+        "recorrencia": "WEEKLY",
+        "recorrencia_intervalo": 2,
+        "recorrencia_fim": "2026-06-30",
+    }
+    response = await client.post("/api/cronograma", json=payload, headers=gestor_headers)
+    assert response.status_code == 201
+    evento_id = response.json()["id"]
+
+    params = {"ubs_id": ubs_id, "start": "2026-05-01T00:00:00Z", "end": "2026-07-31T23:59:59Z"}
+    response = await client.get("/api/cronograma", params=params, headers=gestor_headers)
+    assert [e["id"] for e in response.json()] == [evento_id]
+
+    response = await client.get("/api/cronograma/ocorrencias", params=params, headers=gestor_headers)
+    assert response.status_code == 200
+    ocorrencias = [datetime.fromisoformat(o["ocorrencia_inicio"]) for o in response.json()]
+    esperadas = [datetime(2026, 5, 11, 12, 0, tzinfo=timezone.utc) + timedelta(weeks=2 * i) for i in range(4)]
+    assert ocorrencias == esperadas
+    assert datetime.fromisoformat(response.json()[0]["ocorrencia_fim"]) == esperadas[0] + timedelta(hours=1)
+
+    # Alterar o evento descarta os meses em cache da UBS
+    response = await client.patch(
+        f"/api/cronograma/{evento_id}", json={"recorrencia": "MONTHLY", "recorrencia_intervalo": 1},
+        headers=gestor_headers,
+    )
+    assert response.status_code == 200
+    response = await client.get("/api/cronograma/ocorrencias", params=params, headers=gestor_headers)
+    assert [o["ocorrencia_inicio"][:10] for o in response.json()] == ["2026-05-05", "2026-06-05"]
+
+
+def test_iter_occurrences_monthly_clamps_to_month_end():
+    from datetime import date
+    from types import SimpleNamespace
+
+    from app.services.cronograma_recorrencia import iter_occurrences
+
+    evento = SimpleNamespace(
+        inicio=datetime(2026, 1, 31, 13, 0, tzinfo=timezone.utc),
+        fim=None,
+        recorrencia="MONTHLY",
+        recorrencia_intervalo=1,
+        recorrencia_fim=date(2026, 5, 31),
+    )
+    janela = (datetime(2026, 2, 1, tzinfo=timezone.utc), datetime(2027, 1, 1, tzinfo=timezone.utc))
+    dias = [oc.date() for oc, _ in iter_occurrences(evento, *janela)]
+    assert dias == [date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30), date(2026, 5, 31)]
+
+
+@pytest.mark.asyncio
+async def test_cronograma_ics_feed_rrule_and_conditional_get(test_client):
+    client, async_session = test_client
+    async with async_session() as session:
+        gestor = await _create_user(session, "gestor_ics@example.com", role="GESTOR")
+        gestor_headers = _auth_headers(gestor)
+
+    ubs_id = await _create_ubs(client, gestor_headers)
+    inicio = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=200)
+    payload = {
+        "ubs_id": ubs_id,
+        "titulo": "Reunião, semanal; equipe",
+        "tipo": "REUNIAO_EQUIPE",
+        "inicio": inicio.isoformat(),
+        "fim": (inicio + timedelta(hours=1)).isoformat(),
+        "recorrencia": "WEEKLY",
+        "recorrencia_intervalo": 1,
+    }
+    response = await client.post("/api/cronograma", json=payload, headers=gestor_headers)
+    assert response.status_code == 201
+
+    token_response = await client.post("/api/auth/calendar-feed-token", headers=gestor_headers)
+    feed_token = token_response.json()["token"]
+
+    # Token de sessão na URL não é aceito; só o token de feed
+    session_token = gestor_headers["Authorization"].split()[1]
+    response = await client.get(f"/api/cronograma/{ubs_id}/feed.ics", params={"token": session_token})
+    assert response.status_code == 401
+
+    # E o token de feed não vale como sessão nas demais rotas
+    feed_headers = {"Authorization": f"Bearer {feed_token}"}
+    response = await client.get("/api/auth/me", headers=feed_headers)
+    assert response.status_code == 401
+    response = await client.get("/api/agendamentos/meus", headers=feed_headers)
+    assert response.status_code == 401
+
+    response = await client.get(f"/api/cronograma/{ubs_id}/feed.ics", params={"token": feed_token})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/calendar")
+    corpo = response.text
+    assert corpo.startswith("BEGIN:VCALENDAR\r\n") and corpo.endswith("END:VCALENDAR\r\n")
+    assert corpo.count("BEGIN:VEVENT") == 1
+    assert "RRULE:FREQ=WEEKLY;INTERVAL=1\r\n" in corpo
+    assert "SUMMARY:Reunião\\, semanal\\; equipe" in corpo
+    etag = response.headers["etag"]
+    assert response.headers["last-modified"]
+
+    response = await client.get(
+        f"/api/cronograma/{ubs_id}/feed.ics", params={"token": feed_token}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    response = await client.get(
+        f"/api/cronograma/{ubs_id}/feed.ics",
+        params={"token": feed_token},
+        headers={"If-Modified-Since": response.headers["last-modified"]},
+    )
+    assert response.status_code == 304
+
+    # Evento único encerrado há muito tempo fica fora do feed: continua 304
+    payload["recorrencia"] = "NONE"
+    await client.post("/api/cronograma", json=payload, headers=gestor_headers)
+    response = await client.get(
+        f"/api/cronograma/{ubs_id}/feed.ics", params={"token": feed_token}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    payload["inicio"] = (datetime.now(timezone.utc) + timedelta(days=3)).isoformat()
+    payload["fim"] = None
+    await client.post("/api/cronograma", json=payload, headers=gestor_headers)
+    response = await client.get(
+        f"/api/cronograma/{ubs_id}/feed.ics", params={"token": feed_token}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.text.count("BEGIN:VEVENT") == 2
+
+
+@pytest.mark.asyncio
+async def test_cronograma_month_view_merges_events_blocks_and_counts(test_client):
+    from sqlalchemy import insert
+
+    from app.models.agendamento_models import Agendamento, BloqueioAgenda, StatusAgendamento
+    from app.models.auth_models import ProfissionalUbs
+
+    client, async_session = test_client
+    async with async_session() as session:
+        gestor = await _create_user(session, "gestor_mes@example.com", role="GESTOR")
+        gestor_headers = _auth_headers(gestor)
+        usuario = await _create_user(session, "user_mes@example.com", role="USER")
+        user_headers = _auth_headers(usuario)
+
+    ubs_id = await _create_ubs(client, gestor_headers)
+
+    inicio = datetime(2026, 5, 4, 12, 0, tzinfo=timezone.utc)
+    payload = {
+        "ubs_id": ubs_id,
+        "titulo": "Reunião de equipe",
+        "tipo": "REUNIAO_EQUIPE",
+        "inicio": inicio.isoformat(),
+        "fim": (inicio + timedelta(hours=1)).isoformat(),
+        "recorrencia": "WEEKLY",
+    }
+    response = await client.post("/api/cronograma", json=payload, headers=gestor_headers)
+    assert response.status_code == 201
+
+    async with async_session() as session:
+        prof_user = await _create_user(session, "prof_mes@example.com", role="PROFISSIONAL")
+        prof_user.active_ubs_id = ubs_id
+        prof = ProfissionalUbs(usuario_id=prof_user.id, cargo="Medico", registro_professional="REG-MES", ativo=True)
+        session.add(prof)
+        await session.commit()
+        session.add_all([
+            BloqueioAgenda(
+                profissional_id=prof.id,
+                data_inicio=datetime(2026, 5, 11, 13, 0, tzinfo=timezone.utc),
+                data_fim=datetime(2026, 5, 11, 17, 0, tzinfo=timezone.utc),
+                motivo="Capacitação",
+            ),
+            Agendamento(
+                paciente_id=usuario.id,
+                profissional_id=prof.id,
+                data_hora=datetime(2026, 5, 6, 13, 0, tzinfo=timezone.utc),
+                status=StatusAgendamento.AGENDADO,
+            ),
+            Agendamento(
+                paciente_id=usuario.id,
+                profissional_id=prof.id,
+                data_hora=datetime(2026, 5, 6, 13, 20, tzinfo=timezone.utc),
+                status=StatusAgendamento.AGENDADO,
+            ),
+        ])
+        await session.commit()
+        # INSERT direto não passa pelo flush (sem linha em ocupacao_agenda_diaria);
+        # 02h UTC do dia 7 ainda é dia 6 no horário local
+        await session.execute(
+            insert(Agendamento).values(
+                paciente_id=usuario.id,
+                profissional_id=prof.id,
+                data_hora=datetime(2026, 5, 7, 2, 0, tzinfo=timezone.utc),
+                status=StatusAgendamento.CANCELADO.value,
+            )
+        )
+        await session.commit()
+
+    params = {"ano": 2026, "mes": 5}
+    response = await client.get(f"/api/cronograma/{ubs_id}/mes", params=params, headers=gestor_headers)
+    assert response.status_code == 200
+    data = response.json()
+    itens = data["itens"]
+    assert [i["origem"] for i in itens[:3]] == ["EVENTO", "EVENTO", "BLOQUEIO"]
+    assert sum(1 for i in itens if i["origem"] == "EVENTO") == 4
+    inicios = [datetime.fromisoformat(i["inicio"]) for i in itens]
+    assert inicios == sorted(inicios)
+    assert itens[2]["nome_profissional"] == "Usuario Teste"
+    assert data["dias"] == [{"dia": "2026-05-06", "agendamentos": 2, "cancelados": 1}]
+
+    response = await client.get(f"/api/cronograma/{ubs_id}/mes", params=params, headers=user_headers)
+    assert response.status_code == 200
+    assert {i["origem"] for i in response.json()["itens"]} == {"EVENTO"}
+    assert response.json()["dias"] == []
+
+
+@pytest.mark.asyncio
+async def test_material_upload_streamed_hashed_and_size_limited(test_client, monkeypatch):
+    import hashlib
+
+    from app.api.routes import materiais_routes
+    from app.models.materiais_models import EducationalMaterial, EducationalMaterialFile
+    from app.services import material_storage
+    from sqlalchemy import func, select
+
+    monkeypatch.setattr(materiais_routes, "_MAX_FILE_SIZE_BYTES", 10)
+    monkeypatch.setattr(material_storage, "MATERIAIS_UPLOAD_CHUNK_BYTES", 4)
+
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_user(session, "prof_stream@example.com", role="PROFISSIONAL")
+        headers = _auth_headers(prof)
+    ubs_id = await _create_ubs(client, headers)
+    payload = {"ubs_id": str(ubs_id), "titulo": "Folheto"}
+
+    response = await client.post(
+        "/api/materiais", data=payload, files={"file": ("grande.txt", b"x" * 11, "text/plain")}, headers=headers
+    )
+    assert response.status_code == 413
+    async with async_session() as session:
+        assert (await session.execute(select(func.count(EducationalMaterial.id)))).scalar_one() == 0
+    tmp = materiais_routes._UPLOADS_BASE_DIR / ".tmp"
+    assert not list(tmp.glob("*.part"))
+
+    response = await client.post(
+        "/api/materiais", data=payload, files={"file": ("ok.txt", b"0123456789", "text/plain")}, headers=headers
+    )
+    assert response.status_code == 201
+    file_id = response.json()["files"][0]["id"]
+    async with async_session() as session:
+        entry = await session.get(EducationalMaterialFile, file_id)
+        assert entry.size_bytes == 10
+        assert entry.sha256 == hashlib.sha256(b"0123456789").hexdigest()
+
+    response = await client.get(f"/api/materiais/files/{file_id}/download", headers=headers)
+    assert response.content == b"0123456789"
+    await client.delete(f"/api/materiais/{entry.material_id}", headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_material_resumable_upload_flow_and_gc(test_client):
+    import hashlib
+    from pathlib import Path
+
+    from app.models.materiais_models import MaterialUploadSession
+    from app.services.material_uploads import purge_expired_sessions
+
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_user(session, "prof_resumable@example.com", role="PROFISSIONAL")
+        headers = _auth_headers(prof)
+    ubs_id = await _create_ubs(client, headers)
+    response = await client.post(
+        "/api/materiais", data={"ubs_id": str(ubs_id), "titulo": "Vídeo"}, headers=headers
+    )
+    material_id = response.json()["id"]
+
+    conteudo = b"video-de-capacitacao" * 5
+    response = await client.post(
+        f"/api/materiais/{material_id}/uploads",
+        json={"filename": "aula.mp4", "content_type": "video/mp4", "tamanho_bytes": len(conteudo)},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    upload_id = response.json()["id"]
+
+    response = await client.put(
+        f"/api/materiais/uploads/{upload_id}", params={"offset": 0}, content=conteudo[:40], headers=headers
+    )
+    assert response.json()["recebido_bytes"] == 40
+    # Buraco no arquivo: recusado com o offset atual
+    response = await client.put(
+        f"/api/materiais/uploads/{upload_id}", params={"offset": 60}, content=conteudo[60:], headers=headers
+    )
+    assert response.status_code == 409
+    response = await client.post(f"/api/materiais/uploads/{upload_id}/finalizar", headers=headers)
+    assert response.status_code == 409
+
+    # Retomada: consulta o offset e reenvia a partir dele (com sobreposição)
+    offset = (await client.get(f"/api/materiais/uploads/{upload_id}", headers=headers)).json()["recebido_bytes"]
+    response = await client.put(
+        f"/api/materiais/uploads/{upload_id}",
+        params={"offset": offset - 10},
+        content=conteudo[offset - 10:],
+        headers=headers,
+    )
+    assert response.json()["recebido_bytes"] == len(conteudo)
+    response = await client.put(
+        f"/api/materiais/uploads/{upload_id}", params={"offset": 0}, content=conteudo + b"x", headers=headers
+    )
+    assert response.status_code == 413
+
+    response = await client.post(
+        f"/api/materiais/uploads/{upload_id}/finalizar",
+        json={"sha256": hashlib.sha256(conteudo).hexdigest()},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    file_id = response.json()["id"]
+    response = await client.get(f"/api/materiais/files/{file_id}/download", headers=headers)
+    assert response.content == conteudo
+    assert (await client.get(f"/api/materiais/uploads/{upload_id}", headers=headers)).status_code == 404
+
+    # Sessão vencida: removida junto com o arquivo parcial
+    response = await client.post(
+        f"/api/materiais/{material_id}/uploads",
+        json={"filename": "outra.mp4", "tamanho_bytes": 10},
+        headers=headers,
+    )
+    abandonado = response.json()["id"]
+    async with async_session() as session:
+        sessao = await session.get(MaterialUploadSession, abandonado)
+        parcial = Path(sessao.arquivo_parcial)
+        sessao.expira_em = datetime.now(timezone.utc) - timedelta(minutes=1)
+        await session.commit()
+    assert parcial.exists()
+    assert await purge_expired_sessions(async_session) == 1
+    assert not parcial.exists()
+
+    await client.delete(f"/api/materiais/{material_id}", headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_material_resumable_upload_hashes_sequential_parts_without_rereading(test_client, monkeypatch):
+    import hashlib
+
+    from app.services import material_uploads
+
+    async def _nao_rele(caminho):
+        raise AssertionError("arquivo relido na finalização")
+
+    monkeypatch.setattr(material_uploads, "hash_file", _nao_rele)
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_user(session, "prof_sequencial@example.com", role="PROFISSIONAL")
+        headers = _auth_headers(prof)
+    ubs_id = await _create_ubs(client, headers)
+    material_id = (await client.post(
+        "/api/materiais", data={"ubs_id": str(ubs_id), "titulo": "Vídeo"}, headers=headers
+    )).json()["id"]
+
+    conteudo = bytes(range(256)) * 4
+    upload_id = (await client.post(
+        f"/api/materiais/{material_id}/uploads",
+        json={"filename": "aula.mp4", "tamanho_bytes": len(conteudo)},
+        headers=headers,
+    )).json()["id"]
+    for inicio in range(0, len(conteudo), 300):
+        response = await client.put(
+            f"/api/materiais/uploads/{upload_id}",
+            params={"offset": inicio},
+            content=conteudo[inicio:inicio + 300],
+            headers=headers,
+        )
+        assert response.status_code == 200
+
+    # A finalização confere o SHA-256 informado pelo cliente com o calculado durante os PUTs
+    response = await client.post(
+        f"/api/materiais/uploads/{upload_id}/finalizar",
+        json={"sha256": hashlib.sha256(conteudo).hexdigest()},
+        headers=headers,
+    )
+    assert response.status_code == 200
+
+    await client.delete(f"/api/materiais/{material_id}", headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_material_files_deduplicated_by_content(test_client):
+    import hashlib
+    from pathlib import Path
+
+    from app.models.materiais_models import EducationalMaterialFile, MaterialBlob
+    from sqlalchemy import select
+
+    client, async_session = test_client
+    async with async_session() as session:
+        gestor = await _create_user(session, "gestor_dedup@example.com", role="GESTOR")
+        headers = _auth_headers(gestor)
+    ubs_a = await _create_ubs(client, headers)
+    ubs_b = await _create_ubs(client, headers)
+
+    folheto = b"%PDF-1.4 folheto do ministerio da saude"
+    sha = hashlib.sha256(folheto).hexdigest()
+    material_a = (await client.post(
+        "/api/materiais",
+        data={"ubs_id": str(ubs_a), "titulo": "Folheto"},
+        files={"file": ("folheto.pdf", folheto, "application/pdf")},
+        headers=headers,
+    )).json()
+    material_b = (await client.post(
+        "/api/materiais", data={"ubs_id": str(ubs_b), "titulo": "Folheto"}, headers=headers
+    )).json()
+    response = await client.post(
+        f"/api/materiais/{material_b['id']}/files",
+        files={"file": ("copia.pdf", folheto, "application/pdf")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    # Duplicata anexada só pelo hash, sem enviar os bytes
+    response = await client.post(
+        f"/api/materiais/{material_b['id']}/files/existente",
+        json={"sha256": sha, "filename": "outra_copia.pdf", "content_type": "application/pdf"},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    assert response.json()["size_bytes"] == len(folheto)
+    response = await client.post(
+        f"/api/materiais/{material_b['id']}/files/existente",
+        json={"sha256": "0" * 64, "filename": "nada.pdf"},
+        headers=headers,
+    )
+    assert response.status_code == 404
+
+    # Hash de um material que o usuário não pode ver não dá acesso ao conteúdo
+    restrito = b"%PDF-1.4 orientacoes so para pacientes"
+    restrito_sha = hashlib.sha256(restrito).hexdigest()
+    response = await client.post(
+        "/api/materiais",
+        data={"ubs_id": str(ubs_a), "titulo": "Pacientes", "publico_alvo": "Usuários"},
+        files={"file": ("pacientes.pdf", restrito, "application/pdf")},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    material_restrito = response.json()
+    async with async_session() as session:
+        profissional = await _create_user(session, "prof_dedup@example.com", role="PROFISSIONAL")
+    response = await client.post(
+        f"/api/materiais/{material_b['id']}/files/existente",
+        json={"sha256": restrito_sha, "filename": "copia.pdf"},
+        headers=_auth_headers(profissional),
+    )
+    assert response.status_code == 404
+
+    async with async_session() as session:
+        blob = await session.get(MaterialBlob, sha)
+        assert blob.ref_count == 3
+        caminhos = set((await session.execute(
+            select(EducationalMaterialFile.storage_path).where(EducationalMaterialFile.sha256 == sha)
+        )).scalars())
+    assert caminhos == {blob.storage_path}
+    arquivo = Path(blob.storage_path)
+
+    response = await client.delete(f"/api/materiais/{material_b['id']}", headers=headers)
+    assert response.status_code == 204
+    assert arquivo.exists()
+    response = await client.get(
+        f"/api/materiais/files/{material_a['files'][0]['id']}/download", headers=headers
+    )
+    assert response.content == folheto
+
+    response = await client.delete(f"/api/materiais/files/{material_a['files'][0]['id']}", headers=headers)
+    assert response.status_code == 204
+    assert not arquivo.exists()
+    async with async_session() as session:
+        assert await session.get(MaterialBlob, sha) is None
+
+    await client.delete(f"/api/materiais/{material_restrito['id']}", headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_material_blob_purge_and_abandon_keep_referenced_content(test_client, tmp_path):
+    import hashlib
+
+    from app.models.materiais_models import MaterialBlob
+    from app.services import material_storage
+
+    _client, async_session = test_client
+
+    def _staged(conteudo: bytes):
+        caminho = tmp_path / f"{hashlib.sha1(conteudo).hexdigest()}.part"
+        caminho.write_bytes(conteudo)
+        return material_storage.StagedUpload(caminho, len(conteudo), hashlib.sha256(conteudo).hexdigest())
+
+    # Commit que falha: o blob criado pela chamada sai do disco
+    staged = _staged(b"conteudo abandonado")
+    async with async_session() as session:
+        blob = await material_storage.acquire_blob(session, staged, tmp_path)
+        assert blob.path.exists() and blob.inode is not None
+        await session.rollback()
+        await material_storage.abandon_blob(blob)
+    assert not blob.path.exists()
+
+    # Última referência solta, mas o conteúdo é referenciado de novo antes da limpeza
+    staged = _staged(b"conteudo compartilhado")
+    async with async_session() as session:
+        blob = await material_storage.acquire_blob(session, staged, tmp_path)
+        await session.commit()
+        assert await material_storage.release_blob(session, staged.sha256)
+        await session.commit()
+        await material_storage.reference_existing_blob(session, tmp_path, staged.sha256)
+        await session.commit()
+        await material_storage.purge_unreferenced_blob(session, staged.sha256)
+        assert (await session.get(MaterialBlob, staged.sha256)).ref_count == 1
+    assert blob.path.exists()
+
+    # Blob regravado (outro inode) depois de a limpeza ler o arquivo: volta para o lugar
+    material_storage._discard_blob_file(blob.path, blob.inode + 1)
+    assert blob.path.read_bytes() == b"conteudo compartilhado"
+
+    async with async_session() as session:
+        assert await material_storage.release_blob(session, staged.sha256)
+        await session.commit()
+        await material_storage.purge_unreferenced_blob(session, staged.sha256)
+        assert await session.get(MaterialBlob, staged.sha256) is None
+    assert not blob.path.exists()
+
+
+@pytest.mark.asyncio
+async def test_material_download_range_etag_and_conditional(test_client):
+    import hashlib
+
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_user(session, "prof_range@example.com", role="PROFISSIONAL")
+        headers = _auth_headers(prof)
+    ubs_id = await _create_ubs(client, headers)
+
+    video = bytes(range(256)) * 4
+    material = (await client.post(
+        "/api/materiais",
+        data={"ubs_id": str(ubs_id), "titulo": "Vídeo curto"},
+        files={"file": ("aula.mp4", video, "video/mp4")},
+        headers=headers,
+    )).json()
+    url = f"/api/materiais/files/{material['files'][0]['id']}/download"
+
+    response = await client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag == f'"{hashlib.sha256(video).hexdigest()}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    last_modified = response.headers["Last-Modified"]
+
+    response = await client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    response = await client.get(url, headers={**headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    response = await client.get(url, headers={**headers, "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(video)}"
+    assert response.content == video[100:200]
+
+    response = await client.get(url, headers={**headers, "Range": "bytes=-10", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.content == video[-10:]
+    response = await client.get(url, headers={**headers, "Range": "bytes=0-9", "If-Range": '"outro"'})
+    assert response.status_code == 200
+    assert response.content == video
+
+    await client.delete(f"/api/materiais/{material['id']}", headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_material_signed_download_url(test_client, monkeypatch):
+    from app.utils import jwt_handler
+
+    client, async_session = test_client
+    async with async_session() as session:
+        prof = await _create_user(session, "prof_signed@example.com", role="PROFISSIONAL")
+        usuario = await _create_user(session, "user_signed@example.com", role="USER")
+        headers = _auth_headers(prof)
+        user_headers = _auth_headers(usuario)
+    ubs_id = await _create_ubs(client, headers)
+
+    conteudo = b"manual da equipe"
+    material = (await client.post(
+        "/api/materiais",
+        data={"ubs_id": str(ubs_id), "titulo": "Manual", "publico_alvo": "Equipe"},
+        files={"file": ("manual.pdf", conteudo, "application/pdf")},
+        headers=headers,
+    )).json()
+    file_id = material["files"][0]["id"]
+
+    response = await client.post(f"/api/materiais/files/{file_id}/download-url", headers=user_headers)
+    assert response.status_code == 403
+
+    response = await client.post(f"/api/materiais/files/{file_id}/download-url", headers=headers)
+    assert response.status_code == 200
+    url = response.json()["url"]
+    # Só hash, expiração, nome e tipo na URL; o caminho no disco fica no servidor
+    assert "blobs" not in url and "manual.pdf" in url
+
+    # Sem cabeçalho Authorization: a assinatura basta
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.content == conteudo
+    assert response.headers["Cache-Control"].startswith("private, max-age=")
+    response = await client.get(url, headers={"Range": "bytes=0-5"})
+    assert response.status_code == 206
+    assert response.content == conteudo[:6]
+
+    assert (await client.get(url + "x")).status_code == 403
+    assert (await client.get(url.replace("manual.pdf", "outro.pdf"))).status_code == 403
+    assert (await client.get(url.replace("application%2Fpdf", "text%2Fhtml"))).status_code == 403
+    outro = url.replace(f"/files/{file_id}/", f"/files/{file_id + 1}/")
+    assert (await client.get(outro)).status_code == 403
+
+    monkeypatch.setattr(jwt_handler, "MATERIAL_DOWNLOAD_URL_SECONDS", -1)
+    expirada = (await client.post(f"/api/materiais/files/{file_id}/download-url", headers=headers)).json()["url"]
+    assert (await client.get(expirada)).status_code == 403
+
+    await client.delete(f"/api/materiais/{material['id']}", headers=headers)
@@ -0,0 +1,119 @@
+import pytest
+from httpx import AsyncClient
+from limits import parse
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from limits.storage import storage_from_string
+from limits.strategies import MovingWindowRateLimiter, SlidingWindowCounterRateLimiter
+
+from main import app
+from app.database import Base, get_db
+from app.utils import limiter as limiter_module
+from app.utils.rate_limit_storage import SQLiteStorage
+
+
+def test_sqlite_storage_shares_sliding_window_between_instances(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'ratelimit.db'}"
+    # Duas instâncias sobre o mesmo arquivo simulam dois workers do gunicorn
+    worker_a = storage_from_string(uri)
+    worker_b = storage_from_string(uri)
+    assert isinstance(worker_a, SQLiteStorage)
+
+    limite = parse("10/minute")
+    limiter_a = SlidingWindowCounterRateLimiter(worker_a)
+    limiter_b = SlidingWindowCounterRateLimiter(worker_b)
+
+    aceitos = 0
+    for i in range(20):
+        rate_limiter = limiter_a if i % 2 == 0 else limiter_b
+        if rate_limiter.hit(limite, "login", "10.0.0.1"):
+            aceitos += 1
+    assert aceitos == 10
+    assert limiter_b.test(limite, "login", "10.0.0.2")
+
+    limiter_a.clear(limite, "login", "10.0.0.1")
+    assert limiter_b.hit(limite, "login", "10.0.0.1")
+
+
+def test_sqlite_storage_moving_window(tmp_path):
+    storage = storage_from_string(f"sqlite:///{tmp_path / 'ratelimit.db'}")
+    rate_limiter = MovingWindowRateLimiter(storage)
+    limite = parse("3/minute")
+    assert [rate_limiter.hit(limite, "k") for _ in range(4)] == [True, True, True, False]
+    stats = rate_limiter.get_window_stats(limite, "k")
+    assert stats.remaining == 0
+
+
+@pytest.fixture
+async def test_client():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", future=True)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with async_session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    limiter_module.limiter.reset()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        yield client
+
+    limiter_module.limiter.reset()
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_rejection_is_counted_in_metrics(test_client):
+    antes = limiter_module.rate_limit_metrics()["rejected"]
+    respostas = [
+        await test_client.post("/api/auth/forgot-password", json={"email": "nao@existe.com"})
+        for _ in range(6)
+    ]
+
+    assert respostas[-1].status_code == 429
+    metricas = limiter_module.rate_limit_metrics()
+    assert metricas["rejected"] == antes + 1
+    assert any(chave.startswith("/api/auth/forgot-password") for chave in metricas["rejected_by_limit"])
+
+
+@pytest.mark.asyncio
+async def test_sqlite_limiter_checks_outside_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    from fastapi import FastAPI, Request
+    from slowapi.errors import RateLimitExceeded
+    from slowapi.util import get_remote_address
+
+    monkeypatch.setattr(limiter_module, "RATE_LIMIT_STORAGE_URI", f"sqlite:///{tmp_path / 'ratelimit.db'}")
+    limiter = limiter_module.ThreadpoolLimiter(
+        key_func=get_remote_address, storage_uri=limiter_module.RATE_LIMIT_STORAGE_URI
+    )
+    threads = []
+    checagem_original = limiter._check_request_limit
+
+    def _check(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return checagem_original(*args, **kwargs)
+
+    monkeypatch.setattr(limiter, "_check_request_limit", _check)
+
+    mini_app = FastAPI()
+    mini_app.state.limiter = limiter
+    mini_app.add_exception_handler(RateLimitExceeded, limiter_module.rate_limit_exceeded_handler)
+
+    @mini_app.get("/ping")
+    @limiter.limit("2/minute")
+    async def ping(request: Request):
+        return {"ok": True}
+
+    async with AsyncClient(app=mini_app, base_url="http://test") as client:
+        status_codes = [(await client.get("/ping")).status_code for _ in range(3)]
+
+    assert status_codes == [200, 200, 429]
+    assert len(threads) == 3
+    assert all(thread is not threading.main_thread() for thread in threads)
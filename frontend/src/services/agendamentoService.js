@@ -3,7 +3,7 @@ import { api } from './api';
 export const agendamentoService = {
   // Histórico / Meus Agendamentos
   getMeusAgendamentos: () => 
-    api.request('/agendamentos/meus', { requiresAuth: true }),
+    api.requestAllPages('/agendamentos/meus', { requiresAuth: true }),
 
   // Criar Agendamento
   criarAgendamento: (payload) => 
@@ -19,7 +19,7 @@ export const agendamentoService = {
 
   // Agenda Profissional (Staff)
   getAgendaProfissional: (profissionalId, start, end) => 
-    api.request(`/agenda/profissional/${profissionalId}?start_date=${start}&end_date=${end}`, { requiresAuth: true }),
+    api.requestAllPages(`/agenda/profissional/${profissionalId}?start_date=${start}&end_date=${end}`, { requiresAuth: true }),
 
   // Bloqueio de Agenda (Staff)
   criarBloqueio: (payload) => 
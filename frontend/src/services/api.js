@@ -37,7 +37,8 @@ function clearAuth() {
   localStorage.removeItem("user");
 }
 
-async function request(path, options = {}) {
+// Faz a requisição e devolve { data, headers }; erros HTTP viram Error
+async function send(path, options = {}) {
   const url = `${BASE_API}${path}`;
   const method = options.method || "GET";
 
@@ -104,9 +105,9 @@ async function request(path, options = {}) {
     }
 
     const text = await response.text();
-    if (!text) return {};
+    if (!text) return { data: {}, headers: response.headers };
     try {
-      return JSON.parse(text);
+      return { data: JSON.parse(text), headers: response.headers };
     } catch {
       console.error(`[API] Resposta não é JSON válido para ${method} ${url}:`, text.substring(0, 200));
       throw new Error("Resposta inválida do servidor (não é JSON).");
@@ -117,8 +118,28 @@ async function request(path, options = {}) {
   }
 }
 
+async function request(path, options = {}) {
+  const { data } = await send(path, options);
+  return data;
+}
+
+// Listas paginadas por cursor: segue o cabeçalho X-Next-Cursor até a última página
+async function requestAllPages(path, options = {}) {
+  const itens = [];
+  let cursor = null;
+  do {
+    const separador = path.includes("?") ? "&" : "?";
+    const pagina = cursor ? `${path}${separador}cursor=${encodeURIComponent(cursor)}` : path;
+    const { data, headers } = await send(pagina, options);
+    if (Array.isArray(data)) itens.push(...data);
+    cursor = headers.get("X-Next-Cursor");
+  } while (cursor);
+  return itens;
+}
+
 export const api = {
   request,
+  requestAllPages,
   getToken,
   setToken,
   removeToken,